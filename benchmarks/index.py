@@ -0,0 +1,72 @@
+"""
+持久化索引基准测试: 对比不使用索引、使用索引以及信任索引中的子树大小(trust_subtree_sizes)三种方式的搜索耗时，
+并检查三种方式的结果一致；最后修改匹配目录深处的文件，检查 invalidate 之后信任模式的结果与实际一致
+
+用法(在项目根目录执行):
+    python -m benchmarks.index               # 自动生成测试目录树
+    python -m benchmarks.index D:/some/dir   # 使用指定目录(不会修改其中的文件)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.traversal import make_tree
+from helpers.fs_index import FsIndex
+from helpers.scan_stats import ScanStats
+from helpers.scanner import scan
+
+include_rules = ['d_1/', 'd_2/', '*.txt']
+
+
+def bench(name, root, index, repeat=3):
+    best = None
+    records = []
+    stats = ScanStats()
+    for _ in range(repeat):
+        stats = ScanStats()
+        start = time.perf_counter()
+        records = list(scan(root, include_rules, stats=stats, index=index, processes=False))
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    print(f'{name:<10} 结果数: {len(records):<8} 统计大小的目录数: {stats.sized_dirs:<8} 最佳耗时: {best:.3f}s')
+    return best, sorted((record.abs_path, record.size, record.allocated) for record in records)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix='tml_bench_')
+    if len(sys.argv) > 1:
+        root = sys.argv[1]
+    else:
+        root = os.path.join(tmp_dir, 'root')
+        os.mkdir(root)
+        make_tree(root)
+    index = FsIndex(os.path.join(tmp_dir, 'index.sqlite3'))
+    try:
+        plain, plain_records = bench('no index', root, None)
+        index.trust_subtree_sizes = False
+        indexed, indexed_records = bench('index', root, index)
+        index.trust_subtree_sizes = True
+        trusted, trusted_records = bench('trusted', root, index)
+        if not plain_records == indexed_records == trusted_records:
+            raise AssertionError('使用索引的搜索结果与直接读取文件系统不一致')
+        print(f'结果一致，索引提升: {plain / indexed:.2f}x，信任子树大小提升: {plain / trusted:.2f}x')
+
+        if len(sys.argv) == 1:
+            # 修改文件内容不会改变目录的 mtime，信任模式需要 invalidate 之后才能发现
+            changed_dir = os.path.join(root, 'd_1', 'd_0')
+            with open(os.path.join(changed_dir, 'f_0.txt'), 'ab') as f:
+                f.write(b'x' * 4096)
+            index.invalidate(changed_dir)
+            _, plain_records = bench('no index', root, None, repeat=1)
+            _, trusted_records = bench('trusted', root, index, repeat=1)
+            if plain_records != trusted_records:
+                raise AssertionError('invalidate 之后信任模式的结果与实际不一致')
+            print('invalidate 之后结果一致')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+多进程搜索基准测试: 对比进程内搜索与按顶层子树分片到多个进程的搜索耗时，并检查两种方式的结果一致
+生成的目录树的根目录下包含符号链接，覆盖父进程匹配顶层条目时遇到重解析点的情况；
+不同顶层子树之间有硬链接，覆盖跨分片的硬链接去重
+
+用法(在项目根目录执行):
+    python -m benchmarks.process_scan               # 自动生成测试目录树
+    python -m benchmarks.process_scan D:/some/dir   # 使用指定目录
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.traversal import make_tree
+from helpers.scanner import scan
+
+include_rules = ['d_1/', '*.txt']
+
+
+def make_root(root):
+    """生成测试目录树，创建跨顶层子树的硬链接，并在根目录下创建指向子目录和文件的符号链接"""
+    make_tree(root)
+    # 跨顶层子树的硬链接，分别位于匹配的目录和匹配的文件中
+    os.link(os.path.join(root, 'd_0', 'f_0.txt'), os.path.join(root, 'd_1', 'linked.txt'))
+    os.link(os.path.join(root, 'd_0', 'f_0.txt'), os.path.join(root, 'd_2', 'linked.txt'))
+    try:
+        os.symlink(os.path.join(root, 'd_0'), os.path.join(root, 'link_dir'), target_is_directory=True)
+        os.symlink(os.path.join(root, 'f_0.txt'), os.path.join(root, 'link_file.txt'))
+    except OSError:
+        # Windows 上没有创建符号链接的权限时只测试耗时
+        pass
+
+
+def bench(name, root, processes, repeat=3):
+    best = None
+    records = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = list(scan(root, include_rules, processes=processes))
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    print(f'{name:<12} 结果数: {len(records):<8} 最佳耗时: {best:.3f}s')
+    # 硬链接计入哪一条结果取决于统计顺序，因此比较结果路径和总大小
+    return best, (sorted(record.abs_path for record in records), sum(record.size for record in records),
+                  sum(record.allocated for record in records))
+
+
+def main():
+    tmp_dir = None
+    if len(sys.argv) > 1:
+        root = sys.argv[1]
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='tml_bench_')
+        root = tmp_dir
+        make_root(root)
+    try:
+        threads, thread_records = bench('threads', root, False)
+        processes, process_records = bench('processes', root, True)
+        if thread_records != process_records:
+            raise AssertionError('多进程搜索的结果与进程内搜索不一致')
+        print(f'结果一致，提升: {threads / processes:.2f}x')
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+规则匹配基准测试: 对比 pathspec.PathSpec 与 CompiledRules 的 match_file 吞吐量
+
+用法(在项目根目录执行):
+    python -m benchmarks.rules
+"""
+import random
+import time
+
+import pathspec
+
+from helpers.rule_matcher import CompiledRules
+
+# 与 rule_template.txt 相同的示例规则
+include_rules = ['.idea', '.git', '__pycache__', 'dist', 'output', 'model', 'models', 'weight', 'weights', 'data',
+                 'datas', '*test*']
+exclude_rules = ['node_modules']
+
+_words = ['src', 'lib', 'main', 'index', 'utils', 'assets', 'images', 'docs', 'build', 'cache', 'core', 'app',
+          'README', 'config', 'setup', 'module', 'helpers', 'widgets']
+_exts = ['', '.py', '.js', '.json', '.png', '.txt', '.md', '.log']
+
+
+def make_names(count, seed=0):
+    """生成接近真实目录中的条目名称，其中少量会与规则匹配"""
+    rnd = random.Random(seed)
+    hits = include_rules[:-1] + exclude_rules + ['unit_test.py', 'test_utils.py']
+    names = []
+    for _ in range(count):
+        if rnd.random() < 0.05:
+            names.append(rnd.choice(hits))
+        else:
+            names.append(rnd.choice(_words) + str(rnd.randint(0, 99)) + rnd.choice(_exts))
+    return names
+
+
+def bench(name, spec_in, spec_ex, names, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pth in names:
+            if not spec_ex.match_file(pth):
+                spec_in.match_file(pth)
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    print(f'{name:<10} 条目数: {len(names)}  最佳耗时: {best:.3f}s  吞吐量: {len(names) / best:,.0f} 条/秒')
+    return len(names) / best
+
+
+def main():
+    names = make_names(200000)
+    legacy_in = pathspec.PathSpec.from_lines('gitwildmatch', include_rules)
+    legacy_ex = pathspec.PathSpec.from_lines('gitwildmatch', exclude_rules)
+    compiled_in = CompiledRules(include_rules)
+    compiled_ex = CompiledRules(exclude_rules)
+    # 确认匹配结果一致
+    for pth in names:
+        assert legacy_in.match_file(pth) == compiled_in.match_file(pth), pth
+        assert legacy_ex.match_file(pth) == compiled_ex.match_file(pth), pth
+    legacy = bench('pathspec', legacy_in, legacy_ex, names)
+    compiled = bench('compiled', compiled_in, compiled_ex, names)
+    print(f'提升: {compiled / legacy:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+遍历引擎基准测试: 对比旧的"每个目录一个 ThreadPoolExecutor"的扇出设计与工作窃取引擎的目录吞吐量(目录/秒)
+
+用法(在项目根目录执行):
+    python -m benchmarks.traversal               # 自动生成测试目录树
+    python -m benchmarks.traversal D:/some/dir   # 使用指定目录
+"""
+import concurrent.futures
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from helpers.traversal_engine import TraversalEngine
+
+
+def make_tree(root, depth=4, fanout=6, files_per_dir=8):
+    """生成一个 fanout^depth 规模的目录树"""
+    if depth == 0:
+        return
+    for i in range(files_per_dir):
+        with open(os.path.join(root, f'f_{i}.txt'), 'wb') as f:
+            f.write(b'x')
+    for i in range(fanout):
+        sub = os.path.join(root, f'd_{i}')
+        os.mkdir(sub)
+        make_tree(sub, depth - 1, fanout, files_per_dir)
+
+
+def _inspect(dir_path, name):
+    """每个条目的工作负载，与旧版 SearchRunnable.match 相同: lstat + isdir"""
+    abs_path = os.path.join(dir_path, name)
+    os.lstat(abs_path)
+    return abs_path, os.path.isdir(abs_path)
+
+
+def legacy_walk(root):
+    """
+    模拟旧设计:
+    每个目录创建一个 ThreadPoolExecutor 处理条目，再创建一个 ThreadPoolExecutor 向全局线程池提交子目录任务
+    全局线程池的最大线程数与 QThreadPool 默认值相同，为 cpu 数量
+    """
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+    lock = threading.Lock()
+    done = threading.Event()
+    state = {'pending': 1, 'dirs': 0}
+
+    def run(dir_path):
+        names = os.listdir(dir_path)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            fs = [executor.submit(_inspect, dir_path, name) for name in names]
+            results = [future.result() for future in concurrent.futures.as_completed(fs)]
+        children = [abs_path for abs_path, is_dir in results if is_dir]
+        with lock:
+            state['pending'] += len(children)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            executor.map(lambda p: pool.submit(run, p), children)
+        with lock:
+            state['dirs'] += 1
+            state['pending'] -= 1
+            if state['pending'] == 0:
+                done.set()
+
+    pool.submit(run, root)
+    done.wait()
+    pool.shutdown()
+    return state['dirs']
+
+
+def engine_walk(root, engine):
+    """使用工作窃取引擎遍历，目录为任务单位"""
+    lock = threading.Lock()
+    state = {'dirs': 0}
+
+    def visit(job, dir_path):
+        for name in os.listdir(dir_path):
+            abs_path, is_dir = _inspect(dir_path, name)
+            if is_dir:
+                engine.submit(job, visit, abs_path)
+        with lock:
+            state['dirs'] += 1
+
+    engine.start(visit, [(root,)]).wait()
+    return state['dirs']
+
+
+def bench(name, fn, repeat=3):
+    best = None
+    dirs = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dirs = fn()
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    print(f'{name:<12} 目录数: {dirs:<8} 最佳耗时: {best:.3f}s  吞吐量: {dirs / best:,.0f} 目录/秒')
+    return dirs / best
+
+
+def main():
+    tmp_dir = None
+    if len(sys.argv) > 1:
+        root = sys.argv[1]
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='tml_bench_')
+        root = tmp_dir
+        make_tree(root)
+    try:
+        engine = TraversalEngine()
+        legacy = bench('legacy', lambda: legacy_walk(root))
+        stealing = bench('engine', lambda: engine_walk(root, engine))
+        print(f'提升: {stealing / legacy:.2f}x')
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
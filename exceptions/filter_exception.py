@@ -0,0 +1,7 @@
+class FilterException(Exception):
+    """过滤表达式的语法错误"""
+
+    def __init__(self, message: str, position: int = -1):
+        super().__init__(message)
+        # 出错的位置(字符下标)，未知时为 -1
+        self.position = position
@@ -0,0 +1,231 @@
+"""
+asyncio 接口
+多个搜索和删除可以共享同一个事件循环:
+- 搜索在共享的遍历引擎上执行，结果经过缓冲区送回事件循环，消费过慢时暂停该次搜索(背压)，不阻塞共享的工作线程
+- 删除在共享的有界线程池中执行，同时提交的删除数量受 concurrency 限制
+取消调用方的 task 即可取消搜索或删除
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import os
+import threading
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable
+
+from exceptions.delete_exception import DeleteException
+from helpers.cancellation import CancelEvent
+from helpers.deleter import delete_path
+from helpers.fs_index import FsIndex
+from helpers.io_scheduler import IoScheduler
+from helpers.scan_stats import ScanStats
+from helpers.scanner import Predicate, ScanRecord, Scanner, build_spec
+from helpers.top_n import TopN
+from helpers.traversal_engine import TraversalEngine, TraversalJob
+
+# 共享线程池的线程数
+IO_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# 单次删除同时提交到线程池的最大任务数
+DEFAULT_DELETE_CONCURRENCY = 8
+# 单次搜索在缓冲区中积压的最大结果数
+DEFAULT_MAX_BUFFERED = 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """获取所有事件循环共享的有界线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(IO_WORKERS, thread_name_prefix='AsyncIO')
+        return _executor
+
+
+class _RecordBuffer:
+    """
+    遍历引擎工作线程与事件循环之间的缓冲区
+    积压的结果达到 max_buffered 时暂停该次搜索的 job(背压)，事件循环取走结果后再恢复；
+    暂停只影响这一次搜索，不会阻塞共享的工作线程，同一引擎上的其他搜索照常进行。
+    暂停前已经开始的任务仍会输出结果，因此积压的结果数可能略超过 max_buffered
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffered):
+        self.loop = loop
+        self.max_buffered = max_buffered
+        self._records = deque()
+        self._lock = threading.Lock()
+        self._engine = TraversalEngine.get_instance()
+        self._job: TraversalJob | None = None
+        # 只在事件循环中访问
+        self._wakeup = asyncio.Event()
+
+    def attach(self, job: TraversalJob):
+        """关联搜索的 job，关联之前积压的结果已达到上限时立即暂停"""
+        with self._lock:
+            self._job = job
+            if len(self._records) >= self.max_buffered:
+                self._engine.pause(job)
+
+    def put(self, record):
+        """在工作线程中调用，不会等待"""
+        with self._lock:
+            self._records.append(record)
+            first = len(self._records) == 1
+            if len(self._records) >= self.max_buffered and self._job is not None:
+                self._engine.pause(self._job)
+        if first:
+            self.notify()
+
+    def notify(self):
+        """唤醒事件循环中等待结果的协程，可以在任意线程中调用"""
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+
+    def drain(self) -> list[ScanRecord]:
+        self._wakeup.clear()
+        with self._lock:
+            records = list(self._records)
+            self._records.clear()
+            if self._job is not None:
+                self._engine.resume(self._job)
+        return records
+
+    def close(self):
+        """搜索结束或被取消时调用，放回暂存的任务使已取消的 job 能够结束"""
+        with self._lock:
+            if self._job is not None:
+                self._engine.resume(self._job)
+
+    async def wait(self):
+        await self._wakeup.wait()
+
+
+async def scan(root: str, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None,
+               predicates: Iterable[Predicate] | None = None, stats: ScanStats | None = None,
+               index: FsIndex | None = None, max_buffered=DEFAULT_MAX_BUFFERED,
+               estimate=False, top_n: int | None = None) -> AsyncIterator[ScanRecord]:
+    """
+    搜索 root 并以异步流的形式逐条产出结果，参数与 helpers.scanner.scan 相同
+    取消消费的 task 或关闭生成器(建议使用 contextlib.aclosing)会取消搜索
+    :param max_buffered: 缓冲区中积压的最大结果数
+    :return: ScanRecord 异步生成器，搜索中出现的第一个异常会在结果产出完毕后抛出
+    """
+    stats = stats if stats is not None else ScanStats()
+    cancel_event = CancelEvent()
+    buffer = _RecordBuffer(asyncio.get_running_loop(), max_buffered)
+    top = TopN(top_n) if top_n is not None else None
+    scanner = Scanner(build_spec(include), build_spec(exclude), buffer.put if top is None else top.offer,
+                      predicates, stats=stats, index=index, estimate=estimate, top=top)
+    job = scanner.start(root, cancel_event)
+    buffer.attach(job)
+    job.add_done_callback(lambda _: buffer.notify())
+    try:
+        while True:
+            records = buffer.drain()
+            for record in records:
+                yield record
+            if len(records) > 0:
+                continue
+            # 所有结果都在 job 完成之前放入缓冲区
+            if job.done_event.is_set():
+                break
+            await buffer.wait()
+    finally:
+        if not job.done_event.is_set():
+            cancel_event.set()
+        buffer.close()
+        if index is not None:
+            index.flush()
+        stats.finish()
+    if top is not None and not job.is_cancelled():
+        stats.top_discarded = top.discarded
+        for record in top.results():
+            yield record
+    if len(job.errors) > 0 and not job.is_cancelled():
+        raise job.errors[0]
+
+
+def _plan_item(item):
+    """删除计划中的一项可以是 ScanRecord 或 (路径, 是否目录)"""
+    if isinstance(item, ScanRecord):
+        return item.abs_path, item.is_dir
+    pth, is_dir = item
+    return pth, is_dir
+
+
+async def delete(plan: Iterable[ScanRecord | tuple[str, bool]] | AsyncIterable[ScanRecord | tuple[str, bool]],
+                 concurrency=DEFAULT_DELETE_CONCURRENCY,
+                 on_deleted: Callable[[str], None] | None = None,
+                 on_error: Callable[[DeleteException], None] | None = None) -> list[str]:
+    """
+    在共享线程池中删除计划中的所有条目
+    同时提交的删除数量不超过 concurrency，同一个设备上的并发还受 IoScheduler 的设备限制，
+    计划可以是惰性的迭代器或异步迭代器(例如 scan 的结果)
+    取消调用方的 task 后，尚未开始的删除不会再执行
+    :param plan: 需要删除的条目
+    :param concurrency: 同时执行的最大删除数
+    :param on_deleted: 每删除一个条目后在事件循环中调用，参数为路径
+    :param on_error: 删除失败时在事件循环中调用，参数为 DeleteException；传入后不再抛出删除异常
+    :return: 已删除的路径列表，未传入 on_error 时，出现的第一个 DeleteException 会在其他条目处理完毕后抛出
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    cancel_event = CancelEvent()
+    semaphore = asyncio.Semaphore(concurrency)
+    deleted = []
+    errors = []
+    tasks = set()
+
+    scheduler = IoScheduler.get_instance()
+    # key: 设备号  value: 该设备的并发限制
+    device_semaphores: dict[int, asyncio.Semaphore] = {}
+
+    async def _delete_one(pth, is_dir):
+        try:
+            dev = await loop.run_in_executor(executor, scheduler.device_of, pth)
+            limit = scheduler.limit(dev)
+            if limit is not None and dev not in device_semaphores:
+                device_semaphores[dev] = asyncio.Semaphore(limit)
+            async with device_semaphores[dev] if limit is not None else contextlib.nullcontext():
+                done = await loop.run_in_executor(executor, delete_path, pth, is_dir, cancel_event)
+            if done:
+                deleted.append(pth)
+                if on_deleted is not None:
+                    on_deleted(pth)
+        except DeleteException as e:
+            if on_error is not None:
+                on_error(e)
+            else:
+                errors.append(e)
+        finally:
+            semaphore.release()
+
+    async def _submit(item):
+        pth, is_dir = _plan_item(item)
+        await semaphore.acquire()
+        task = loop.create_task(_delete_one(pth, is_dir))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    try:
+        if isinstance(plan, AsyncIterable):
+            async for item in plan:
+                await _submit(item)
+        else:
+            for item in plan:
+                await _submit(item)
+        if len(tasks) > 0:
+            await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        for task in tasks:
+            task.cancel()
+        raise
+    if len(errors) > 0:
+        raise errors[0]
+    return deleted
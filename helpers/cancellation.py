@@ -0,0 +1,34 @@
+import threading
+import time
+
+# 取消后等待任务停止的最长时间(秒)，所有长循环都逐条目检查取消事件，正常情况下远小于该值
+CANCEL_LATENCY_BUDGET = 1.0
+
+
+class CancelEvent(threading.Event):
+    """记录取消时间的取消事件，用于统计从取消到任务全部停止的耗时"""
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled_at = None
+
+    def set(self):
+        if self.cancelled_at is None:
+            self.cancelled_at = time.perf_counter()
+        super().set()
+
+    def clear(self):
+        self.cancelled_at = None
+        super().clear()
+
+
+def cancel_latency(cancel_event):
+    """
+    获取从取消到现在经过的时间
+    :param cancel_event: 取消事件，只有 CancelEvent 记录了取消时间
+    :return: 秒数，未取消或不是 CancelEvent 时返回 None
+    """
+    cancelled_at = getattr(cancel_event, 'cancelled_at', None)
+    if cancelled_at is None or not cancel_event.is_set():
+        return None
+    return time.perf_counter() - cancelled_at
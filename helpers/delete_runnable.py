@@ -1,41 +1,38 @@
-import os
-import shutil
-import stat
+import sys
+from collections import deque
 
 from PySide6.QtCore import QRunnable
 
 from exceptions.delete_exception import DeleteException
-
-
-def _delete_file(pth):
-    try:
-        os.chmod(pth, stat.S_IWRITE)
-        os.remove(pth)
-    except Exception as e:
-        raise DeleteException(str(e), pth)
-
-
-def _on_error(func, pth, _):
-    if os.path.isfile(pth):
-        _delete_file(pth)
-    else:
-        raise DeleteException(f'目录删除失败: {pth}', pth)
+from helpers.deleter import delete_path
 
 
 class DeleteRunnable(QRunnable):
-    def __init__(self, pth, is_dir, queue=None, cancel_event=None):
+    """
+    删除 items 中的条目直到队列为空
+    同一个设备上的多个 runnable 共享一个队列，runnable 的数量即该设备的删除并发数
+    某一项删除失败时交给全局异常处理器处理，继续删除队列中的其余条目
+    """
+
+    # items: (路径, 是否目录) 的队列
+    # queue: 每删除成功一个条目放入其路径，用于显示进度和移除表格中已删除的行
+    def __init__(self, items: deque, queue=None, cancel_event=None):
         super().__init__()
+        self.items = items
         self.queue = queue
         self.cancel_event = cancel_event
-        self.pth = pth
-        self.is_dir = is_dir
 
     def run(self):
-        if self.cancel_event is not None and self.cancel_event.is_set():
-            return
-        if self.is_dir:
-            shutil.rmtree(self.pth, onerror=_on_error)
-        else:
-            _delete_file(self.pth)
-        if self.queue is not None:
-            self.queue.put(self.pth)
+        while True:
+            try:
+                pth, is_dir = self.items.popleft()
+            except IndexError:
+                return
+            try:
+                if not delete_path(pth, is_dir, self.cancel_event):
+                    return
+            except DeleteException as e:
+                sys.excepthook(type(e), e, e.__traceback__)
+                continue
+            if self.queue is not None:
+                self.queue.put(pth)
@@ -0,0 +1,123 @@
+"""
+不依赖 Qt 的删除核心
+GUI 的 DeleteRunnable、asyncio 接口和脚本都通过 delete_path 删除文件或目录
+"""
+import os
+import stat
+
+from exceptions.delete_exception import DeleteException
+from helpers.scan_stats import STAT_IS_FREE
+
+
+def _delete_file(pth):
+    try:
+        os.chmod(pth, stat.S_IWRITE)
+        os.remove(pth)
+    except Exception as e:
+        raise DeleteException(str(e), pth) from e
+
+
+def _delete_dir(pth):
+    """删除空目录，失败时去掉只读属性后重试"""
+    try:
+        os.rmdir(pth)
+    except OSError:
+        try:
+            os.chmod(pth, stat.S_IWRITE)
+            os.rmdir(pth)
+        except OSError as e:
+            raise DeleteException(f'目录删除失败: {pth}', pth) from e
+
+
+def _is_link(entry: os.DirEntry):
+    """符号链接或 Windows 的重解析点(例如目录联接)，删除时只删除链接本身，不进入其中"""
+    if entry.is_symlink():
+        return True
+    return STAT_IS_FREE and bool(entry.stat(follow_symlinks=False).st_file_attributes &
+                                 stat.FILE_ATTRIBUTE_REPARSE_POINT)
+
+
+def _delete_link(pth):
+    """删除链接本身，不修改链接目标的属性"""
+    try:
+        # 指向目录的链接在 Windows 上需要用 rmdir 删除
+        if os.name == 'nt' and os.path.isdir(pth):
+            os.rmdir(pth)
+        else:
+            os.remove(pth)
+    except OSError as e:
+        raise DeleteException(str(e), pth) from e
+
+
+def _vanished(e: DeleteException):
+    """删除失败是否因为条目已经不存在"""
+    return isinstance(e.__cause__, FileNotFoundError)
+
+
+def _delete_tree(top, cancel_event=None):
+    """
+    迭代删除目录树，每删除一个条目前检查取消事件
+    :return: 是否删除完成，被取消时返回 False，已经删除的条目不会恢复
+    """
+    # (目录路径, 是否已处理过其中的条目)，子条目全部删除后再删除目录本身
+    stack = [(top, False)]
+    while len(stack) > 0:
+        if cancel_event is not None and cancel_event.is_set():
+            return False
+        dir_path, visited = stack.pop()
+        if visited:
+            try:
+                _delete_dir(dir_path)
+            except DeleteException as e:
+                if dir_path == top or not _vanished(e):
+                    raise
+            continue
+        stack.append((dir_path, True))
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except FileNotFoundError as e:
+            if dir_path == top:
+                raise DeleteException(f'目录删除失败: {dir_path}', dir_path) from e
+            # 子目录在删除过程中已经被删除
+            stack.pop()
+            continue
+        except OSError as e:
+            raise DeleteException(f'目录删除失败: {dir_path}', dir_path) from e
+        for entry in entries:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            try:
+                if _is_link(entry):
+                    _delete_link(entry.path)
+                elif entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, False))
+                else:
+                    _delete_file(entry.path)
+            except DeleteException as e:
+                if _vanished(e):
+                    # 条目在删除过程中已经被删除
+                    continue
+                raise
+    return True
+
+
+def delete_path(pth, is_dir, cancel_event=None):
+    """
+    删除一个文件或目录
+    目录被迭代删除，删除过程中每个条目都会检查取消事件，取消后最多再删除一个条目
+    :param pth: 路径
+    :param is_dir: 是否为目录，目录会被递归删除，指向目录的链接只删除链接本身
+    :param cancel_event: 取消事件，已取消时不删除
+    :return: 是否执行了完整的删除，取消时返回 False
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return False
+    if not is_dir:
+        _delete_file(pth)
+    elif os.path.islink(pth) or (STAT_IS_FREE and bool(os.lstat(pth).st_file_attributes &
+                                                        stat.FILE_ATTRIBUTE_REPARSE_POINT)):
+        _delete_link(pth)
+    else:
+        return _delete_tree(pth, cancel_event)
+    return True
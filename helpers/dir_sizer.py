@@ -0,0 +1,194 @@
+import threading
+
+from exceptions.search_exception import SearchException
+from helpers.fs_index import open_dir, stat_is_free
+from helpers.io_scheduler import IoScheduler
+from helpers.scan_stats import ScanStats
+from helpers.size_accounting import InodeSet, file_usage, link_stat
+from helpers.staleness import file_times
+from helpers.traversal_engine import TraversalEngine, TraversalJob
+
+
+class _SizeNode:
+    """子树中的一个目录节点"""
+    __slots__ = ('parent', 'size', 'allocated', 'mtime', 'atime', 'pending')
+
+    def __init__(self, parent):
+        self.parent = parent
+        # 当前已汇总的大小: 自身文件大小 + 已完成的子目录大小
+        self.size = 0
+        self.allocated = 0
+        # 当前已汇总的最新时间
+        self.mtime = 0.0
+        self.atime = 0.0
+        # 未完成的工作数: 自身的列目录任务 + 未完成的子目录
+        self.pending = 1
+
+
+class SubtreeSizer:
+    """
+    并行、迭代地统计一个目录子树的大小
+    子树中的每个目录都是遍历引擎上的一个任务，目录完成后把大小自底向上累加到父目录，
+    根目录完成时调用 on_done 回调
+    同时统计表观大小和占用空间，硬链接通过 seen 只统计一次
+    在同一次 stat 中汇总子树中文件最新的 mtime 和 atime，不产生额外的系统调用
+    该类不会阻塞调用线程，可以在遍历引擎的工作线程中使用
+    """
+
+    def __init__(self, job: TraversalJob, root_path: str, on_done, stats: ScanStats | None = None, index=None,
+                 seen: InodeSet | None = None, max_size: int | None = None):
+        """
+        :param job: 任务所属的 job，取消 job 即可取消统计
+        :param root_path: 需要统计的目录
+        :param on_done: 统计完成的回调，参数为 (表观大小, 占用空间, 最新的 mtime, 最新的 atime)，取消后不会被调用
+        :param stats: 统计信息，用于记录进度和系统调用次数
+        :param index: 持久化索引(FsIndex)，为 None 时直接读取文件系统
+        :param seen: 已统计的 inode 集合，同一次搜索中的所有 SubtreeSizer 应共享同一个集合
+        :param max_size: 表观大小的上限，已统计的大小达到上限时放弃统计，不再调用 on_done，
+                         用于结果需要小于某个大小的搜索，None 代表不限制
+        """
+        self.job = job
+        self.root_path = root_path
+        self.on_done = on_done
+        self.stats = stats
+        self.index = index
+        self.seen = seen if seen is not None else InodeSet()
+        self._lock = threading.Lock()
+        # 已经统计到的表观大小，用于判断是否达到 max_size，所有 SubtreeSizer 的进度累加在 stats.sized_bytes 中
+        self.partial_size = 0
+        # 子树中链接数大于 1 的文件数，不为 0 时不缓存子树大小
+        self.linked_files = 0
+        self.max_size = max_size
+        # 是否因达到大小上限而放弃了统计
+        self.abandoned = False
+
+    def start(self):
+        if self.index is not None:
+            sizes = self.index.cached_subtree_size(self.root_path)
+            if sizes is not None:
+                self.on_done(*sizes)
+                return
+        TraversalEngine.get_instance().submit(self.job, self._visit, _SizeNode(None), self.root_path)
+
+    def _visit(self, job, node, dir_path):
+        if self.abandoned:
+            return
+        total = 0
+        allocated = 0
+        newest_mtime = 0.0
+        newest_atime = 0.0
+        files = 0
+        linked = 0
+        duplicates = 0
+        subdirs = []
+        stat_calls = 0
+        try:
+            with open_dir(dir_path, self.index, self.stats) as entries:
+                for entry in entries:
+                    if job.is_cancelled():
+                        return
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        st, extra_stat = link_stat(entry, self.seen is not None)
+                        stat_calls += extra_stat
+                        size, file_allocated, duplicate = file_usage(st, self.seen, self.root_path)
+                        total += size
+                        allocated += file_allocated
+                        files += 1
+                        mtime, atime = file_times(st)
+                        if mtime > newest_mtime:
+                            newest_mtime = mtime
+                        if atime > newest_atime:
+                            newest_atime = atime
+                        if st.st_nlink > 1:
+                            linked += 1
+                            duplicates += duplicate
+                        if not stat_is_free(entry):
+                            stat_calls += 1
+        except OSError:
+            raise SearchException(f'路径: {dir_path} \n统计目录大小时出现异常，这种情况通常是因为该文件或目录被系统保护了\n'
+                                  f'建议添加名称到排除列表')
+        if self.stats is not None:
+            self.stats.add(sized_dirs=1, sized_files=files, sized_bytes=total, stat_calls=stat_calls,
+                           list_calls=1 if self.index is None else 0, duplicate_links=duplicates)
+        with self._lock:
+            self.partial_size += total
+            self.linked_files += linked
+            node.size += total
+            node.allocated += allocated
+            node.mtime = max(node.mtime, newest_mtime)
+            node.atime = max(node.atime, newest_atime)
+            node.pending += len(subdirs)
+            if self.max_size is not None and self.partial_size >= self.max_size and not self.abandoned:
+                # 大小只会继续增加，子树已不可能满足条件，放弃其余的目录
+                self.abandoned = True
+                if self.stats is not None:
+                    self.stats.add(abandoned_subtrees=1)
+            if self.abandoned:
+                return
+        engine = TraversalEngine.get_instance()
+        for sub_path in subdirs:
+            engine.submit(job, self._visit, _SizeNode(node), sub_path)
+        self._complete(node)
+
+    def _complete(self, node):
+        """节点的一项工作完成，若节点全部完成则向上汇总"""
+        with self._lock:
+            while node is not None:
+                node.pending -= 1
+                if node.pending > 0:
+                    return
+                if node.parent is None:
+                    break
+                node.parent.size += node.size
+                node.parent.allocated += node.allocated
+                node.parent.mtime = max(node.parent.mtime, node.mtime)
+                node.parent.atime = max(node.parent.atime, node.atime)
+                node = node.parent
+        if self.index is not None and self.linked_files == 0:
+            self.index.store_subtree_size(self.root_path, node.size, node.allocated, node.mtime, node.atime)
+        self.on_done(node.size, node.allocated, node.mtime, node.atime)
+
+
+def start_subtree_size(dir_path, on_done, cancel_event=None, stats: ScanStats | None = None,
+                       index=None, max_size: int | None = None, seen: InodeSet | None = None) -> TraversalJob:
+    """
+    在遍历引擎上并行统计目录大小，不阻塞调用线程
+    :param dir_path: 目录路径
+    :param on_done: 统计完成的回调，参数为 (表观大小, 占用空间, 最新的 mtime, 最新的 atime)，在工作线程中调用，
+                    取消后不会被调用
+    :param cancel_event: 取消事件
+    :param stats: 统计信息
+    :param index: 持久化索引
+    :param max_size: 表观大小的上限，达到上限时放弃统计，不调用 on_done
+    :param seen: 已统计的 inode 集合，为 None 时使用新的集合
+    :return: 遍历引擎中的 job
+    """
+
+    def _start(job):
+        SubtreeSizer(job, dir_path, on_done, stats, index, seen, max_size).start()
+
+    return TraversalEngine.get_instance().start(_start, [()], cancel_event, IoScheduler.device_of(dir_path))
+
+
+def subtree_size(dir_path, cancel_event=None, stats: ScanStats | None = None, index=None,
+                 max_size: int | None = None, seen: InodeSet | None = None):
+    """
+    在遍历引擎上并行统计目录大小，阻塞直到统计完成
+    不能在遍历引擎的工作线程中调用，工作线程中请直接使用 SubtreeSizer
+    :param dir_path: 目录路径
+    :param cancel_event: 取消事件
+    :param stats: 统计信息
+    :param index: 持久化索引
+    :param max_size: 表观大小的上限，达到上限时放弃统计
+    :param seen: 已统计的 inode 集合，为 None 时使用新的集合
+    :return: (表观大小, 占用空间, 最新的 mtime, 最新的 atime)，被取消或放弃统计时返回 None
+    """
+    result = []
+    job = start_subtree_size(dir_path, lambda *sizes: result.append(sizes), cancel_event, stats, index, max_size,
+                             seen)
+    job.wait()
+    if len(job.errors) > 0:
+        raise job.errors[0]
+    return result[0] if len(result) > 0 else None
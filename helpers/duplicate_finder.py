@@ -0,0 +1,219 @@
+"""
+重复文件查找
+在搜索结果中找出内容完全相同的文件，分三个阶段逐步缩小候选范围，代价高的阶段只处理通过了前一阶段的文件:
+1. 按表观大小分组，大小唯一的文件不可能重复，不需要任何 I/O
+2. 读取文件头部和尾部各 SAMPLE_SIZE 字节计算样本哈希，同时 lstat 排除同一个 inode 的硬链接(删除硬链接不能释放空间);
+   不超过两个样本大小的文件样本即全部内容，不再进入第 3 阶段
+3. 对样本哈希仍然相同的文件通过 mmap 计算完整内容的哈希
+第 2、3 阶段在遍历引擎上并行执行，按设备限制并发，机械硬盘上不会因为大量并发读取而来回寻道
+"""
+import hashlib
+import mmap
+import os
+import threading
+from typing import Iterable, NamedTuple
+
+from helpers.cancellation import CancelEvent
+from helpers.io_scheduler import IoScheduler
+from helpers.scan_stats import ScanStats
+from helpers.scanner import ScanRecord
+from helpers.traversal_engine import TraversalEngine
+
+# 样本哈希读取的头部和尾部字节数
+SAMPLE_SIZE = 64 * 1024
+# 完整哈希时每次送入哈希函数的字节数，两次之间检查取消事件
+HASH_CHUNK = 8 * 1024 * 1024
+# 哈希结果的字节数
+_DIGEST_SIZE = 20
+
+
+class DuplicateGroup(NamedTuple):
+    """一组内容相同的文件"""
+    # 每个文件的表观大小
+    size: int
+    # 内容哈希(十六进制)
+    digest: str
+    # 文件路径，至少两个，按路径排序
+    paths: list[str]
+
+    @property
+    def reclaimable(self) -> int:
+        """每组只保留一个文件时可以释放的字节数"""
+        return self.size * (len(self.paths) - 1)
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=_DIGEST_SIZE)
+
+
+def sample_digest(pth, size, sample_size=SAMPLE_SIZE) -> str:
+    """
+    文件头部和尾部的样本哈希，不超过两个样本大小的文件读取全部内容
+    :param size: 文件大小，参与哈希，使不同大小的文件样本不会相同
+    """
+    h = _new_hash()
+    h.update(size.to_bytes(8, 'little'))
+    with open(pth, 'rb') as f:
+        if size <= 2 * sample_size:
+            h.update(f.read())
+        else:
+            h.update(f.read(sample_size))
+            f.seek(-sample_size, os.SEEK_END)
+            h.update(f.read(sample_size))
+    return h.hexdigest()
+
+
+def full_digest(pth, cancel_event=None) -> str | None:
+    """
+    通过 mmap 计算文件完整内容的哈希
+    哈希函数直接读取映射的内存，不需要把文件内容复制到 Python 的 bytes 中
+    :return: 十六进制哈希，取消时返回 None
+    """
+    h = _new_hash()
+    with open(pth, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        h.update(size.to_bytes(8, 'little'))
+        if size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as view:
+                for offset in range(0, size, HASH_CHUNK):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                    h.update(view[offset:offset + HASH_CHUNK])
+    return h.hexdigest()
+
+
+def run_per_device(fn, items, cancel_event):
+    """
+    在遍历引擎上对每一项执行 fn(job, *item[1:])，按 item[0] 所在的设备分组限制并发，并等待全部完成
+    :param items: (设备路径, ...) 元组列表，设备路径用于确定设备，通常为搜索根目录
+    :param cancel_event: 取消事件
+    """
+    groups: dict[str, list] = {}
+    for item in items:
+        groups.setdefault(item[0], []).append(item[1:])
+    engine = TraversalEngine.get_instance()
+    jobs = [engine.start(fn, args_list, cancel_event, IoScheduler.device_of(device_path))
+            for device_path, args_list in groups.items()]
+    for job in jobs:
+        job.wait()
+
+
+class DuplicateFinder:
+    """在一批文件中查找重复文件，见模块说明"""
+
+    def __init__(self, cancel_event=None, stats: ScanStats | None = None, sample_size=SAMPLE_SIZE):
+        """
+        :param cancel_event: 取消事件
+        :param stats: 统计信息，记录每个阶段处理的文件数和读取的字节数
+        :param sample_size: 样本哈希读取的头部和尾部字节数
+        """
+        self.cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+        self.stats = stats if stats is not None else ScanStats()
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+
+    def _run(self, fn, items):
+        run_per_device(fn, items, self.cancel_event)
+
+    def _sample(self, job, pth, size, results):
+        if job.is_cancelled():
+            return
+        try:
+            st = os.lstat(pth)
+            if st.st_size != size:
+                # 搜索之后文件被修改，不再参与比较
+                return
+            digest = sample_digest(pth, size, self.sample_size)
+        except OSError:
+            return
+        self.stats.add(dup_sampled_files=1, dup_read_bytes=min(size, 2 * self.sample_size))
+        with self._lock:
+            results.append((pth, size, (st.st_dev, st.st_ino), digest))
+
+    def _hash(self, job, pth, size, results):
+        if job.is_cancelled():
+            return
+        try:
+            digest = full_digest(pth, job.cancel_event)
+        except (OSError, ValueError):
+            return
+        if digest is None:
+            return
+        self.stats.add(dup_hashed_files=1, dup_read_bytes=size)
+        with self._lock:
+            results.append((pth, size, digest))
+
+    def find(self, files: Iterable[tuple[str, int, str]]) -> list[DuplicateGroup]:
+        """
+        查找重复文件
+        :param files: (路径, 表观大小, 所在搜索根目录) 列表，搜索根目录用于按设备限制并发
+        :return: 重复文件组，按可释放的字节数从大到小排序；取消时返回已经确认的部分
+        """
+        # 第 1 阶段: 按大小分组
+        by_size: dict[int, list[tuple[str, str]]] = {}
+        for pth, size, scan_root in files:
+            by_size.setdefault(size, []).append((pth, scan_root))
+        roots = {}
+        candidates = []
+        for size, group in by_size.items():
+            if len(group) < 2:
+                continue
+            for pth, scan_root in group:
+                roots[pth] = scan_root or os.path.dirname(pth)
+                candidates.append((roots[pth], pth, size))
+        self.stats.add(dup_candidates=len(candidates))
+
+        # 第 2 阶段: 样本哈希，同一个 inode 只保留一个路径
+        sampled = []
+        self._run(lambda job, pth, size: self._sample(job, pth, size, sampled), candidates)
+        by_sample: dict[tuple[int, str], dict[tuple[int, int], str]] = {}
+        for pth, size, inode, digest in sorted(sampled):
+            inodes = by_sample.setdefault((size, digest), {})
+            if inode in inodes:
+                self.stats.add(duplicate_links=1)
+                continue
+            inodes[inode] = pth
+
+        groups = []
+        need_hash = []
+        for (size, digest), inodes in by_sample.items():
+            if len(inodes) < 2:
+                continue
+            paths = sorted(inodes.values())
+            if size <= 2 * self.sample_size:
+                # 样本即全部内容
+                groups.append(DuplicateGroup(size, digest, paths))
+            else:
+                need_hash.extend((roots[pth], pth, size) for pth in paths)
+
+        # 第 3 阶段: 完整哈希
+        hashed = []
+        self._run(lambda job, pth, size: self._hash(job, pth, size, hashed), need_hash)
+        by_digest: dict[tuple[int, str], list[str]] = {}
+        for pth, size, digest in hashed:
+            by_digest.setdefault((size, digest), []).append(pth)
+        for (size, digest), paths in by_digest.items():
+            if len(paths) >= 2:
+                groups.append(DuplicateGroup(size, digest, sorted(paths)))
+        groups.sort(key=lambda group: (-group.reclaimable, group.paths[0]))
+        self.stats.add(dup_groups=len(groups), dup_reclaimable_bytes=sum(group.reclaimable for group in groups))
+        return groups
+
+
+def find_duplicates(records: Iterable[ScanRecord], cancel_event=None, stats: ScanStats | None = None,
+                    min_size=1) -> list[DuplicateGroup]:
+    """
+    在搜索结果中查找重复文件，目录和小于 min_size 的文件不参与比较
+    :param records: 搜索结果，例如 scan 的返回值
+    :param cancel_event: 取消事件
+    :param stats: 统计信息
+    :param min_size: 参与比较的最小文件大小，默认跳过空文件
+    :return: 重复文件组，按可释放的字节数从大到小排序
+    """
+    files = ((record.abs_path, record.size, record.scan_root) for record in records
+             if not record.is_dir and record.size >= min_size)
+    return DuplicateFinder(cancel_event, stats).find(files)
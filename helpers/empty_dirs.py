@@ -0,0 +1,104 @@
+"""
+空目录
+清理构建输出之后通常会留下大量只剩空目录的骨架，EmptyDirTracker 在搜索的同一次遍历中顺带找出它们，不需要再次搜索:
+遍历每个目录时记录该目录的条目数、匹配的条目数以及是否有一定会保留的条目(不匹配的文件、被排除或被剪枝的目录等)，
+搜索结束后结合实际输出的结果(即删除计划)自底向上判断:
+- 子树中没有任何文件的目录为空目录(EMPTY_NOW)
+- 子树中的文件全部属于删除计划的目录在删除后为空(EMPTY_AFTER_DELETE)
+合并模式下只报告最外层的空目录，删除一次即可连同其中的空目录和删除计划一起移除
+搜索根目录本身不会被报告；没有完整遍历的子树(例如没有权限)所在的目录不会被认为是空目录
+"""
+import os
+import threading
+
+from helpers.scanner import ScanRecord
+
+# ScanRecord.empty 的取值
+EMPTY_NONE = 0
+EMPTY_NOW = 1
+EMPTY_AFTER_DELETE = 2
+
+
+class EmptyDirTracker:
+    """收集一次搜索中的目录信息，搜索结束后计算空目录，见模块说明"""
+
+    def __init__(self, collapse=False):
+        """
+        :param collapse: 是否只报告最外层的空目录
+        """
+        self.collapse = collapse
+        self._lock = threading.Lock()
+        # 遍历过的目录  key: 目录路径  value: (条目数, 匹配的条目数, 递归进入的子目录数, 是否有一定保留的条目, 搜索根目录)
+        # 搜索根目录为 None 代表该目录就是搜索根目录
+        self._dirs: dict[str, tuple[int, int, int, bool, str | None]] = {}
+        # 删除计划中直接位于各目录下的结果数
+        self._planned: dict[str, int] = {}
+
+    def visit(self, dir_path, entries, matched, subdirs, kept, scan_root=None):
+        """
+        记录一个遍历过的目录，由 Scanner 在列出目录后调用
+        :param entries: 条目数
+        :param matched: 匹配的条目数
+        :param subdirs: 递归进入的子目录数
+        :param kept: 是否有一定会保留的条目
+        :param scan_root: 所属的搜索根目录，为 None 代表该目录就是搜索根目录
+        """
+        with self._lock:
+            self._dirs[os.path.normpath(dir_path)] = (entries, matched, subdirs, kept, scan_root)
+
+    def plan(self, record: ScanRecord):
+        """记录一条输出的结果，结果所在的目录删除该结果后可能为空"""
+        dir_path = os.path.normpath(record.root)
+        with self._lock:
+            self._planned[dir_path] = self._planned.get(dir_path, 0) + 1
+
+    def states(self) -> dict[str, int]:
+        """
+        计算遍历过的目录的空目录状态
+        :return: key: 目录路径  value: EMPTY_NOW 或 EMPTY_AFTER_DELETE，不为空的目录不出现在结果中
+        """
+        with self._lock:
+            dirs = dict(self._dirs)
+            planned = dict(self._planned)
+        visited_children: dict[str, list[str]] = {}
+        for dir_path in dirs:
+            parent = os.path.dirname(dir_path)
+            if parent in dirs and parent != dir_path:
+                visited_children.setdefault(parent, []).append(dir_path)
+        states = {}
+        # 子目录的路径总是比所在目录长，按路径长度从长到短处理即为自底向上
+        for dir_path in sorted(dirs, key=len, reverse=True):
+            entries, matched, subdirs, kept, _ = dirs[dir_path]
+            children = visited_children.get(dir_path, [])
+            if kept or len(children) != subdirs or planned.get(dir_path, 0) < matched:
+                continue
+            child_states = [states.get(child) for child in children]
+            if None in child_states:
+                continue
+            if matched == 0 and all(state == EMPTY_NOW for state in child_states):
+                states[dir_path] = EMPTY_NOW
+            else:
+                states[dir_path] = EMPTY_AFTER_DELETE
+        return states
+
+    def records(self) -> list[ScanRecord]:
+        """
+        空目录的结果，大小为 0，empty 为空目录状态
+        合并模式下只包含最外层的空目录，按路径排序
+        """
+        states = self.states()
+        with self._lock:
+            dirs = dict(self._dirs)
+        records = []
+        for dir_path in sorted(states):
+            scan_root = dirs[dir_path][4]
+            if scan_root is None:
+                # 不删除搜索根目录本身
+                continue
+            parent = os.path.dirname(dir_path)
+            if self.collapse and parent in states and dirs[parent][4] is not None:
+                continue
+            records.append(ScanRecord(parent, os.path.basename(dir_path), dir_path, True,
+                                      os.path.splitext(dir_path)[-1].lower(), 0, 0, scan_root=scan_root,
+                                      empty=states[dir_path]))
+        return records
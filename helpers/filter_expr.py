@@ -0,0 +1,330 @@
+"""
+过滤表达式
+搜索开始时解析并编译一次，得到由闭包组成的谓词，不使用 eval
+
+语法:
+    表达式   := 或表达式
+    或表达式 := 与表达式 ('or' 与表达式)*
+    与表达式 := 非表达式 ('and' 非表达式)*
+    非表达式 := 'not' 非表达式 | '(' 表达式 ')' | 比较
+    比较     := ('size' | 'allocated') 运算符 大小      例如 size >= 100MB, allocated < 1.5GB
+              | 'depth' 运算符 整数                    相对搜索目录的深度，搜索目录的直接子条目为 1
+              | 'age' 运算符 时长                      闲置时间，例如 age >= 90d，见 helpers.staleness
+              | 'type' ('==' | '!=') ('file' | 'dir')
+              | 'ext' ('==' | '!=') 扩展名              例如 ext == .log
+              | 'ext' ['not'] 'in' '(' 扩展名, ... ')'  例如 ext in (.log, .tmp)
+    运算符   := '<' | '<=' | '>' | '>=' | '==' | '!='  ('=' 等同于 '==')
+关键字和单位不区分大小写，大小单位为 B/KB/MB/GB/TB(1024 进制)，省略单位时为字节;
+时长单位为 h/d/w/y(小时、天、周、365 天)，省略单位时为天
+
+编译结果可以在大小未知时求值(三值逻辑)，遍历时据此在 stat 和统计目录大小之前丢弃不可能满足条件的条目
+"""
+import operator
+import os
+import re
+import time
+from typing import Callable, NamedTuple
+
+from exceptions.filter_exception import FilterException
+from helpers.scanner import ScanRecord
+from helpers.staleness import age_seconds
+
+_UNITS = ['B', 'KB', 'MB', 'GB', 'TB']
+# 时长单位对应的秒数
+_DURATION_UNITS = {'H': 3600, 'D': 24 * 3600, 'W': 7 * 24 * 3600, 'Y': 365 * 24 * 3600}
+
+_TOKEN_REGEX = re.compile(r'''
+    \s*(?:
+        (?P<op><=|>=|==|!=|<|>|=)
+      | (?P<punct>[(),])
+      | (?P<number>\d+(?:\.\d+)?)\s*(?P<unit>[KMGT]?B|[HDWY])?(?![\w.])
+      | (?P<word>\.?\w[\w.\-]*)
+    )''', re.VERBOSE | re.IGNORECASE)
+
+_COMPARE_OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+
+# 求值时使用的条目信息 (size, allocated, is_dir, ext_name, depth, age)，size、allocated 和 age 未知时为 None
+_Facts = tuple
+
+
+class _Token(NamedTuple):
+    kind: str
+    value: object
+    position: int
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            break
+        match = _TOKEN_REGEX.match(text, position)
+        if match is None or match.end() == position:
+            raise FilterException(f'无法识别的字符: {text[position]!r} (位置 {position + 1})', position)
+        start = position
+        if match.group('op') is not None:
+            tokens.append(_Token('op', match.group('op'), start))
+        elif match.group('punct') is not None:
+            tokens.append(_Token(match.group('punct'), match.group('punct'), start))
+        elif match.group('number') is not None:
+            # 数值的单位在解析时按字段换算
+            unit = match.group('unit').upper() if match.group('unit') is not None else None
+            tokens.append(_Token('number', (float(match.group('number')), unit), start))
+        else:
+            tokens.append(_Token('word', match.group('word'), start))
+        position = match.end()
+    tokens.append(_Token('end', None, len(text)))
+    return tokens
+
+
+class _Parser:
+    """递归下降解析，直接生成求值闭包"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.i = 0
+        # 在 and 链顶层出现的 size < X / size <= X 给出的大小上限
+        self.size_limits = []
+
+    def peek(self) -> _Token:
+        return self.tokens[self.i]
+
+    def next(self) -> _Token:
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def error(self, message, token: _Token):
+        return FilterException(f'{message} (位置 {token.position + 1})', token.position)
+
+    def is_word(self, token: _Token, word):
+        return token.kind == 'word' and token.value.lower() == word
+
+    def expect(self, kind, description):
+        token = self.next()
+        if token.kind != kind:
+            raise self.error(f'此处应为{description}', token)
+        return token
+
+    def parse(self):
+        if self.peek().kind == 'end':
+            raise self.error('过滤表达式为空', self.peek())
+        node = self.parse_or(top=True)
+        if self.peek().kind != 'end':
+            raise self.error('多余的内容', self.peek())
+        return node
+
+    def parse_or(self, top=False):
+        mark = len(self.size_limits)
+        nodes = [self.parse_and(top)]
+        while self.is_word(self.peek(), 'or'):
+            self.next()
+            nodes.append(self.parse_and(False))
+        if len(nodes) > 1:
+            # 或表达式中的大小上限不是整个表达式的上限
+            del self.size_limits[mark:]
+            return _any(nodes)
+        return nodes[0]
+
+    def parse_and(self, top):
+        nodes = [self.parse_not(top)]
+        while self.is_word(self.peek(), 'and'):
+            self.next()
+            nodes.append(self.parse_not(top))
+        return _all(nodes) if len(nodes) > 1 else nodes[0]
+
+    def parse_not(self, top):
+        token = self.peek()
+        if self.is_word(token, 'not'):
+            self.next()
+            return _not(self.parse_not(False))
+        if token.kind == '(':
+            self.next()
+            node = self.parse_or(top)
+            self.expect(')', ' )')
+            return node
+        return self.parse_compare(top)
+
+    def parse_compare(self, top):
+        token = self.next()
+        if token.kind != 'word':
+            raise self.error('此处应为 size、allocated、depth、age、type 或 ext', token)
+        field = token.value.lower()
+        if field == 'ext':
+            return self.parse_ext()
+        op_token = self.expect('op', '比较运算符')
+        op = op_token.value
+        if field in ('size', 'allocated'):
+            value_token = self.expect('number', '大小，例如 100MB')
+            number, unit = value_token.value
+            if unit is not None and unit not in _UNITS:
+                raise self.error('大小的单位应为 B、KB、MB、GB 或 TB', value_token)
+            value = int(number * pow(1024, _UNITS.index(unit or 'B')))
+            if top and field == 'size' and op in ('<', '<='):
+                self.size_limits.append(value if op == '<' else value + 1)
+            return _compare_unknown(0 if field == 'size' else 1, _COMPARE_OPS[op], value)
+        if field == 'depth':
+            value_token = self.expect('number', '整数深度')
+            number, unit = value_token.value
+            if unit is not None:
+                raise self.error('深度不能带单位', value_token)
+            return _compare_fact(4, _COMPARE_OPS[op], int(number))
+        if field == 'age':
+            value_token = self.expect('number', '时长，例如 90d')
+            number, unit = value_token.value
+            if unit is not None and unit not in _DURATION_UNITS:
+                raise self.error('时长的单位应为 h、d、w 或 y', value_token)
+            return _compare_unknown(5, _COMPARE_OPS[op], number * _DURATION_UNITS[unit or 'D'])
+        if field == 'type':
+            if op not in ('==', '=', '!='):
+                raise self.error('type 只能使用 == 或 !=', op_token)
+            value_token = self.expect('word', ' file 或 dir')
+            kind = value_token.value.lower()
+            if kind not in ('file', 'dir'):
+                raise self.error('type 的值应为 file 或 dir', value_token)
+            return _compare_fact(2, _COMPARE_OPS[op], kind == 'dir')
+        raise self.error(f'未知的字段: {token.value}', token)
+
+    def parse_ext(self):
+        token = self.next()
+        negate = False
+        if self.is_word(token, 'not'):
+            negate = True
+            token = self.next()
+        if self.is_word(token, 'in'):
+            self.expect('(', ' (')
+            exts = {self.parse_ext_value()}
+            while self.peek().kind == ',':
+                self.next()
+                exts.add(self.parse_ext_value())
+            self.expect(')', ' )')
+            node = _compare_fact(3, operator.contains, frozenset(exts), reverse=True)
+            return _not(node) if negate else node
+        if negate or token.kind != 'op' or token.value not in ('==', '=', '!='):
+            raise self.error('ext 只能使用 ==、!=、in 或 not in', token)
+        return _compare_fact(3, _COMPARE_OPS[token.value], self.parse_ext_value())
+
+    def parse_ext_value(self):
+        token = self.next()
+        if token.kind != 'word':
+            raise self.error('此处应为扩展名，例如 .log', token)
+        ext = token.value.lower()
+        return ext if ext.startswith('.') else '.' + ext
+
+
+# 以下函数生成求值闭包，闭包的参数为 _Facts，返回 None 代表大小未知时无法确定(三值逻辑)
+
+def _compare_unknown(index, op, value):
+    def _eval(facts):
+        actual = facts[index]
+        return None if actual is None else op(actual, value)
+
+    return _eval
+
+
+def _compare_fact(index, op, value, reverse=False):
+    if reverse:
+        return lambda facts: op(value, facts[index])
+    return lambda facts: op(facts[index], value)
+
+
+def _all(nodes):
+    def _eval(facts):
+        result = True
+        for node in nodes:
+            value = node(facts)
+            if value is False:
+                return False
+            if value is None:
+                result = None
+        return result
+
+    return _eval
+
+
+def _any(nodes):
+    def _eval(facts):
+        result = False
+        for node in nodes:
+            value = node(facts)
+            if value is True:
+                return True
+            if value is None:
+                result = None
+        return result
+
+    return _eval
+
+
+def _not(node):
+    def _eval(facts):
+        value = node(facts)
+        return None if value is None else not value
+
+    return _eval
+
+
+def record_depth(record: ScanRecord) -> int:
+    """结果相对搜索目录的深度，搜索目录的直接子条目为 1"""
+    if not record.scan_root:
+        return 1
+    rel_path = os.path.relpath(record.abs_path, record.scan_root)
+    return rel_path.count(os.sep) + 1
+
+
+class FilterPredicate:
+    """
+    编译后的过滤表达式
+    可以直接作为 scan 的谓词使用；Scanner 会在匹配后、stat 和统计目录大小之前调用 prefilter 提前丢弃条目
+    闲置时间以编译时的时间为基准，同一次搜索中的所有结果使用相同的基准
+    """
+
+    def __init__(self, text: str, evaluate: Callable[[_Facts], bool | None], max_size: int | None,
+                 now: float | None = None):
+        self.text = text
+        self._evaluate = evaluate
+        # 表达式隐含的表观大小上限，统计目录大小时达到上限即可放弃，见 size_upper_bound
+        self.max_size = max_size
+        self.now = now if now is not None else time.time()
+
+    def __call__(self, record: ScanRecord) -> bool:
+        return self._evaluate((record.size, record.allocated, record.is_dir, record.ext_name,
+                               record_depth(record), age_seconds(record.mtime, record.atime, self.now))) is True
+
+    def prefilter(self, is_dir, ext_name, depth) -> bool:
+        """
+        大小和时间未知时判断条目是否可能满足条件
+        :return: False 代表无论大小和时间如何都不满足条件，可以直接丢弃
+        """
+        return self._evaluate((None, None, is_dir, ext_name, depth, None)) is not False
+
+    def __repr__(self):
+        return f'FilterPredicate({self.text!r})'
+
+    def __reduce__(self):
+        # 闭包无法序列化，多进程模式下按表达式文本重新编译
+        return compile_filter, (self.text, self.now)
+
+
+def compile_filter(text: str, now: float | None = None) -> FilterPredicate:
+    """
+    解析并编译过滤表达式
+    :param now: 计算闲置时间的基准时间，默认为当前时间
+    :raise FilterException: 表达式有语法错误
+    """
+    parser = _Parser(text)
+    evaluate = parser.parse()
+    max_size = min(parser.size_limits) if len(parser.size_limits) > 0 else None
+    return FilterPredicate(text, evaluate, max_size, now)
@@ -0,0 +1,263 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+from constants import base_dir
+from helpers.scan_stats import ScanStats, STAT_IS_FREE
+from helpers.size_accounting import link_stat
+from helpers.staleness import file_times
+
+
+class CachedStat:
+    """缓存条目的 stat 结果，只包含搜索需要的字段"""
+    __slots__ = ('st_size', 'st_file_attributes', 'st_blocks', 'st_dev', 'st_ino', 'st_nlink', 'st_mtime', 'st_atime')
+
+    def __init__(self, st_size, st_file_attributes, st_blocks=None, st_dev=0, st_ino=0, st_nlink=1, st_mtime=0.0,
+                 st_atime=0.0):
+        self.st_size = st_size
+        self.st_file_attributes = st_file_attributes
+        # 没有 st_blocks 的系统上为 None，占用空间按表观大小计算
+        self.st_blocks = st_blocks
+        self.st_dev = st_dev
+        self.st_ino = st_ino
+        self.st_nlink = st_nlink
+        # 缓存时的修改时间和访问时间，与文件大小一样，文件内容变化不会使缓存失效
+        self.st_mtime = st_mtime
+        self.st_atime = st_atime
+
+
+class CachedEntry:
+    """与 os.DirEntry 接口兼容的缓存条目，所有方法都不会产生系统调用"""
+    __slots__ = ('name', 'path', '_is_dir', '_is_symlink', '_stat')
+
+    def __init__(self, dir_path, name, is_dir, is_symlink, size, attributes, blocks=None, ino=0, nlink=1, mtime=0.0,
+                 atime=0.0, dev=0):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._is_dir = is_dir
+        self._is_symlink = is_symlink
+        self._stat = CachedStat(size, attributes, blocks, dev, ino, nlink, mtime, atime)
+
+    def inode(self):
+        return self._stat.st_ino
+
+    def is_dir(self, follow_symlinks=True):
+        return self._is_dir
+
+    def is_file(self, follow_symlinks=True):
+        return not self._is_dir
+
+    def is_symlink(self):
+        return self._is_symlink
+
+    def stat(self, follow_symlinks=True):
+        return self._stat
+
+
+def open_dir(dir_path, index=None, stats: ScanStats | None = None):
+    """
+    打开目录，返回可用于 with 语句的条目迭代器
+    :param dir_path: 目录路径
+    :param index: 持久化索引，为 None 时直接使用 os.scandir
+    :param stats: 统计信息，仅用于索引的命中统计，直接 scandir 时由调用方统计
+    """
+    if index is not None:
+        return contextlib.nullcontext(index.list_dir(dir_path, stats))
+    return os.scandir(dir_path)
+
+
+def entry_row(entry: os.DirEntry):
+    """
+    把 DirEntry 转换为可缓存的元组: (名称, 是否目录, 是否符号链接, 大小, 文件属性, 块数, inode, 链接数, mtime, atime)
+    文件需要 stat，目录只在 stat 不产生系统调用的系统上获取文件属性
+    """
+    is_dir = entry.is_dir(follow_symlinks=False)
+    if is_dir:
+        attributes = entry.stat(follow_symlinks=False).st_file_attributes if STAT_IS_FREE else 0
+        return entry.name, is_dir, entry.is_symlink(), 0, attributes, None, 0, 1, 0.0, 0.0
+    # 缓存的 inode 和链接数用于再次搜索时的硬链接去重
+    st, _ = link_stat(entry)
+    return (entry.name, is_dir, entry.is_symlink(), st.st_size, st.st_file_attributes if STAT_IS_FREE else 0,
+            getattr(st, 'st_blocks', None), st.st_ino, st.st_nlink, *file_times(st))
+
+
+def stat_is_free(entry):
+    """获取条目的 stat 是否不需要额外的系统调用"""
+    return STAT_IS_FREE or not isinstance(entry, os.DirEntry)
+
+
+class FsIndex:
+    """
+    持久化的文件系统索引(SQLite)，用于增量搜索
+    每个目录保存一行: 目录的 mtime、目录下所有条目的列表(名称、类型、大小、inode、时间)以及子树大小和最新时间
+    再次搜索时只需要 stat 目录本身，mtime 未变化的目录直接使用缓存的条目列表，不再 scandir 和 stat 其中的文件
+
+    注意: 修改文件内容不会改变所在目录的 mtime，此时缓存的文件大小会过期，需要调用 invalidate 使其失效
+    """
+
+    instance = None
+
+    def __init__(self, db_path=None, trust_subtree_sizes=False):
+        """
+        :param db_path: 数据库路径，默认为 base_dir 下的 index.sqlite3
+        :param trust_subtree_sizes: 为 True 时，匹配目录本身的 mtime 未变化即直接使用缓存的子树大小，不再逐层校验子目录;
+                                    速度最快，但子目录中的变化需要通过 invalidate 才能生效
+        """
+        self.db_path = db_path or os.path.join(base_dir, 'index.sqlite3')
+        self.trust_subtree_sizes = trust_subtree_sizes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS dirs ('
+                           'path TEXT PRIMARY KEY, '
+                           'mtime_ns INTEGER NOT NULL, '
+                           'entries TEXT NOT NULL, '
+                           'subtree_size INTEGER, '
+                           'subtree_allocated INTEGER, '
+                           'subtree_mtime REAL, '
+                           'subtree_atime REAL)')
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(dirs)')]
+        if 'subtree_allocated' not in columns:
+            # 旧版本的索引没有占用空间，缓存的子树大小全部失效
+            self._conn.execute('ALTER TABLE dirs ADD COLUMN subtree_allocated INTEGER')
+            self._conn.execute('UPDATE dirs SET subtree_size = NULL')
+        if 'subtree_mtime' not in columns:
+            # 旧版本的索引中的条目没有时间，整个索引失效
+            self._conn.execute('ALTER TABLE dirs ADD COLUMN subtree_mtime REAL')
+            self._conn.execute('ALTER TABLE dirs ADD COLUMN subtree_atime REAL')
+            self._conn.execute('DELETE FROM dirs')
+        self._conn.commit()
+        # 待写入的目录列表，批量写入以减少事务次数
+        self._pending_rows = []
+        self._pending_sizes = []
+        self.flush_size = 500
+
+    @staticmethod
+    def get_instance():
+        if FsIndex.instance is None:
+            FsIndex.instance = FsIndex()
+        return FsIndex.instance
+
+    @staticmethod
+    def _key(pth):
+        return os.path.normpath(pth)
+
+    def list_dir(self, dir_path, stats: ScanStats | None = None):
+        """
+        列出目录，目录的 mtime 未变化时使用缓存
+        :param dir_path: 目录路径
+        :param stats: 统计信息，记录命中率和系统调用次数
+        :return: 与 os.DirEntry 接口兼容的条目列表
+        """
+        key = self._key(dir_path)
+        dir_stat = os.stat(dir_path)
+        mtime_ns = dir_stat.st_mtime_ns
+        with self._lock:
+            row = self._conn.execute('SELECT mtime_ns, entries FROM dirs WHERE path = ?', (key,)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            if stats is not None:
+                stats.add(index_hits=1, stat_calls=1)
+            return [CachedEntry(dir_path, *item, dev=dir_stat.st_dev) for item in json.loads(row[1])]
+
+        with os.scandir(dir_path) as it:
+            items = [entry_row(entry) for entry in it]
+        if stats is not None:
+            file_count = sum(1 for item in items if not item[1])
+            stats.add(index_misses=1, list_calls=1, stat_calls=1 + (0 if STAT_IS_FREE else file_count))
+        self._put_row((key, mtime_ns, json.dumps(items, ensure_ascii=False, separators=(',', ':'))))
+        return [CachedEntry(dir_path, *item, dev=dir_stat.st_dev) for item in items]
+
+    def cached_subtree_size(self, dir_path):
+        """
+        获取可以直接使用的子树大小
+        只有 trust_subtree_sizes 为 True 且目录的 mtime 未变化时才会返回缓存值，否则返回 None
+        :return: (表观大小, 占用空间, 最新的 mtime, 最新的 atime) 或 None
+        """
+        if not self.trust_subtree_sizes:
+            return None
+        key = self._key(dir_path)
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        with self._lock:
+            row = self._conn.execute('SELECT mtime_ns, subtree_size, subtree_allocated, subtree_mtime, subtree_atime '
+                                     'FROM dirs WHERE path = ?', (key,)).fetchone()
+        if row is None or row[0] != mtime_ns or row[1] is None:
+            return None
+        return row[1], row[2], row[3] or 0.0, row[4] or 0.0
+
+    def store_subtree_size(self, dir_path, size, allocated, mtime=0.0, atime=0.0):
+        """
+        保存子树大小和子树中最新的时间
+        包含硬链接的子树不应保存，否则再次搜索时无法与其他子树去重
+        """
+        with self._lock:
+            self._pending_sizes.append((size, allocated, mtime, atime, self._key(dir_path)))
+            if len(self._pending_sizes) >= self.flush_size:
+                self._flush_locked()
+
+    def _put_row(self, row):
+        with self._lock:
+            self._pending_rows.append(row)
+            if len(self._pending_rows) >= self.flush_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if len(self._pending_rows) > 0:
+            # 列表变化后子树大小失效
+            self._conn.executemany('INSERT OR REPLACE INTO dirs (path, mtime_ns, entries, subtree_size, '
+                                   'subtree_allocated, subtree_mtime, subtree_atime) '
+                                   'VALUES (?, ?, ?, NULL, NULL, NULL, NULL)', self._pending_rows)
+            self._pending_rows = []
+        if len(self._pending_sizes) > 0:
+            self._conn.executemany('UPDATE dirs SET subtree_size = ?, subtree_allocated = ?, subtree_mtime = ?, '
+                                   'subtree_atime = ? WHERE path = ?', self._pending_sizes)
+            self._pending_sizes = []
+        self._conn.commit()
+
+    def flush(self):
+        """把缓冲中的数据写入数据库"""
+        with self._lock:
+            self._flush_locked()
+
+    def invalidate(self, pth=None):
+        """
+        使索引失效
+        :param pth: 目录路径，该目录及其所有子目录的缓存会被删除，祖先目录缓存的子树大小也随之失效；为 None 时清空整个索引
+        :return: 删除的目录数
+        """
+        with self._lock:
+            self._flush_locked()
+            if pth is None:
+                cursor = self._conn.execute('DELETE FROM dirs')
+            else:
+                key = self._key(pth)
+                base = key.rstrip(os.sep)
+                # 子目录的路径都以 base + sep 开头，用范围查询匹配: 区分大小写，且可以使用主键索引
+                cursor = self._conn.execute('DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)',
+                                            (key, base + os.sep, base + chr(ord(os.sep) + 1)))
+                ancestors = []
+                parent = os.path.dirname(key)
+                while parent != key:
+                    ancestors.append((parent,))
+                    key, parent = parent, os.path.dirname(parent)
+                self._conn.executemany('UPDATE dirs SET subtree_size = NULL WHERE path = ?', ancestors)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def compact(self):
+        """
+        压缩索引: 删除已经不存在的目录，并回收数据库空间
+        :return: 删除的目录数
+        """
+        with self._lock:
+            self._flush_locked()
+            paths = [row[0] for row in self._conn.execute('SELECT path FROM dirs')]
+            missing = [(pth,) for pth in paths if not os.path.isdir(pth)]
+            self._conn.executemany('DELETE FROM dirs WHERE path = ?', missing)
+            self._conn.commit()
+            self._conn.execute('VACUUM')
+            return len(missing)
+
+    def dir_count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dirs').fetchone()[0]
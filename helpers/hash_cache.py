@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+
+from constants import base_dir
+
+
+class HashCache:
+    """
+    持久化的文件内容哈希缓存(SQLite)
+    以 (设备号, inode) 为键保存文件的内容哈希，同时记录计算时的 mtime 和大小;
+    mtime 或大小变化后缓存失效，未变化的文件再次比较时不需要重新读取内容
+
+    注意: 与 FsIndex 一样依赖 mtime，修改内容后又把 mtime 改回原值的文件无法被发现
+    """
+
+    instance = None
+
+    def __init__(self, db_path=None):
+        """
+        :param db_path: 数据库路径，默认为 base_dir 下的 hash_cache.sqlite3
+        """
+        self.db_path = db_path or os.path.join(base_dir, 'hash_cache.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                           'dev INTEGER NOT NULL, '
+                           'ino INTEGER NOT NULL, '
+                           'mtime_ns INTEGER NOT NULL, '
+                           'size INTEGER NOT NULL, '
+                           'digest TEXT NOT NULL, '
+                           'PRIMARY KEY (dev, ino))')
+        self._conn.commit()
+        # 待写入的哈希，批量写入以减少事务次数
+        self._pending = {}
+        self.flush_size = 500
+
+    @staticmethod
+    def get_instance():
+        if HashCache.instance is None:
+            HashCache.instance = HashCache()
+        return HashCache.instance
+
+    def get(self, st) -> str | None:
+        """
+        查询文件的内容哈希
+        :param st: 文件的 stat 结果
+        :return: 十六进制哈希，没有缓存或缓存已过期时返回 None
+        """
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._conn.execute('SELECT mtime_ns, size, digest FROM hashes WHERE dev = ? AND ino = ?',
+                                         key).fetchone()
+        if row is None or row[0] != st.st_mtime_ns or row[1] != st.st_size:
+            return None
+        return row[2]
+
+    def put(self, st, digest):
+        """保存文件的内容哈希"""
+        with self._lock:
+            self._pending[(st.st_dev, st.st_ino)] = (st.st_mtime_ns, st.st_size, digest)
+            if len(self._pending) >= self.flush_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if len(self._pending) > 0:
+            self._conn.executemany('INSERT OR REPLACE INTO hashes (dev, ino, mtime_ns, size, digest) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   [(*key, *value) for key, value in self._pending.items()])
+            self._pending = {}
+            self._conn.commit()
+
+    def flush(self):
+        """把缓冲中的哈希写入数据库"""
+        with self._lock:
+            self._flush_locked()
+
+    def invalidate(self):
+        """清空缓存"""
+        with self._lock:
+            self._pending = {}
+            self._conn.execute('DELETE FROM hashes')
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
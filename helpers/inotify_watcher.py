@@ -0,0 +1,404 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+
+from helpers.fs_index import CachedEntry
+from helpers.scan_stats import ScanStats
+from helpers.staleness import file_times
+from logger import logger
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+               IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+# struct inotify_event: int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]
+_event_struct = struct.Struct('iIII')
+# 目录条目，目录的大小由 _subtree 维护
+_DIR_VALUE = (True, False, 0, None, 0, 1, 0, 0.0, 0.0)
+_EMPTY = (0, 0, 0, 0.0, 0.0)
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return _libc
+
+
+class InotifyWatcher:
+    """
+    基于 inotify 实时维护一个根目录下的目录列表和子树大小(仅 Linux，通过 ctypes 调用，不需要额外依赖)
+    对外提供与 FsIndex 相同的 list_dir / cached_subtree_size 接口，可以直接作为 scan 的 index 参数，
+    搜索被监视的目录时不需要再访问文件系统
+    事件队列溢出时会重新扫描整个根目录，单个目录的事件处理失败时会重新扫描该目录的子树
+    """
+
+    # key: 根目录
+    # value: 监视器
+    instances: dict[str, 'InotifyWatcher'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, root):
+        self.root = os.path.normpath(os.path.abspath(root))
+        self._lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._fd = -1
+        # key: 目录路径
+        # value: {名称: (是否目录, 是否符号链接, 大小, 块数, inode, 链接数, 设备号, mtime, atime)}
+        self._dirs: dict[str, dict[str, tuple]] = {}
+        # key: 目录路径
+        # value: [表观大小, 占用空间, 链接数大于 1 的文件数, 最新的 mtime, 最新的 atime]
+        # 最新时间只会随事件增大，删除文件后不会回退(偏向于认为子树较新)，重新扫描时恢复精确值
+        self._subtree: dict[str, list] = {}
+        self._wd_to_path: dict[int, str] = {}
+        self._path_to_wd: dict[str, int] = {}
+        # 添加监视失败(例如超过 max_user_watches)时，部分目录无法保持实时
+        self.degraded = False
+        # 添加监视失败的目录，这些目录不在 _dirs 中，所在子树的大小统计不完整
+        self._unwatched: set[str] = set()
+        # 添加监视失败的目录及其所有祖先目录，它们的子树大小不能作为缓存结果返回
+        self._uncacheable: set[str] = set()
+        # 重新扫描的次数，用于观察溢出情况
+        self.rescan_count = 0
+
+    @staticmethod
+    def is_supported():
+        return sys.platform.startswith('linux')
+
+    @staticmethod
+    def get_instance(root):
+        key = os.path.normpath(os.path.abspath(root))
+        with InotifyWatcher._instances_lock:
+            if key not in InotifyWatcher.instances:
+                InotifyWatcher.instances[key] = InotifyWatcher(key)
+            return InotifyWatcher.instances[key]
+
+    def start(self):
+        """初始化 inotify 并完整扫描根目录，重复调用不会产生效果"""
+        with self._start_lock:
+            if self._started:
+                return
+            libc = _get_libc()
+            self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self._fd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, f'inotify_init1 失败: {os.strerror(err)}')
+            with self._lock:
+                self._load_subtree(self.root)
+            self._thread = threading.Thread(target=self._read_events, name=f'InotifyWatcher-{self.root}',
+                                            daemon=True)
+            self._thread.start()
+            self._started = True
+            logger.info(f"开始监视目录 - {self.root}, 目录数: {len(self._dirs)}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        with InotifyWatcher._instances_lock:
+            if InotifyWatcher.instances.get(self.root) is self:
+                del InotifyWatcher.instances[self.root]
+
+    # =================== 与 FsIndex 相同的接口
+
+    def list_dir(self, dir_path, stats: ScanStats | None = None):
+        self.start()
+        key = os.path.normpath(dir_path)
+        with self._lock:
+            listing = self._dirs.get(key)
+            items = list(listing.items()) if listing is not None else None
+        if items is None:
+            # 不在监视范围内(或添加监视失败)的目录直接读取文件系统
+            return self._list_uncached(dir_path, stats)
+        if stats is not None:
+            stats.add(index_hits=1)
+        return [CachedEntry(dir_path, name, is_dir, is_symlink, size, 0, blocks, ino, nlink, mtime, atime, dev)
+                for name, (is_dir, is_symlink, size, blocks, ino, nlink, dev, mtime, atime) in items]
+
+    def cached_subtree_size(self, dir_path):
+        """
+        获取子树的 (表观大小, 占用空间, 最新的 mtime, 最新的 atime)
+        子树中有硬链接时返回 None，由调用方遍历内存中的目录列表去重；
+        子树中有添加监视失败的目录时同样返回 None，由调用方实际遍历(未监视的目录直接读取文件系统)
+        """
+        self.start()
+        with self._lock:
+            key = os.path.normpath(dir_path)
+            usage = self._subtree.get(key)
+            if usage is None or usage[2] > 0 or key in self._uncacheable:
+                return None
+            return usage[0], usage[1], usage[3], usage[4]
+
+    def store_subtree_size(self, dir_path, size, allocated, mtime=0.0, atime=0.0):
+        # 子树大小由事件实时维护，不需要保存
+        pass
+
+    def flush(self):
+        pass
+
+    # ===================
+
+    @staticmethod
+    def _list_uncached(dir_path, stats):
+        # 返回 DirEntry，stat 调用由调用方统计
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+        if stats is not None:
+            stats.add(index_misses=1, list_calls=1)
+        return entries
+
+    @staticmethod
+    def _file_value(st, is_symlink):
+        """根据 stat 结果构造文件条目"""
+        return (False, is_symlink, st.st_size, getattr(st, 'st_blocks', None), st.st_ino, st.st_nlink, st.st_dev,
+                *file_times(st))
+
+    @staticmethod
+    def _usage(value):
+        """文件条目的 [表观大小, 占用空间, 硬链接文件数, mtime, atime]"""
+        _, _, size, blocks, _, nlink, _, mtime, atime = value
+        return [size, size if blocks is None else blocks * 512, 1 if nlink > 1 else 0, mtime, atime]
+
+    @staticmethod
+    def _delta(new, old):
+        """两次统计之间的变化量，大小和文件数为差值，时间为新的值"""
+        return [new[0] - old[0], new[1] - old[1], new[2] - old[2], new[3], new[4]]
+
+    def _add_watch(self, dir_path):
+        wd = _get_libc().inotify_add_watch(self._fd, os.fsencode(dir_path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if not self.degraded:
+                logger.warning(f"添加目录监视失败 - {dir_path}: {os.strerror(err)}")
+            self.degraded = True
+            return False
+        self._wd_to_path[wd] = dir_path
+        self._path_to_wd[dir_path] = wd
+        return True
+
+    def _mark_unwatched(self, dir_path):
+        """记录添加监视失败的目录，该目录及其祖先的子树大小不再作为缓存结果返回，需要持有 self._lock"""
+        self._unwatched.add(dir_path)
+        self._mark_ancestors(dir_path)
+
+    def _mark_ancestors(self, dir_path):
+        while dir_path not in self._uncacheable:
+            self._uncacheable.add(dir_path)
+            parent = os.path.dirname(dir_path)
+            if dir_path == self.root or parent == dir_path:
+                break
+            dir_path = parent
+
+    def _load_subtree(self, top):
+        """
+        迭代扫描 top 子树，先添加监视再读取目录，保证读取之后的变化都能收到事件
+        需要持有 self._lock
+        :return: 子树的 [表观大小, 占用空间, 硬链接文件数, 最新的 mtime, 最新的 atime]
+        """
+        order = []
+        stack = [top]
+        while len(stack) > 0:
+            dir_path = stack.pop()
+            if not self._add_watch(dir_path):
+                self._mark_unwatched(dir_path)
+                continue
+            listing = {}
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                listing[entry.name] = _DIR_VALUE
+                                stack.append(entry.path)
+                            else:
+                                listing[entry.name] = self._file_value(entry.stat(follow_symlinks=False),
+                                                                       entry.is_symlink())
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            self._dirs[dir_path] = listing
+            order.append(dir_path)
+        # 逆序即子目录先于父目录，自底向上计算子树大小
+        for dir_path in reversed(order):
+            total = [0, 0, 0, 0.0, 0.0]
+            for name, value in self._dirs[dir_path].items():
+                usage = self._subtree.get(os.path.join(dir_path, name), _EMPTY) if value[0] else self._usage(value)
+                for i in range(3):
+                    total[i] += usage[i]
+                total[3] = max(total[3], usage[3])
+                total[4] = max(total[4], usage[4])
+            self._subtree[dir_path] = total
+        return list(self._subtree.get(top, _EMPTY))
+
+    def _drop_subtree(self, top):
+        """移除 top 子树的所有记录和监视，需要持有 self._lock"""
+        prefix = top + os.sep
+        unwatched = [p for p in self._unwatched if p == top or p.startswith(prefix)]
+        if len(unwatched) > 0:
+            # 其余未监视目录的祖先仍然不能缓存，重新标记
+            self._unwatched.difference_update(unwatched)
+            self._uncacheable = set()
+            for dir_path in self._unwatched:
+                self._mark_ancestors(dir_path)
+        for dir_path in [p for p in self._dirs if p == top or p.startswith(prefix)]:
+            del self._dirs[dir_path]
+            self._subtree.pop(dir_path, None)
+            wd = self._path_to_wd.pop(dir_path, None)
+            if wd is not None:
+                self._wd_to_path.pop(wd, None)
+                _get_libc().inotify_rm_watch(self._fd, wd)
+
+    def _add_to_ancestors(self, dir_path, delta):
+        """
+        把子树统计的变化累加到 dir_path 及其所有祖先目录，需要持有 self._lock
+        :param delta: [表观大小, 占用空间, 硬链接文件数] 的变化量以及新出现的 [mtime, atime]，时间取最大值
+        """
+        if not any(delta):
+            return
+        while True:
+            usage = self._subtree.get(dir_path)
+            if usage is not None:
+                for i in range(3):
+                    usage[i] += delta[i]
+                usage[3] = max(usage[3], delta[3])
+                usage[4] = max(usage[4], delta[4])
+            if dir_path == self.root:
+                break
+            parent = os.path.dirname(dir_path)
+            if parent == dir_path:
+                break
+            dir_path = parent
+
+    def _remove_entry(self, dir_path, name):
+        listing = self._dirs.get(dir_path)
+        if listing is None or name not in listing:
+            return
+        value = listing.pop(name)
+        if value[0]:
+            child = os.path.join(dir_path, name)
+            usage = self._subtree.get(child, _EMPTY)
+            self._drop_subtree(child)
+        else:
+            usage = self._usage(value)
+        self._add_to_ancestors(dir_path, [-usage[0], -usage[1], -usage[2], 0.0, 0.0])
+
+    def _update_entry(self, dir_path, name):
+        listing = self._dirs.get(dir_path)
+        if listing is None:
+            return
+        pth = os.path.join(dir_path, name)
+        try:
+            st = os.lstat(pth)
+        except FileNotFoundError:
+            # 条目已经被删除，后续的删除事件会再次处理
+            self._remove_entry(dir_path, name)
+            return
+        is_dir = stat.S_ISDIR(st.st_mode)
+        old = listing.get(name)
+        if is_dir:
+            if old is not None and old[0]:
+                return
+            self._remove_entry(dir_path, name)
+            listing[name] = _DIR_VALUE
+            self._add_to_ancestors(dir_path, self._load_subtree(pth))
+        else:
+            old_usage = _EMPTY
+            if old is not None:
+                if old[0]:
+                    self._remove_entry(dir_path, name)
+                else:
+                    old_usage = self._usage(old)
+            value = self._file_value(st, stat.S_ISLNK(st.st_mode))
+            listing[name] = value
+            self._add_to_ancestors(dir_path, self._delta(self._usage(value), old_usage))
+
+    def _rescan(self, top):
+        """重新扫描 top 子树，需要持有 self._lock"""
+        self.rescan_count += 1
+        old_usage = list(self._subtree.get(top, _EMPTY))
+        self._drop_subtree(top)
+        new_usage = self._load_subtree(top) if os.path.isdir(top) else _EMPTY
+        if top != self.root:
+            self._add_to_ancestors(os.path.dirname(top), self._delta(new_usage, old_usage))
+
+    def _handle_event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            logger.warning(f"inotify 事件队列溢出，重新扫描 - {self.root}")
+            self._rescan(self.root)
+            return
+        dir_path = self._wd_to_path.get(wd)
+        if dir_path is None:
+            return
+        if mask & IN_IGNORED:
+            self._wd_to_path.pop(wd, None)
+            if self._path_to_wd.get(dir_path) == wd:
+                del self._path_to_wd[dir_path]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if dir_path == self.root:
+                self._rescan(self.root)
+            return
+        if not name:
+            return
+        try:
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove_entry(dir_path, name)
+            else:
+                self._update_entry(dir_path, name)
+        except OSError:
+            self._rescan(dir_path)
+
+    def _read_events(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        while not self._stop_event.is_set():
+            if len(poller.poll(200)) == 0:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    continue
+                raise
+            offset = 0
+            with self._lock:
+                while offset < len(data):
+                    wd, mask, _, length = _event_struct.unpack_from(data, offset)
+                    offset += _event_struct.size
+                    name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                    offset += length
+                    self._handle_event(wd, mask, name)
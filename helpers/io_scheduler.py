@@ -0,0 +1,93 @@
+"""
+按设备限制 I/O 并发
+限制的粒度是遍历引擎中的 job: job 开始时用根目录所在的设备(IoScheduler.device_of(root))确定限制，
+job 中的所有任务都按该设备计数，遍历时跨越挂载点进入其他设备的子目录仍然使用根目录所在设备的限制；
+需要按设备分别限制时，应为每个挂载点单独开始一个 job(例如同时搜索多个根目录)
+"""
+import os
+import sys
+import threading
+from collections import deque
+
+# 机械硬盘上同时执行的最大 I/O 任务数，更多的并发只会增加寻道
+ROTATIONAL_CONCURRENCY = 2
+# 固态硬盘或无法识别的设备上同时执行的最大 I/O 任务数，None 代表不限制(由线程数决定)
+SOLID_STATE_CONCURRENCY = None
+
+
+class IoScheduler:
+    """
+    按设备(st_dev)限制 I/O 并发
+    Linux 上通过 /sys/dev/block/<major>:<minor>/queue/rotational 识别机械硬盘，
+    其他系统或无法识别的设备(例如网络文件系统、overlay)按固态硬盘处理
+    不同设备上的工作可以并行执行，同一个设备上的并发不超过该设备的限制
+    """
+
+    instance = None
+
+    def __init__(self, rotational_concurrency=ROTATIONAL_CONCURRENCY,
+                 solid_state_concurrency=SOLID_STATE_CONCURRENCY):
+        self.rotational_concurrency = rotational_concurrency
+        self.solid_state_concurrency = solid_state_concurrency
+        self._lock = threading.Lock()
+        # key: st_dev  value: 并发限制
+        self._limits: dict[int, int | None] = {}
+
+    @staticmethod
+    def get_instance():
+        if IoScheduler.instance is None:
+            IoScheduler.instance = IoScheduler()
+        return IoScheduler.instance
+
+    @staticmethod
+    def device_of(pth):
+        """
+        获取路径所在的设备号
+        :return: st_dev，路径无法访问时返回 None
+        """
+        try:
+            return os.stat(pth, follow_symlinks=False).st_dev
+        except OSError:
+            return None
+
+    @staticmethod
+    def is_rotational(dev):
+        """判断设备是否为机械硬盘，无法识别时返回 False"""
+        if dev is None or not sys.platform.startswith('linux'):
+            return False
+        sys_dir = f'/sys/dev/block/{os.major(dev)}:{os.minor(dev)}'
+        if os.path.exists(os.path.join(sys_dir, 'partition')):
+            # 分区没有自己的 queue 目录，使用所在磁盘的
+            sys_dir = os.path.join(sys_dir, '..')
+        try:
+            with open(os.path.join(sys_dir, 'queue', 'rotational')) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            return False
+
+    def limit(self, dev):
+        """
+        获取设备的并发限制
+        :return: 最大并发数，None 代表不限制
+        """
+        if dev is None:
+            return None
+        limit = self._limits.get(dev, -1)
+        if limit != -1:
+            return limit
+        limit = self.rotational_concurrency if self.is_rotational(dev) else self.solid_state_concurrency
+        with self._lock:
+            self._limits[dev] = limit
+        return limit
+
+    def group_by_device(self, items, key=lambda item: item[0]):
+        """
+        按设备对工作分组
+        :param items: 工作列表
+        :param key: 获取工作对应路径的函数，默认取第一个元素
+        :return: [(并发限制, 该设备上的工作队列)]，并发限制为 None 代表不限制
+        """
+        groups: dict[int | None, deque] = {}
+        for item in items:
+            groups.setdefault(self.device_of(key(item)), deque()).append(item)
+        return [(self.limit(dev), group) for dev, group in groups.items()]
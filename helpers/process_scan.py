@@ -0,0 +1,305 @@
+"""
+多进程搜索模式
+规则匹配和结果构造在 GIL 下是 CPU 密集的，线程数超过 3 个左右后不再有收益
+该模式在父进程中匹配根目录的直接子条目，再按顶层子树把工作分片到多个进程，
+每个进程以紧凑的批量格式(路径字符串表 + array 数组)返回结果，由父进程合并
+硬链接先在每个分片内去重，分片同时返回计入了大小的硬链接，父进程用同一个 InodeSet 再去重一次，
+从重复链接所属的结果中减去其大小，因此结果与进程内搜索相同
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from array import array
+from typing import Iterable, Iterator
+
+from helpers.cancellation import CancelEvent, cancel_latency
+from helpers.dir_sizer import subtree_size
+from helpers.io_scheduler import IoScheduler
+from helpers.scan_stats import ScanStats
+from helpers.scanner import MatchType, Predicate, ScanRecord, Scanner, build_spec, size_upper_bound
+from helpers.size_accounting import InodeSet
+from helpers.size_estimator import estimate_subtree
+from helpers.traversal_engine import TraversalEngine
+
+# 每个子进程中遍历引擎的线程数
+PROCESS_ENGINE_WORKERS = 2
+# 自动选择多进程模式的阈值: cpu 数量和根目录前两层的目录数
+PROCESS_MODE_MIN_CPUS = 4
+PROCESS_MODE_MIN_DIRS = 64
+# 估算目录规模时最多读取的条目数
+_PROBE_ENTRY_LIMIT = 4096
+
+# 子进程中的取消事件
+_worker_cancel_event = None
+
+_FLAG_DIR = 1
+_FLAG_ESTIMATED = 2
+
+
+def should_use_processes(root) -> bool:
+    """
+    根据 cpu 数量、设备类型和根目录前两层的目录数判断是否值得使用多进程模式
+    机械硬盘上的搜索受寻道限制，多进程只会增加并发，不使用
+    只读取有限数量的条目，代价很小
+    """
+    if (os.cpu_count() or 1) < PROCESS_MODE_MIN_CPUS:
+        return False
+    if IoScheduler.is_rotational(IoScheduler.device_of(root)):
+        return False
+    top_dirs = []
+    seen = 0
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                seen += 1
+                if entry.is_dir(follow_symlinks=False):
+                    top_dirs.append(entry.path)
+                if seen >= _PROBE_ENTRY_LIMIT:
+                    break
+    except OSError:
+        return False
+    if len(top_dirs) < 2:
+        return False
+    dir_count = len(top_dirs)
+    for top_dir in top_dirs:
+        if dir_count >= PROCESS_MODE_MIN_DIRS or seen >= _PROBE_ENTRY_LIMIT:
+            break
+        try:
+            with os.scandir(top_dir) as it:
+                for entry in it:
+                    seen += 1
+                    if entry.is_dir(follow_symlinks=False):
+                        dir_count += 1
+        except OSError:
+            continue
+    return dir_count >= PROCESS_MODE_MIN_DIRS
+
+
+def encode_records(records: Iterable[ScanRecord]):
+    """
+    把结果编码为紧凑的批量格式
+    :return: (以 \\0 连接的绝对路径, 大小数组, 占用空间数组, 置信区间数组(下限, 上限交替), 时间数组(mtime, atime 交替),
+             标志字节串)
+             标志的第 0 位为是否目录，第 1 位为是否估算值
+    """
+    paths = []
+    sizes = array('q')
+    allocated = array('q')
+    bounds = array('q')
+    times = array('d')
+    flags = bytearray()
+    for record in records:
+        paths.append(record.abs_path)
+        sizes.append(record.size)
+        allocated.append(record.allocated)
+        bounds.append(record.size_low)
+        bounds.append(record.size_high)
+        times.append(record.mtime)
+        times.append(record.atime)
+        flags.append((_FLAG_DIR if record.is_dir else 0) | (_FLAG_ESTIMATED if record.estimated else 0))
+    return '\0'.join(paths), sizes, allocated, bounds, times, bytes(flags)
+
+
+def decode_records(batch, scan_root='') -> Iterator[ScanRecord]:
+    """
+    解码批量格式的结果
+    :param scan_root: 结果所属的搜索根目录
+    """
+    paths, sizes, allocated, bounds, times, flags = batch
+    if paths == '':
+        return
+    for i, abs_path in enumerate(paths.split('\0')):
+        flag = flags[i]
+        yield ScanRecord(os.path.dirname(abs_path), os.path.basename(abs_path), abs_path, bool(flag & _FLAG_DIR),
+                         os.path.splitext(abs_path)[-1].lower(), sizes[i], allocated[i],
+                         bool(flag & _FLAG_ESTIMATED), bounds[2 * i], bounds[2 * i + 1], scan_root, times[2 * i],
+                         times[2 * i + 1])
+
+
+def encode_links(seen: InodeSet):
+    """
+    把分片中计入了大小的硬链接编码为紧凑的批量格式
+    :return: (以 \0 连接的所属结果路径, (设备号, inode) 交替的数组, (表观大小, 占用空间) 交替的数组)
+    """
+    owners = []
+    inodes = array('Q')
+    sizes = array('q')
+    for owner, dev, ino, size, allocated in seen.links:
+        owners.append(owner)
+        inodes.append(dev)
+        inodes.append(ino)
+        sizes.append(size)
+        sizes.append(allocated)
+    return '\0'.join(owners), inodes, sizes
+
+
+def dedup_links(records: list[ScanRecord], links, seen: InodeSet) -> int:
+    """
+    跨分片对硬链接去重: 已在其他分片或父进程中统计过的 inode 从所属结果中减去其大小
+    :param records: 一个分片的结果，原地修改
+    :param links: encode_links 的返回值
+    :param seen: 父进程中所有分片共享的 inode 集合
+    :return: 重复的硬链接数
+    """
+    owners, inodes, sizes = links
+    if owners == '':
+        return 0
+    rows = {record.abs_path: i for i, record in enumerate(records)}
+    duplicates = 0
+    for i, owner in enumerate(owners.split('\0')):
+        if seen.add(inodes[2 * i], inodes[2 * i + 1]):
+            continue
+        duplicates += 1
+        row = rows.get(owner)
+        if row is not None:
+            record = records[row]
+            records[row] = record._replace(size=record.size - sizes[2 * i],
+                                           allocated=record.allocated - sizes[2 * i + 1])
+    return duplicates
+
+
+def _watch_cancel(mp_event, local_event):
+    mp_event.wait()
+    local_event.set()
+
+
+def _init_worker(mp_cancel_event):
+    """子进程初始化: 使用较少的引擎线程，并把进程间取消事件转换为本地事件，避免每次检查都访问信号量"""
+    global _worker_cancel_event
+    TraversalEngine.instance = TraversalEngine(PROCESS_ENGINE_WORKERS)
+    _worker_cancel_event = CancelEvent()
+    threading.Thread(target=_watch_cancel, args=(mp_cancel_event, _worker_cancel_event), daemon=True).start()
+
+
+def _scan_shard(dir_path, rel_dir, include, exclude, estimate, max_size, filters):
+    """
+    子进程任务: 搜索一个顶层子树，rel_dir 为子树相对搜索根目录的路径
+    filters 为可以序列化的过滤谓词，在子进程中提前丢弃条目
+    """
+    stats = ScanStats()
+    records = []
+    seen = InodeSet(record_links=True)
+    scanner = Scanner(build_spec(include), build_spec(exclude), records.append, filters, stats=stats,
+                      estimate=estimate, max_size=max_size, scan_root=os.path.dirname(dir_path), seen=seen)
+    job = scanner.start(dir_path, _worker_cancel_event, rel_dir)
+    job.wait()
+    if len(job.errors) > 0 and not job.is_cancelled():
+        raise job.errors[0]
+    return encode_records(records), encode_links(seen), _stats_counters(stats)
+
+
+def _size_shard(dir_path, max_size):
+    """子进程任务: 统计一个匹配的顶层目录的大小"""
+    stats = ScanStats()
+    seen = InodeSet(record_links=True)
+    usage = subtree_size(dir_path, _worker_cancel_event, stats, max_size=max_size, seen=seen)
+    records = []
+    if usage is not None:
+        size, allocated, mtime, atime = usage
+        records.append(ScanRecord(os.path.dirname(dir_path), os.path.basename(dir_path), dir_path, True, '', size,
+                                  allocated, mtime=mtime, atime=atime))
+    return encode_records(records), encode_links(seen), _stats_counters(stats)
+
+
+def _stats_counters(stats: ScanStats):
+    return {name: getattr(stats, name) for name in
+            ('dirs_listed', 'entries', 'list_calls', 'stat_calls', 'sized_dirs', 'sized_files', 'sized_bytes',
+             'duplicate_links', 'pruned_dirs', 'list_seconds', 'abandoned_subtrees', 'filtered_entries')}
+
+
+def scan_processes(root: str, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None,
+                   predicates: Iterable[Predicate] | None = None, cancel_event=None,
+                   stats: ScanStats | None = None, workers: int | None = None,
+                   estimate=False) -> Iterator[ScanRecord]:
+    """
+    多进程搜索，参数与 scan 相同
+    估算模式下根目录中匹配的目录直接在当前进程中估算
+    每个顶层子树完成后其结果整体返回，谓词在父进程中执行
+    硬链接在所有分片和根目录的直接子条目之间只统计一次
+    :param workers: 进程数，默认为 cpu 数量
+    """
+    stats = stats if stats is not None else ScanStats()
+    include = list(include or [])
+    exclude = list(exclude or [])
+    predicates = [p for p in (predicates or []) if p is not None]
+    cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+    max_size = size_upper_bound(predicates)
+    filters = [p for p in predicates if hasattr(p, 'prefilter')]
+
+    def _accept(record):
+        return all(predicate(record) for predicate in predicates)
+
+    # 父进程只匹配根目录的直接子条目
+    seen = InodeSet()
+    scanner = Scanner(build_spec(include), build_spec(exclude), lambda record: None, filters, seen=seen)
+    shards = []
+    top_records = []
+    entry_count = 0
+    pruned = 0
+    filtered = 0
+    with os.scandir(root) as it:
+        for entry in it:
+            if cancel_event.is_set():
+                break
+            entry_count += 1
+            matched, name, abs_path, is_dir, size, allocated, mtime, atime = scanner.match_entry(entry)[:8]
+            if matched == MatchType.FILTERED:
+                filtered += 1
+            elif matched == MatchType.MATCHED:
+                if is_dir and estimate:
+                    estimated = estimate_subtree(abs_path, cancel_event=cancel_event, stats=stats)
+                    bounds = (True, estimated.low, estimated.high) if not estimated.exact else ()
+                    top_records.append(ScanRecord(root, name, abs_path, True, os.path.splitext(abs_path)[-1].lower(),
+                                                  estimated.size, estimated.allocated, *bounds, scan_root=root,
+                                                  mtime=estimated.mtime, atime=estimated.atime))
+                elif is_dir:
+                    shards.append((_size_shard, abs_path, max_size))
+                else:
+                    top_records.append(ScanRecord(root, name, abs_path, False,
+                                                  os.path.splitext(abs_path)[-1].lower(), size, allocated,
+                                                  scan_root=root, mtime=mtime, atime=atime))
+            elif matched == MatchType.NOT_MATCHED and is_dir:
+                if scanner.can_prune(name):
+                    pruned += 1
+                else:
+                    shards.append((_scan_shard, abs_path, name, include, exclude, estimate, max_size, filters))
+    stats.add(dirs_listed=1, list_calls=1, entries=entry_count, pruned_dirs=pruned, filtered_entries=filtered)
+
+    try:
+        for record in top_records:
+            if _accept(record):
+                stats.add(apparent_bytes=record.size, allocated_bytes=record.allocated)
+                yield record
+
+        ctx = multiprocessing.get_context('spawn')
+        mp_cancel_event = ctx.Event()
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=ctx,
+                                                          initializer=_init_worker, initargs=(mp_cancel_event,))
+        pending = set()
+        try:
+            pending = {executor.submit(*shard) for shard in shards}
+            while len(pending) > 0:
+                if cancel_event.is_set():
+                    mp_cancel_event.set()
+                    return
+                done, pending = concurrent.futures.wait(pending, timeout=0.1,
+                                                        return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    batch, links, counters = future.result()
+                    stats.add(**counters)
+                    records = list(decode_records(batch, root))
+                    stats.add(duplicate_links=dedup_links(records, links, seen))
+                    for record in records:
+                        if _accept(record):
+                            stats.add(apparent_bytes=record.size, allocated_bytes=record.allocated)
+                            yield record
+        finally:
+            if len(pending) > 0:
+                mp_cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            latency = cancel_latency(cancel_event)
+            if latency is not None:
+                stats.cancel_latency = latency
+    finally:
+        stats.finish()
@@ -0,0 +1,313 @@
+"""
+列式存储的搜索结果
+每条结果如果保存为一个 ScanRecord，所在目录和绝对路径中的目录前缀会在每一行重复保存，数百万条结果会占用数 GB 内存
+ResultStore 按列保存结果:
+- 所在目录(规范化后)、扩展名和搜索根目录保存在去重的字符串表中，每行只保存编号
+- 大小和占用空间保存在 array('q') 中，最新的 mtime 和 atime 保存在 array('d') 中
+- 是否目录、是否估算值保存在位图中
+- 查找重复文件时每行所属的重复组编号保存在 array('I') 中，0 代表不属于任何组
+需要时通过 row 构造 ScanRecord 视图
+"""
+import os
+import threading
+import time
+from array import array
+from typing import Callable, Iterable, Iterator
+
+from helpers.scanner import ScanRecord
+from helpers.staleness import age_seconds, staleness_score
+
+
+class _StringTable:
+    """去重的字符串表，字符串和编号一一对应"""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._ids: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, s) -> int:
+        string_id = self._ids.get(s)
+        if string_id is None:
+            string_id = self._ids[s] = len(self.strings)
+            self.strings.append(s)
+        return string_id
+
+    def find(self, s) -> int | None:
+        return self._ids.get(s)
+
+
+def _get_bit(bits: bytearray, i) -> bool:
+    return bool(bits[i >> 3] & (1 << (i & 7)))
+
+
+def _set_bit(bits: bytearray, i, value):
+    if value:
+        bits[i >> 3] |= 1 << (i & 7)
+    else:
+        bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+
+class ResultStore:
+    """
+    列式、去重的搜索结果存储
+    行号从 0 开始连续分配，结果只追加不删除，界面上移除的行由调用方自己的行号列表维护
+    append 可以在任意线程中调用，读取已经追加完成的行不需要加锁
+    """
+
+    def __init__(self, records: Iterable[ScanRecord] | None = None):
+        self._lock = threading.Lock()
+        self._dirs = _StringTable()
+        self._exts = _StringTable()
+        self._scan_roots = _StringTable()
+        self.dir_ids = array('I')
+        self.ext_ids = array('I')
+        self.scan_root_ids = array('I')
+        self.names: list[str] = []
+        self.sizes = array('q')
+        self.allocated = array('q')
+        self.mtimes = array('d')
+        self.atimes = array('d')
+        self.group_ids = array('I')
+        # 重复组，编号从 1 开始，第 n 组保存在 groups[n - 1]
+        self.groups: list = []
+        self._dir_bits = bytearray()
+        self._estimated_bits = bytearray()
+        # 估算值的置信区间，只有少数行是估算值，用字典保存  key: 行号  value: (下限, 上限)
+        self._bounds: dict[int, tuple[int, int]] = {}
+        # 空目录状态，只有空目录行才有，用字典保存  key: 行号  value: 见 helpers.empty_dirs
+        self._empty: dict[int, int] = {}
+        # 目录行的索引，用于查询祖先  key: (所在目录编号, 名称)  value: 行号
+        self._dir_rows: dict[tuple[int, str], int] = {}
+        # 按所在目录索引的行，用于查询后代  key: 所在目录编号  value: 行号
+        self._rows_by_dir: dict[int, array] = {}
+        # 所在目录及其祖先路径组成的树，用于查询后代  key: 目录路径  value: 直接子目录路径
+        # 没有结果的中间目录也在树中，否则无法从祖先找到其下的目录
+        self._subdirs: dict[str, list[str]] = {}
+        for record in records or []:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self) -> Iterator[ScanRecord]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def append(self, record: ScanRecord, group=0) -> int:
+        """
+        追加一条结果
+        :param group: 所属的重复组编号，见 add_group
+        :return: 行号
+        """
+        with self._lock:
+            i = len(self.sizes)
+            dir_path = os.path.normpath(record.root)
+            dir_id = self._dirs.intern(dir_path)
+            self.dir_ids.append(dir_id)
+            rows = self._rows_by_dir.get(dir_id)
+            if rows is None:
+                rows = self._rows_by_dir[dir_id] = array('I')
+                self._link_dir(dir_path)
+            rows.append(i)
+            self.ext_ids.append(self._exts.intern(record.ext_name))
+            self.scan_root_ids.append(self._scan_roots.intern(record.scan_root))
+            self.names.append(record.pth)
+            self.allocated.append(record.allocated)
+            self.mtimes.append(record.mtime)
+            self.atimes.append(record.atime)
+            self.group_ids.append(group)
+            if i & 7 == 0:
+                self._dir_bits.append(0)
+                self._estimated_bits.append(0)
+            _set_bit(self._dir_bits, i, record.is_dir)
+            if record.estimated:
+                _set_bit(self._estimated_bits, i, True)
+                self._bounds[i] = (record.size_low, record.size_high)
+            if record.empty:
+                self._empty[i] = record.empty
+            if record.is_dir:
+                self._dir_rows[(dir_id, record.pth)] = i
+            # 最后追加 sizes，len(self) 增加时整行已经可以读取
+            self.sizes.append(record.size)
+            return i
+
+    def _link_dir(self, dir_path):
+        """把新出现的所在目录加入目录树，向上补齐缺少的祖先，遇到已在树中的祖先即停止"""
+        if dir_path in self._subdirs:
+            return
+        self._subdirs[dir_path] = []
+        parent = os.path.dirname(dir_path)
+        while parent != dir_path:
+            children = self._subdirs.get(parent)
+            if children is not None:
+                children.append(dir_path)
+                return
+            self._subdirs[parent] = [dir_path]
+            dir_path, parent = parent, os.path.dirname(parent)
+
+    def row(self, i) -> ScanRecord:
+        """构造第 i 行的 ScanRecord 视图"""
+        root = self._dirs.strings[self.dir_ids[i]]
+        name = self.names[i]
+        size_low, size_high = self._bounds.get(i, (0, 0))
+        return ScanRecord(root, name, os.path.join(root, name), self.is_dir(i), self.ext_name(i), self.sizes[i],
+                          self.allocated[i], self.is_estimated(i), size_low, size_high, self.scan_root(i),
+                          self.mtimes[i], self.atimes[i], self.empty_state(i))
+
+    def is_dir(self, i) -> bool:
+        return _get_bit(self._dir_bits, i)
+
+    def is_estimated(self, i) -> bool:
+        return _get_bit(self._estimated_bits, i)
+
+    def empty_state(self, i) -> int:
+        """第 i 行的空目录状态，0 代表不是空目录"""
+        return self._empty.get(i, 0)
+
+    def ext_name(self, i) -> str:
+        return self._exts.strings[self.ext_ids[i]]
+
+    def scan_root(self, i) -> str:
+        return self._scan_roots.strings[self.scan_root_ids[i]]
+
+    def abs_path(self, i) -> str:
+        return os.path.join(self._dirs.strings[self.dir_ids[i]], self.names[i])
+
+    def add_group(self, group) -> int:
+        """
+        登记一个重复组(例如 DuplicateGroup)
+        :return: 重复组编号，从 1 开始
+        """
+        with self._lock:
+            self.groups.append(group)
+            return len(self.groups)
+
+    def group(self, i) -> int:
+        """第 i 行所属的重复组编号，0 代表不属于任何组"""
+        return self.group_ids[i]
+
+    def group_info(self, group):
+        """编号为 group 的重复组"""
+        return self.groups[group - 1]
+
+    def has_groups(self) -> bool:
+        return len(self.groups) > 0
+
+    def age(self, i, now=None) -> float | None:
+        """第 i 行的闲置时间(秒)，时间未知时返回 None"""
+        return age_seconds(self.mtimes[i], self.atimes[i], now)
+
+    def staleness(self, i, now=None) -> float:
+        """第 i 行的闲置分数(表观大小 × 闲置天数)"""
+        return staleness_score(self.sizes[i], self.mtimes[i], self.atimes[i], now)
+
+    def set_size(self, i, size, allocated, mtime=None, atime=None):
+        """用精确值替换第 i 行的大小(以及最新时间)，并清除估算标记"""
+        with self._lock:
+            self.sizes[i] = size
+            self.allocated[i] = allocated
+            if mtime is not None:
+                self.mtimes[i] = mtime
+            if atime is not None:
+                self.atimes[i] = atime
+            _set_bit(self._estimated_bits, i, False)
+            self._bounds.pop(i, None)
+
+    def sort_key(self, column) -> Callable[[int], object]:
+        """
+        按表格列排序时使用的行号排序键
+        :param column: 1 相对路径 2 绝对路径 3 是否目录 4 扩展名 5 大小 6 占用空间 7 闲置时间 8 闲置分数 9 重复组
+        """
+        if column == 9:
+            # 同一组的行相邻，组内按绝对路径排序
+            return lambda i: (self.group_ids[i], self.abs_path(i))
+        if column in (7, 8):
+            # 同一次排序使用相同的当前时间
+            now = time.time()
+            if column == 8:
+                return lambda i: self.staleness(i, now)
+
+            def _age_key(i):
+                # 时间未知的行排在最前
+                age = self.age(i, now)
+                return -1.0 if age is None else age
+
+            return _age_key
+        if column == 1:
+            return self.names.__getitem__
+        if column == 3:
+            return self.is_dir
+        if column == 4:
+            return self.ext_name
+        if column == 5:
+            return self.sizes.__getitem__
+        if column == 6:
+            return self.allocated.__getitem__
+        return self.abs_path
+
+    def select(self, rows: Iterable[int] | None = None, min_size: int | None = None, max_size: int | None = None,
+               is_dir: bool | None = None, ext_names: Iterable[str] | None = None,
+               min_age: float | None = None) -> array:
+        """
+        按列过滤，返回满足所有条件的行号
+        条件直接作用在列数组上，不构造 ScanRecord
+        :param rows: 参与过滤的行号，None 代表所有行
+        :param min_size: 表观大小下限(包含)
+        :param max_size: 表观大小上限(不包含)
+        :param is_dir: 只保留目录(True)或文件(False)
+        :param ext_names: 只保留这些扩展名，例如 ['.log']
+        :param min_age: 闲置时间下限(秒，包含)，时间未知的行不满足条件
+        """
+        selected = range(len(self)) if rows is None else rows
+        sizes = self.sizes
+        if min_size is not None:
+            selected = [i for i in selected if sizes[i] >= min_size]
+        if max_size is not None:
+            selected = [i for i in selected if sizes[i] < max_size]
+        if is_dir is not None:
+            dir_bits = self._dir_bits
+            selected = [i for i in selected if bool(dir_bits[i >> 3] & (1 << (i & 7))) == is_dir]
+        if ext_names is not None:
+            ext_ids = set(self._exts.find(ext) for ext in ext_names) - {None}
+            selected = [i for i in selected if self.ext_ids[i] in ext_ids]
+        if min_age is not None:
+            # 最后使用时间早于 newest 即闲置时间不小于 min_age
+            newest = time.time() - min_age
+            mtimes = self.mtimes
+            atimes = self.atimes
+            selected = [i for i in selected if 0 < max(mtimes[i], atimes[i]) <= newest]
+        return array('I', selected)
+
+    def descendants(self, pth) -> array:
+        """
+        位于 pth 之下的所有行，按行号排序
+        沿目录树找出 pth 之下的所在目录，再取这些目录的行，只访问匹配的目录和行
+        """
+        with self._lock:
+            rows = []
+            stack = [os.path.normpath(pth)]
+            while len(stack) > 0:
+                dir_path = stack.pop()
+                stack.extend(self._subdirs.get(dir_path, ()))
+                dir_id = self._dirs.find(dir_path)
+                if dir_id is not None:
+                    rows.extend(self._rows_by_dir.get(dir_id, ()))
+        rows.sort()
+        return array('I', rows)
+
+    def ancestors(self, pth) -> array:
+        """pth 的所有祖先目录中出现在结果里的行，从近到远"""
+        rows = array('I')
+        pth = os.path.normpath(pth)
+        parent = os.path.dirname(pth)
+        while parent != pth:
+            dir_id = self._dirs.find(os.path.dirname(parent))
+            if dir_id is not None:
+                i = self._dir_rows.get((dir_id, os.path.basename(parent)))
+                if i is not None:
+                    rows.append(i)
+            pth, parent = parent, os.path.dirname(parent)
+        return rows
@@ -0,0 +1,66 @@
+"""
+不依赖 Qt 的规则数据
+GUI 的 RuleManager 和命令行都从 rules.json 中读取保存的规则
+"""
+import json
+import os
+from typing import TypedDict
+
+from constants import base_dir
+
+# 保存规则的文件
+RULES_PATH = os.path.join(base_dir, 'rules.json')
+
+
+class RuleData(TypedDict):
+    """一条规则数据"""
+    # 规则名称
+    name: str
+    # 包含规则
+    include: list[str]
+    # 排除规则
+    exclude: list[str]
+
+
+class SavedData(TypedDict):
+    """保存的数据"""
+    # 当前使用的规则 id
+    current_id: str | None
+    # 规则字典
+    # key: uuidv4
+    # value: 一条规则数据
+    rules: dict[str, RuleData]
+
+
+def load_rules(pth=None) -> SavedData:
+    """
+    读取保存的规则，文件不存在时返回空数据
+    :param pth: 规则文件路径，默认为 RULES_PATH
+    """
+    pth = pth or RULES_PATH
+    if not os.path.exists(pth):
+        return {
+            'current_id': None,
+            'rules': {}
+        }
+    with open(pth, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_rule(data: SavedData, name_or_id: str | None = None) -> RuleData | None:
+    """
+    查找规则
+    :param data: 保存的数据
+    :param name_or_id: 规则名称或 id，None 代表当前使用的规则
+    :return: 规则数据，不存在时返回 None
+    """
+    if name_or_id is None:
+        name_or_id = data['current_id']
+        if name_or_id is None:
+            return None
+    if name_or_id in data['rules']:
+        return data['rules'][name_or_id]
+    for rule in data['rules'].values():
+        if rule['name'] == name_or_id:
+            return rule
+    return None
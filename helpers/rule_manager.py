@@ -1,31 +1,10 @@
 import json
-import os.path
 import uuid
-from typing import TypedDict
 
 from PySide6.QtCore import QObject, Signal
 
-from constants import base_dir
-
-
-class RuleData(TypedDict):
-    """一条规则数据"""
-    # 规则名称
-    name: str
-    # 包含规则
-    include: list[str]
-    # 排除规则
-    exclude: list[str]
-
-
-class SavedData(TypedDict):
-    """保存的数据"""
-    # 当前使用的规则 id
-    current_id: str | None
-    # 规则字典
-    # key: uuidv4
-    # value: 一条规则数据
-    rules: dict[str, RuleData]
+# RuleData 和 SavedData 定义在不依赖 Qt 的 rule_data 中，在此重新导出
+from helpers.rule_data import RULES_PATH, RuleData, SavedData, load_rules
 
 
 class RuleManager(QObject):
@@ -36,17 +15,10 @@ class RuleManager(QObject):
 
     def __init__(self):
         super().__init__()
-        self.save_path = os.path.join(base_dir, 'rules.json')
-        if os.path.exists(self.save_path):
-            with open(self.save_path, 'r', encoding='utf-8') as f:
-                self.data: SavedData = json.load(f)
-                if self.data['current_id'] is not None:
-                    self.currentIdChanged.emit()
-        else:
-            self.data: SavedData = {
-                'current_id': None,
-                'rules': {}
-            }
+        self.save_path = RULES_PATH
+        self.data: SavedData = load_rules(self.save_path)
+        if self.data['current_id'] is not None:
+            self.currentIdChanged.emit()
 
     @staticmethod
     def get_instance():
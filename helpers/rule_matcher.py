@@ -0,0 +1,130 @@
+import re
+from typing import Iterable
+
+import pathspec
+from pathspec.patterns import GitWildMatchPattern
+from pathspec.util import match_file, normalize_file
+
+# 不含通配符、转义、目录分隔符的纯名称规则，例如 node_modules、.git
+_literal_regex = re.compile(r'^[^*?\[\]\\!#/\s][^*?\[\]\\/]*$')
+# 形如 *.log 的后缀规则
+_suffix_regex = re.compile(r'^\*([^*?\[\]\\/]+)$')
+# 无法安全地按段解析的规则(转义、取反、注释、首尾空白)
+_unsafe_prefix_regex = re.compile(r'\\|^[!#]|^\s|\s$')
+
+
+class CompiledRules:
+    """
+    编译后的 gitwildmatch 规则，匹配结果与 pathspec.PathSpec('gitwildmatch') 完全一致
+    规则被拆分为三部分:
+    - 纯名称规则: 路径中任意一段与名称相等即匹配，用一次集合查找完成
+    - 后缀规则(*.ext): 路径中任意一段以该后缀结尾即匹配，用一次 str.endswith(tuple) 完成
+    - 其余规则: 合并为一个交替正则表达式，只执行一次匹配
+    规则中存在取反规则(!pattern)时，匹配结果依赖规则顺序，此时回退为 PathSpec 的逐条匹配
+
+    匹配的路径是相对搜索根目录的完整路径，目录以 / 结尾，因此带 / 的锚定规则(例如 build/output、/src/*.tmp)
+    和只匹配目录的规则(例如 cache/)都能生效；所有规则都是锚定规则时，may_match_below 可以用于剪枝
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self.lines = list(lines)
+        self.spec = pathspec.PathSpec.from_lines('gitwildmatch', self.lines)
+        patterns = [p for p in self.spec.patterns if p.include is not None]
+        # 存在取反规则时只能按顺序逐条匹配
+        self.ordered = any(not p.include for p in patterns)
+        self.literals = frozenset()
+        self.suffixes = ()
+        self.regex = None
+        # 锚定规则的逐段正则，None 代表 **；任一规则不是锚定规则时为 None，不能剪枝
+        self.anchored_segments: list[list[re.Pattern | None]] | None = None
+        if self.ordered:
+            return
+        self.anchored_segments = self._compile_anchored(self.lines)
+
+        literals = set()
+        suffixes = []
+        regexes = []
+        for line in self.lines:
+            pattern = GitWildMatchPattern(line)
+            if pattern.include is None:
+                continue
+            suffix_match = _suffix_regex.match(line)
+            if _literal_regex.match(line) and line == line.rstrip():
+                literals.add(line)
+            elif suffix_match and line == line.rstrip():
+                suffixes.append(suffix_match.group(1))
+            else:
+                # 去掉命名分组，多个正则才能合并
+                regexes.append(pattern.regex.pattern.replace('(?P<ps_d>', '(?:'))
+        self.literals = frozenset(literals)
+        self.suffixes = tuple(suffixes)
+        if len(regexes) > 0:
+            self.regex = re.compile('|'.join(f'(?:{r})' for r in regexes))
+
+    @staticmethod
+    def _compile_anchored(lines):
+        """
+        把锚定规则拆分为逐段的正则
+        :return: 每条规则的段列表，存在非锚定规则或无法解析的规则时返回 None
+        """
+        result = []
+        for line in lines:
+            if GitWildMatchPattern(line).include is None:
+                # 空行和注释不匹配任何路径
+                continue
+            body = line.rstrip('/')
+            if _unsafe_prefix_regex.search(line) or '/' not in body or body.startswith('**'):
+                return None
+            segments = []
+            for segment in body.lstrip('/').split('/'):
+                if segment == '**':
+                    segments.append(None)
+                else:
+                    segments.append(re.compile(GitWildMatchPattern._translate_segment_glob(segment) + '$'))
+            result.append(segments)
+        return result
+
+    def may_match_below(self, dir_path: str) -> bool:
+        """
+        判断目录下是否可能存在与规则匹配的路径
+        只有当所有规则都是锚定规则时才能得出否定的结论，否则总是返回 True
+        :param dir_path: 相对搜索根目录的目录路径
+        """
+        if self.anchored_segments is None:
+            return True
+        parts = normalize_file(dir_path).strip('/').split('/')
+        for segments in self.anchored_segments:
+            for i, part in enumerate(parts):
+                if i >= len(segments) or segments[i] is None:
+                    # 规则已经匹配了目录本身或遇到 **，目录下的任意路径都可能匹配
+                    return True
+                if segments[i].match(part) is None:
+                    break
+            else:
+                return True
+        return False
+
+    @staticmethod
+    def from_lines(lines: Iterable[str] | None):
+        """根据规则列表构造匹配器，规则为空时返回 None"""
+        lines = list(lines or [])
+        return CompiledRules(lines) if len(lines) > 0 else None
+
+    def match_file(self, file: str) -> bool:
+        """
+        判断路径是否与规则匹配
+        :param file: 相对路径，分隔符可以是 / 或当前系统的分隔符
+        """
+        norm_file = normalize_file(file)
+        # 正则中的 . 不匹配换行符，且 (?:.+/)? 不能匹配空的首段，这两种罕见路径交给 PathSpec 保证结果一致
+        if self.ordered or '\n' in norm_file or norm_file.startswith('/'):
+            return match_file(self.spec.patterns, norm_file)
+        if len(self.literals) > 0 or len(self.suffixes) > 0:
+            parts = norm_file.split('/')
+            if not self.literals.isdisjoint(parts):
+                return True
+            if len(self.suffixes) > 0:
+                for part in parts:
+                    if part.endswith(self.suffixes):
+                        return True
+        return self.regex is not None and self.regex.match(norm_file) is not None
@@ -0,0 +1,199 @@
+"""
+搜索的检查点
+长时间的搜索(例如网络共享目录)中途关闭、取消或崩溃后，下次使用相同的目录和规则搜索时从检查点继续，而不是重新开始
+
+检查点由两个文件组成:
+- <key>.records: 已完成部分的结果，每行一条 JSON，只追加写入
+- <key>.json: 元数据和待完成的工作(前沿)，每次保存时原子地整体替换，
+  其中记录了 .records 中有效内容的字节数，崩溃时多写入的结果会在加载时截断
+
+前沿中的工作单元有两种:
+- ('visit', 目录, 相对路径): 尚未处理完成的目录
+- ('size', 所在目录, 名称, 绝对路径): 尚未统计完成大小的匹配目录
+一个单元处理完成时，其产生的结果和新的单元在同一次加锁中提交，因此任意时刻保存的检查点都是一致的:
+未完成的单元产生的结果不会被保存，恢复后重新处理该单元
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable
+
+from constants import base_dir
+from helpers.scanner import ScanRecord
+from logger import logger
+
+# 检查点格式版本，格式变化时旧的检查点全部失效
+CHECKPOINT_VERSION = 2
+# 自动保存的间隔(秒)
+CHECKPOINT_INTERVAL = 10.0
+# 超过该时间(秒)的检查点不再使用
+CHECKPOINT_MAX_AGE = 7 * 24 * 3600
+
+
+def _root_identity(root):
+    """根目录的身份 (st_dev, st_ino)，根目录被替换或重新挂载后检查点失效"""
+    st = os.stat(root)
+    return [st.st_dev, st.st_ino]
+
+
+class ScanCheckpoint:
+    """
+    一次搜索的检查点
+    相同的根目录、规则和搜索选项对应同一个检查点
+    """
+
+    def __init__(self, root, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None,
+                 options: Iterable | None = None, dir_path=None, interval=CHECKPOINT_INTERVAL):
+        """
+        :param root: 搜索目录
+        :param include: 包含规则列表
+        :param exclude: 排除规则列表
+        :param options: 其他影响结果的搜索选项，例如界面上的大小条件，必须可以序列化为 JSON
+        :param dir_path: 检查点所在的目录，默认为 base_dir 下的 checkpoints
+        :param interval: 自动保存的间隔(秒)
+        """
+        self.root = os.path.abspath(root)
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.options = list(options or [])
+        self.interval = interval
+        dir_path = dir_path or os.path.join(base_dir, 'checkpoints')
+        key_text = json.dumps([self.root, self.include, self.exclude, self.options], ensure_ascii=False)
+        key = hashlib.sha1(key_text.encode('utf-8')).hexdigest()
+        self.meta_path = os.path.join(dir_path, f'{key}.json')
+        self.records_path = os.path.join(dir_path, f'{key}.records')
+        self._lock = threading.Lock()
+        # 未完成的工作单元，使用字典作为有序集合
+        self._frontier: dict[tuple, None] = {}
+        # 已提交但尚未写入文件的结果
+        self._pending_records: list[ScanRecord] = []
+        # .records 中有效内容的字节数
+        self._records_bytes = 0
+        self._last_save = time.monotonic()
+
+    def load(self) -> tuple[list[ScanRecord], list[tuple]] | None:
+        """
+        加载并校验检查点
+        检查点的版本、根目录、规则、选项和根目录的身份都一致且未过期时才有效，无效的检查点会被删除
+        前沿中已经不存在的目录会被丢弃
+        :return: (已完成的结果, 待完成的工作单元)，没有有效的检查点时返回 None
+        """
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            valid = (meta.get('version') == CHECKPOINT_VERSION
+                     and meta.get('root') == self.root
+                     and meta.get('include') == self.include
+                     and meta.get('exclude') == self.exclude
+                     and meta.get('options') == self.options
+                     and meta.get('root_identity') == _root_identity(self.root)
+                     and time.time() - meta.get('saved_at', 0) <= CHECKPOINT_MAX_AGE)
+        except OSError:
+            valid = False
+        if not valid:
+            logger.info(f'检查点已失效: {self.meta_path}')
+            self.remove()
+            return None
+        records_bytes = meta['records_bytes']
+        records = []
+        try:
+            with open(self.records_path, 'r+b') as f:
+                data = f.read(records_bytes)
+                # 截断上次保存之后多写入的结果
+                f.truncate(records_bytes)
+        except OSError:
+            self.remove()
+            return None
+        if len(data) != records_bytes:
+            self.remove()
+            return None
+        for line in data.splitlines():
+            records.append(ScanRecord(*json.loads(line)))
+        frontier = []
+        for unit in meta['frontier']:
+            unit = tuple(unit)
+            dir_path = unit[1] if unit[0] == 'visit' else unit[3]
+            if os.path.isdir(dir_path):
+                frontier.append(unit)
+        with self._lock:
+            self._frontier = dict.fromkeys(frontier)
+            self._records_bytes = records_bytes
+        return records, frontier
+
+    def begin(self, units: Iterable[tuple]):
+        """开始一次新的搜索，丢弃旧的检查点并设置初始的工作单元"""
+        self.remove()
+        with self._lock:
+            self._frontier = dict.fromkeys(tuple(unit) for unit in units)
+            self._pending_records = []
+            self._records_bytes = 0
+
+    def add(self, units: Iterable[tuple]):
+        """添加工作单元"""
+        with self._lock:
+            for unit in units:
+                self._frontier[tuple(unit)] = None
+
+    def complete(self, unit: tuple, records: Iterable[ScanRecord] = (), units: Iterable[tuple] = ()):
+        """
+        一个工作单元处理完成
+        :param unit: 完成的单元
+        :param records: 该单元产生的结果
+        :param units: 该单元产生的新单元
+        """
+        with self._lock:
+            self._frontier.pop(unit, None)
+            for new_unit in units:
+                self._frontier[tuple(new_unit)] = None
+            self._pending_records.extend(records)
+
+    def maybe_save(self):
+        """距离上次保存超过 interval 时保存检查点"""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """保存检查点: 先追加结果，再原子地替换元数据"""
+        with self._lock:
+            records = self._pending_records
+            self._pending_records = []
+            frontier = list(self._frontier)
+        self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(self.meta_path), exist_ok=True)
+        data = ''.join(json.dumps(list(record), ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+        with open(self.records_path, 'ab') as f:
+            f.truncate(self._records_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._records_bytes += len(data)
+        meta = {
+            'version': CHECKPOINT_VERSION,
+            'root': self.root,
+            'include': self.include,
+            'exclude': self.exclude,
+            'options': self.options,
+            'root_identity': _root_identity(self.root),
+            'saved_at': time.time(),
+            'records_bytes': self._records_bytes,
+            'frontier': frontier,
+        }
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def remove(self):
+        """删除检查点，搜索正常完成后调用"""
+        for pth in (self.meta_path, self.records_path, self.meta_path + '.tmp'):
+            try:
+                os.remove(pth)
+            except FileNotFoundError:
+                pass
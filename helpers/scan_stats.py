@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+from utils import byte_size_to_str
+
+# Windows 上 DirEntry.stat(follow_symlinks=False) 的结果来自目录枚举，不需要额外的系统调用
+STAT_IS_FREE = os.name == 'nt'
+
+
+class ScanStats:
+    """
+    一次搜索的统计信息
+    计数器由多个工作线程累加，工作线程应在本地累计后通过 add 一次性提交，减少锁竞争
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 已列出的目录数
+        self.dirs_listed = 0
+        # 已检查的条目数
+        self.entries = 0
+        # 列目录的系统调用次数(listdir / scandir)
+        self.list_calls = 0
+        # stat / lstat 系统调用次数
+        self.stat_calls = 0
+        # 统计匹配目录大小时遍历的目录数、文件数和已统计的表观大小，搜索期间可以读取以显示进度
+        self.sized_dirs = 0
+        self.sized_files = 0
+        self.sized_bytes = 0
+        # 持久化索引的命中和未命中次数(按目录计)
+        self.index_hits = 0
+        self.index_misses = 0
+        # 因规则不可能匹配而没有进入的目录数
+        self.pruned_dirs = 0
+        # 列目录并匹配所花费的时间之和(各线程累加)，用于估算剪枝节省的时间
+        self.list_seconds = 0.0
+        # 因大小已超过上限而放弃统计的子树数
+        self.abandoned_subtrees = 0
+        # 只保留最大的 N 项时丢弃的结果数
+        self.top_discarded = 0
+        # 匹配但不可能满足过滤表达式、在 stat 和统计大小之前被丢弃的条目数
+        self.filtered_entries = 0
+        # 从检查点恢复的结果数
+        self.resumed_records = 0
+        # 跳过的重复硬链接数
+        self.duplicate_links = 0
+        # 查找重复文件: 大小相同的候选文件数、计算样本哈希和完整哈希的文件数、读取的字节数、重复组数和可释放的字节数
+        self.dup_candidates = 0
+        self.dup_sampled_files = 0
+        self.dup_hashed_files = 0
+        self.dup_read_bytes = 0
+        self.dup_groups = 0
+        self.dup_reclaimable_bytes = 0
+        # 查找重复目录树: 计算哈希的目录数、结构哈希相同的候选目录数、计算内容哈希的文件数、缓存命中数、读取的字节数、
+        # 重复组数和可释放的字节数
+        self.tree_dirs = 0
+        self.tree_candidates = 0
+        self.tree_hashed_files = 0
+        self.tree_cache_hits = 0
+        self.tree_read_bytes = 0
+        self.tree_groups = 0
+        self.tree_reclaimable_bytes = 0
+        # 输出结果的表观大小和占用空间之和，硬链接只统计一次
+        self.apparent_bytes = 0
+        self.allocated_bytes = 0
+        # 从取消到所有工作线程停止的耗时(秒)，未取消或无法测量时为 None
+        self.cancel_latency = None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def add(self, **counters):
+        """
+        累加计数器
+        :param counters: 计数器名称和增量，例如 add(entries=10, stat_calls=2)
+        """
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    @property
+    def syscalls(self):
+        return self.list_calls + self.stat_calls
+
+    @property
+    def index_hit_rate(self):
+        total = self.index_hits + self.index_misses
+        return self.index_hits / total if total > 0 else 0.0
+
+    @property
+    def pruned_seconds(self):
+        """
+        剪枝节省的时间估算(各线程累加): 每个跳过的目录至少需要一次列目录，按平均列目录时间计算，是一个下限
+        """
+        if self.dirs_listed == 0:
+            return 0.0
+        return self.pruned_dirs * self.list_seconds / self.dirs_listed
+
+    def summary(self):
+        text = (f'目录数: {self.dirs_listed}, 条目数: {self.entries}, '
+                f'统计大小的目录数: {self.sized_dirs}, 文件数: {self.sized_files} '
+                f'({byte_size_to_str(self.sized_bytes)}), '
+                f'系统调用: {self.syscalls} (列目录: {self.list_calls}, stat: {self.stat_calls}), '
+                f'耗时: {self.elapsed:.3f}s')
+        if self.apparent_bytes > 0 or self.allocated_bytes > 0:
+            text += (f', 结果大小: {byte_size_to_str(self.apparent_bytes)}, '
+                     f'占用空间: {byte_size_to_str(self.allocated_bytes)}')
+        if self.pruned_dirs > 0:
+            text += f', 跳过目录: {self.pruned_dirs} (至少节省 {self.pruned_seconds:.3f}s 线程时间)'
+        if self.filtered_entries > 0:
+            text += f', 提前过滤的条目: {self.filtered_entries}'
+        if self.resumed_records > 0:
+            text += f', 从检查点恢复的结果: {self.resumed_records}'
+        if self.abandoned_subtrees > 0:
+            text += f', 提前放弃统计的目录: {self.abandoned_subtrees}'
+        if self.top_discarded > 0:
+            text += f', 最大 N 项之外丢弃: {self.top_discarded}'
+        if self.duplicate_links > 0:
+            text += f', 重复硬链接: {self.duplicate_links}'
+        if self.dup_candidates > 0:
+            text += (f', 重复文件候选: {self.dup_candidates} (样本哈希: {self.dup_sampled_files}, '
+                     f'完整哈希: {self.dup_hashed_files}, 读取: {byte_size_to_str(self.dup_read_bytes)}), '
+                     f'重复组: {self.dup_groups} (可释放 {byte_size_to_str(self.dup_reclaimable_bytes)})')
+        if self.tree_dirs > 0:
+            text += (f', 重复目录树: 计算 {self.tree_dirs} 个目录 (候选: {self.tree_candidates}, '
+                     f'完整哈希: {self.tree_hashed_files}, 缓存命中: {self.tree_cache_hits}, '
+                     f'读取: {byte_size_to_str(self.tree_read_bytes)}), '
+                     f'重复组: {self.tree_groups} (可释放 {byte_size_to_str(self.tree_reclaimable_bytes)})')
+        if self.cancel_latency is not None:
+            text += f', 取消耗时: {self.cancel_latency:.3f}s'
+        if self.index_hits + self.index_misses > 0:
+            text += f', 索引命中率: {self.index_hit_rate:.1%} ({self.index_hits}/{self.index_hits + self.index_misses})'
+        return text
@@ -0,0 +1,536 @@
+"""
+不依赖 Qt 的搜索核心
+GUI、脚本和基准测试都通过 scan 生成器获取搜索结果
+"""
+import functools
+import os
+import queue
+import stat
+import time
+from enum import Enum
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from exceptions.search_exception import SearchException
+from helpers.cancellation import CANCEL_LATENCY_BUDGET, CancelEvent, cancel_latency
+from helpers.dir_sizer import SubtreeSizer
+from helpers.fs_index import FsIndex, open_dir, stat_is_free
+from helpers.io_scheduler import IoScheduler
+from helpers.rule_matcher import CompiledRules
+from helpers.scan_stats import ScanStats, STAT_IS_FREE
+from helpers.size_accounting import InodeSet, file_usage, link_stat
+from helpers.size_estimator import SizeEstimate, estimate_subtree
+from helpers.staleness import file_times
+from helpers.top_n import TopN
+from helpers.traversal_engine import TraversalEngine, TraversalJob
+from utils import file_size_to_byte
+
+
+class MatchType(Enum):
+    MATCHED = 0  # 匹配
+    NOT_MATCHED = 1  # 不匹配
+    EXCLUDED = 2  # 被排除
+    PERMISSION_DENIED = 3  # 权限不足
+    FILTERED = 4  # 匹配，但不可能满足过滤表达式
+
+
+class ScanRecord(NamedTuple):
+    """一条搜索结果"""
+    # 条目所在的目录
+    root: str
+    # 相对 root 的路径
+    pth: str
+    abs_path: str
+    is_dir: bool
+    # 小写的扩展名，例如 .log
+    ext_name: str
+    # 表观大小，重复的硬链接为 0
+    size: int
+    # 占用空间(st_blocks * 512)，重复的硬链接为 0
+    allocated: int
+    # 大小是否为抽样估算值，估算值的 95% 置信区间为 [size_low, size_high]
+    estimated: bool = False
+    size_low: int = 0
+    size_high: int = 0
+    # 结果所属的搜索根目录，同时搜索多个根目录时用于区分结果的来源
+    scan_root: str = ''
+    # 最新的修改时间和访问时间，目录为子树中所有文件的最大值，0 代表未知，见 helpers.staleness
+    mtime: float = 0.0
+    atime: float = 0.0
+    # 空目录状态，0 代表不是空目录，见 helpers.empty_dirs
+    empty: int = 0
+
+
+# 过滤搜索结果的谓词，返回 False 的结果会被丢弃
+Predicate = Callable[[ScanRecord], bool]
+
+
+def _search_error(abs_path):
+    return SearchException(f'路径: {abs_path} \n搜索该路径时出现异常，这种情况通常是因为该文件或目录被系统保护了\n建议添加名称到排除列表')
+
+
+def _is_reparse_point(entry: os.DirEntry):
+    """
+    判断条目是否为重解析点
+    Windows 上 DirEntry 自带文件属性，其他系统上用 d_type 判断符号链接，均不需要额外的系统调用
+    """
+    if STAT_IS_FREE:
+        return bool(entry.stat(follow_symlinks=False).st_file_attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+    return entry.is_symlink()
+
+
+def build_spec(rules: Iterable[str] | None):
+    """根据规则列表构造编译后的 gitwildmatch 规则，规则为空时返回 None"""
+    return CompiledRules.from_lines(rules)
+
+
+def size_predicate(compare: str, compare_size: str) -> Predicate | None:
+    """
+    根据界面上的比较方法和文件大小构造谓词
+    :param compare: 小于 或 大于等于
+    :param compare_size: 文件大小字符串，`不限大小` 时返回 None
+    """
+    if compare_size == '不限大小':
+        return None
+    limit = file_size_to_byte(compare_size)
+    if compare == '小于':
+        def _less(record):
+            return record.size < limit
+
+        # 大小上限，统计目录大小时达到上限即可放弃
+        _less.max_size = limit
+        return _less
+    return lambda record: record.size >= limit
+
+
+def size_upper_bound(predicates: Iterable[Predicate] | None) -> int | None:
+    """谓词中最小的大小上限(见 size_predicate)，没有上限时返回 None"""
+    limits = [p.max_size for p in (predicates or []) if getattr(p, 'max_size', None) is not None]
+    return min(limits) if len(limits) > 0 else None
+
+
+class Scanner:
+    """
+    在遍历引擎上执行一次搜索
+    每条结果通过 emit 回调输出，回调会在工作线程中被调用
+    """
+
+    def __init__(self, include_spec, exclude_spec, emit: Callable[[ScanRecord], None],
+                 predicates: Iterable[Predicate] | None = None, stats: ScanStats | None = None,
+                 index: FsIndex | None = None, estimate=False, top: TopN | None = None,
+                 max_size: int | None = None, checkpoint=None, scan_root: str | None = None,
+                 seen: InodeSet | None = None, empty_dirs=None):
+        """
+        :param include_spec: 包含规则，None 代表匹配所有条目
+        :param exclude_spec: 排除规则，None 代表不排除
+        :param emit: 输出结果的回调
+        :param predicates: 结果需要满足的所有谓词
+        :param stats: 统计信息
+        :param index: 持久化索引，为 None 时直接读取文件系统
+        :param estimate: 是否抽样估算匹配目录的大小，估算结果立即输出，不再等待完整的统计
+        :param top: 只保留最大 N 项时的结果堆，不可能进入堆的结果在构造之前丢弃
+        :param max_size: 匹配目录的大小上限，统计时达到上限即放弃该目录，默认从谓词中获取
+        :param checkpoint: 检查点(helpers.scan_checkpoint.ScanCheckpoint)，每个目录和匹配目录的大小统计完成时提交到检查点
+        :param scan_root: 结果中记录的搜索根目录，默认为 start 的 root
+        :param seen: 已统计的 inode 集合，同时搜索多个根目录时共享同一个集合，使硬链接在所有根目录中只统计一次
+        :param empty_dirs: 空目录收集器(helpers.empty_dirs.EmptyDirTracker)，遍历每个目录时记录其中的条目信息
+        """
+        self.include_spec = include_spec
+        self.exclude_spec = exclude_spec
+        self.emit = emit
+        self.predicates = [p for p in (predicates or []) if p is not None]
+        # 支持在大小未知时判断的谓词(例如 helpers.filter_expr.FilterPredicate)，在 stat 和统计目录大小之前调用
+        self.prefilters = [p.prefilter for p in self.predicates if hasattr(p, 'prefilter')]
+        self.stats = stats if stats is not None else ScanStats()
+        self.index = index
+        self.estimate = estimate
+        self.top = top
+        self.max_size = max_size if max_size is not None else size_upper_bound(self.predicates)
+        self.checkpoint = checkpoint
+        self.scan_root = scan_root
+        # 本次搜索中已统计的 inode，匹配的文件和所有 SubtreeSizer 共享
+        self.seen = seen if seen is not None else InodeSet()
+        self.empty_dirs = empty_dirs
+
+    def start(self, root, cancel_event=None, rel_root='') -> TraversalJob:
+        """
+        开始搜索 root，返回遍历引擎中的 job，job 受 root 所在设备的并发限制
+        :param rel_root: root 相对搜索根目录的路径，只搜索某个子目录(例如多进程分片)时传入，规则匹配的是完整的相对路径
+        """
+        if self.scan_root is None:
+            self.scan_root = root
+        job = TraversalEngine.get_instance().start(self.visit_dir, [(root, rel_root)], cancel_event,
+                                                   IoScheduler.device_of(root))
+        job.add_done_callback(self._record_cancel_latency)
+        return job
+
+    def resume(self, root, units, cancel_event=None) -> TraversalJob:
+        """
+        从检查点中待完成的工作单元继续搜索 root
+        :param units: 工作单元列表，见 helpers.scan_checkpoint
+        """
+        if self.scan_root is None:
+            self.scan_root = root
+        job = TraversalEngine.get_instance().start(self._run_unit, units, cancel_event, IoScheduler.device_of(root))
+        job.add_done_callback(self._record_cancel_latency)
+        return job
+
+    def _run_unit(self, job, kind, *args):
+        if kind == 'visit':
+            self.visit_dir(job, *args)
+        else:
+            self._start_sizer(job, *args)
+
+    def _record_cancel_latency(self, job):
+        """job 完成时记录从取消到所有任务停止的耗时"""
+        latency = cancel_latency(job.cancel_event)
+        if latency is not None:
+            self.stats.cancel_latency = latency
+
+    @staticmethod
+    def rel_path(rel_dir, name, is_dir):
+        """构造相对搜索根目录的路径，目录以 / 结尾以便匹配只针对目录的规则"""
+        pth = f'{rel_dir}/{name}' if rel_dir else name
+        return pth + '/' if is_dir else pth
+
+    def match_name(self, pth):
+        """
+        根据路径进行规则匹配
+        :param pth: 相对搜索根目录的路径，目录以 / 结尾
+        """
+        if self.exclude_spec is not None and self.exclude_spec.match_file(pth):
+            return MatchType.EXCLUDED
+        if self.include_spec is not None:
+            return MatchType.MATCHED if self.include_spec.match_file(pth) else MatchType.NOT_MATCHED
+        return MatchType.MATCHED
+
+    def match_entry(self, entry: os.DirEntry, rel_dir=''):
+        """
+        使用 DirEntry 自带的名称和类型信息进行匹配
+        :param rel_dir: 条目所在目录相对搜索根目录的路径
+        只有匹配上的文件才需要 stat 获取大小，匹配上的目录的大小由 SubtreeSizer 在引擎中并行统计
+        :return: (匹配结果, 名称, 绝对路径, 是否目录, 大小, 占用空间, mtime, atime, 产生的 stat 调用次数)
+        """
+        try:
+            if _is_reparse_point(entry):
+                return MatchType.PERMISSION_DENIED, entry.name, entry.path, False, 0, 0, 0.0, 0.0, 0
+            is_dir = entry.is_dir(follow_symlinks=False)
+            matched = self.match_name(self.rel_path(rel_dir, entry.name, is_dir))
+            if matched == MatchType.MATCHED and len(self.prefilters) > 0:
+                ext_name = os.path.splitext(entry.name)[-1].lower()
+                depth = rel_dir.count('/') + 2 if rel_dir else 1
+                if not all(prefilter(is_dir, ext_name, depth) for prefilter in self.prefilters):
+                    return MatchType.FILTERED, entry.name, entry.path, is_dir, 0, 0, 0.0, 0.0, 0
+            size = 0
+            allocated = 0
+            mtime = atime = 0.0
+            stat_calls = 0
+            if matched == MatchType.MATCHED and not is_dir:
+                st, extra_stat = link_stat(entry, self.seen is not None)
+                size, allocated, duplicate = file_usage(st, self.seen, entry.path)
+                mtime, atime = file_times(st)
+                if duplicate:
+                    self.stats.add(duplicate_links=1)
+                stat_calls = (0 if stat_is_free(entry) else 1) + extra_stat
+            return matched, entry.name, entry.path, is_dir, size, allocated, mtime, atime, stat_calls
+        except:
+            raise _search_error(entry.path)
+
+    def output(self, dir_path, pth, abs_path, is_dir, size, allocated, mtime=0.0, atime=0.0,
+               estimate: SizeEstimate | None = None):
+        """
+        检查谓词并输出一条匹配结果
+        :param mtime: 最新的修改时间，目录为子树中的最大值
+        :param atime: 最新的访问时间，目录为子树中的最大值
+        :param estimate: 抽样估算的结果，非精确值时记录置信区间
+        :return: 输出的结果，被丢弃时返回 None
+        """
+        if self.top is not None and not self.top.can_enter(size):
+            self.top.discard()
+            return None
+        ext_name = os.path.splitext(abs_path)[-1].lower()
+        if estimate is not None and not estimate.exact:
+            record = ScanRecord(dir_path, pth, abs_path, is_dir, ext_name, size, allocated, True, estimate.low,
+                                estimate.high, self.scan_root or '', mtime, atime)
+        else:
+            record = ScanRecord(dir_path, pth, abs_path, is_dir, ext_name, size, allocated,
+                                scan_root=self.scan_root or '', mtime=mtime, atime=atime)
+        if all(predicate(record) for predicate in self.predicates):
+            self.stats.add(apparent_bytes=size, allocated_bytes=allocated)
+            self.emit(record)
+            return record
+        return None
+
+    def _start_sizer(self, job, dir_path, pth, abs_path):
+        """开始统计匹配目录的大小，统计完成后再输出"""
+        on_done = functools.partial(self._output_sized, dir_path, pth, abs_path)
+        SubtreeSizer(job, abs_path, on_done, self.stats, self.index, self.seen, self.max_size).start()
+
+    def _output_sized(self, dir_path, pth, abs_path, size, allocated, mtime, atime):
+        record = self.output(dir_path, pth, abs_path, True, size, allocated, mtime, atime)
+        if self.checkpoint is not None:
+            self.checkpoint.complete(('size', dir_path, pth, abs_path), [record] if record is not None else [])
+
+    def _list_and_match(self, job, dir_path, rel_dir):
+        """
+        列出目录并匹配其中的所有条目
+        :return: 匹配结果列表，任务被取消时返回 None
+        """
+        start_time = time.perf_counter()
+        match_result = []
+        stat_calls = 0
+        with open_dir(dir_path, self.index, self.stats) as it:
+            for entry in it:
+                if job.is_cancelled():
+                    return None
+                *match_tuple, entry_stat_calls = self.match_entry(entry, rel_dir)
+                stat_calls += entry_stat_calls
+                match_result.append(tuple(match_tuple))
+        list_calls = 0 if self.index is not None else 1
+        self.stats.add(dirs_listed=1, list_calls=list_calls, entries=len(match_result), stat_calls=stat_calls,
+                       list_seconds=time.perf_counter() - start_time)
+        return match_result
+
+    def can_prune(self, rel_dir):
+        """判断不匹配的目录是否可以不再进入: 包含规则全部为锚定规则，且都不可能匹配该目录下的路径"""
+        return self.include_spec is not None and not self.include_spec.may_match_below(rel_dir)
+
+    def visit_dir(self, job, dir_path, rel_dir=''):
+        """
+        遍历引擎中的任务: 处理一个目录
+        匹配目录下的所有条目，输出匹配结果，并把需要递归的目录作为新任务提交给引擎
+        :param rel_dir: dir_path 相对搜索根目录的路径
+        """
+        match_result = self._list_and_match(job, dir_path, rel_dir)
+        if match_result is None:
+            return
+        # 需要递归的数据: 与 spec 不匹配、且下面可能存在匹配路径的目录
+        need_recursive = []
+        pruned = 0
+        filtered = 0
+        for match_tuple in match_result:
+            if match_tuple[0] == MatchType.FILTERED:
+                filtered += 1
+            if match_tuple[0] != MatchType.NOT_MATCHED or not match_tuple[3]:
+                continue
+            sub_rel_dir = f'{rel_dir}/{match_tuple[1]}' if rel_dir else match_tuple[1]
+            if self.can_prune(sub_rel_dir):
+                pruned += 1
+            else:
+                need_recursive.append((match_tuple[2], sub_rel_dir))
+        if pruned > 0 or filtered > 0:
+            self.stats.add(pruned_dirs=pruned, filtered_entries=filtered)
+        entries = len(match_result)
+        match_result = [result[1:] for result in match_result if result[0] == MatchType.MATCHED]
+        if self.empty_dirs is not None:
+            # 既不匹配也不递归进入的条目(不匹配的文件、被排除或被剪枝的目录等)在删除后一定会保留
+            self.empty_dirs.visit(dir_path, entries, len(match_result), len(need_recursive),
+                                  entries > len(match_result) + len(need_recursive),
+                                  (self.scan_root or '') if rel_dir else None)
+        records = []
+        # 需要统计大小的匹配目录，在子树大小统计完成后再输出
+        sized_dirs = []
+        for pth, abs_path, is_dir, size, allocated, mtime, atime in match_result:
+            if job.is_cancelled():
+                return
+            if is_dir and self.estimate:
+                estimate = estimate_subtree(abs_path, cancel_event=job.cancel_event, stats=self.stats)
+                records.append(self.output(dir_path, pth, abs_path, True, estimate.size, estimate.allocated,
+                                           estimate.mtime, estimate.atime, estimate))
+            elif is_dir:
+                sized_dirs.append((dir_path, pth, abs_path))
+            else:
+                records.append(self.output(dir_path, pth, abs_path, is_dir, size, allocated, mtime, atime))
+        if self.checkpoint is not None:
+            # 先提交本目录的结果和新的工作单元，再开始新的工作，保证检查点中的前沿与结果一致
+            self.checkpoint.complete(('visit', dir_path, rel_dir), [r for r in records if r is not None],
+                                     [('visit', *sub_dir) for sub_dir in need_recursive] +
+                                     [('size', *sized_dir) for sized_dir in sized_dirs])
+        for sized_dir in sized_dirs:
+            self._start_sizer(job, *sized_dir)
+        engine = TraversalEngine.get_instance()
+        for sub_dir_path, sub_rel_dir in need_recursive:
+            engine.submit(job, self.visit_dir, sub_dir_path, sub_rel_dir)
+
+
+def _drain(jobs: list[TraversalJob], records: queue.SimpleQueue, on_tick: Callable[[], None] | None = None):
+    """
+    从 records 中逐条产出结果，直到所有 job 完成且结果全部取出，或 job 被取消
+    :param on_tick: 每次等待结果前调用的回调，例如定期保存检查点
+    """
+    while not any(job.is_cancelled() for job in jobs):
+        if on_tick is not None:
+            on_tick()
+        try:
+            yield records.get(timeout=0.05)
+            continue
+        except queue.Empty:
+            pass
+        if all(job.done_event.is_set() for job in jobs) and records.empty():
+            break
+
+
+def _planned(records: Iterable[ScanRecord], empty_dirs) -> Iterator[ScanRecord]:
+    """逐条产出结果，并把产出的结果记入空目录收集器的删除计划"""
+    if empty_dirs is None:
+        yield from records
+        return
+    for record in records:
+        empty_dirs.plan(record)
+        yield record
+
+
+def scan(root: str, include: Iterable[str] | None = None, exclude: Iterable[str] | None = None,
+         predicates: Iterable[Predicate] | None = None, cancel_event=None,
+         stats: ScanStats | None = None, index: FsIndex | None = None,
+         processes: bool | None = None, estimate=False, top_n: int | None = None,
+         checkpoint=None, rank_key: Callable[[ScanRecord], float] | None = None,
+         empty_dirs=None) -> Iterator[ScanRecord]:
+    """
+    搜索 root 并以流的形式逐条产出结果
+    提前关闭生成器(例如 break 后被回收)会取消搜索
+    :param root: 搜索目录
+    :param include: 包含规则列表(gitwildmatch)，为空时匹配所有条目
+    :param exclude: 排除规则列表(gitwildmatch)
+    :param predicates: 结果需要满足的谓词，例如 size_predicate 的返回值
+    :param cancel_event: 取消事件
+    :param stats: 统计信息，搜索结束后调用方可从中读取统计数据
+    :param index: 持久化索引，传入后只重新列出 mtime 变化的目录
+    :param processes: 是否按顶层子树分片到多个进程中搜索，None 代表根据 cpu 数量和目录规模自动选择;
+                      使用索引时总是在当前进程中搜索
+    :param estimate: 是否抽样估算匹配目录的大小，见 helpers.size_estimator
+    :param top_n: 只保留表观大小最大的 top_n 项，搜索期间只占用有界的内存，结束后按大小从大到小一次性产出;
+                  None 代表产出所有结果
+    :param checkpoint: 检查点(helpers.scan_checkpoint.ScanCheckpoint)，存在有效的检查点时先产出其中的结果，
+                       再从其中待完成的目录继续搜索；搜索期间定期保存，取消、出错或关闭生成器时保存，正常完成后删除;
+                       使用检查点时总是在当前进程中搜索，恢复前后的硬链接不会去重
+    :param rank_key: top_n 的排序键，例如按闲置分数排序的 helpers.staleness.staleness_key()，None 代表按表观大小
+    :param empty_dirs: 空目录收集器(helpers.empty_dirs.EmptyDirTracker)，产出的结果视为删除计划，
+                       所有结果产出后再产出空目录和删除后为空的目录(empty 不为 0，不经过谓词过滤);
+                       使用时总是在当前进程中搜索
+    :return: ScanRecord 生成器，搜索中出现的第一个异常会在结果产出完毕后抛出；
+             取消后不再产出结果，生成器在工作线程全部停止(最多等待 CANCEL_LATENCY_BUDGET 秒)后结束
+    """
+    stats = stats if stats is not None else ScanStats()
+    cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+    top = TopN(top_n, rank_key) if top_n is not None else None
+    if index is None and checkpoint is None and empty_dirs is None and processes is not False:
+        # 延迟导入，process_scan 依赖本模块
+        from helpers import process_scan
+        if processes or process_scan.should_use_processes(root):
+            records = process_scan.scan_processes(root, include, exclude, predicates, cancel_event, stats,
+                                                  estimate=estimate)
+            if top is None:
+                yield from records
+                return
+            for record in records:
+                top.offer(record)
+            stats.top_discarded = top.discarded
+            if not cancel_event.is_set():
+                yield from top.results()
+            return
+    records = queue.SimpleQueue()
+    scanner = Scanner(build_spec(include), build_spec(exclude), records.put if top is None else top.offer,
+                      predicates, stats=stats, index=index, estimate=estimate, top=top, checkpoint=checkpoint,
+                      empty_dirs=empty_dirs)
+    resumed = checkpoint.load() if checkpoint is not None else None
+    if resumed is not None:
+        resumed_records, units = resumed
+        stats.resumed_records = len(resumed_records)
+        for record in resumed_records:
+            stats.add(apparent_bytes=record.size, allocated_bytes=record.allocated)
+            scanner.emit(record)
+        job = scanner.resume(root, units, cancel_event)
+    else:
+        if checkpoint is not None:
+            checkpoint.begin([('visit', root, '')])
+        job = scanner.start(root, cancel_event)
+    try:
+        yield from _planned(_drain([job], records, checkpoint.maybe_save if checkpoint is not None else None),
+                            empty_dirs)
+    finally:
+        if not job.done_event.is_set():
+            job.cancel_event.set()
+            job.wait(CANCEL_LATENCY_BUDGET)
+        if checkpoint is not None:
+            if job.done_event.is_set() and not job.is_cancelled() and len(job.errors) == 0:
+                checkpoint.remove()
+            else:
+                checkpoint.save()
+        if index is not None:
+            index.flush()
+        stats.finish()
+    if top is not None and not job.is_cancelled():
+        stats.top_discarded = top.discarded
+        yield from _planned(top.results(), empty_dirs)
+    if empty_dirs is not None and not job.is_cancelled():
+        yield from empty_dirs.records()
+    if len(job.errors) > 0 and not job.is_cancelled():
+        raise job.errors[0]
+
+
+def distinct_roots(roots: Iterable[str]) -> list[str]:
+    """
+    去掉重复和嵌套的根目录，保持原有顺序
+    比较的是解析符号链接后的真实路径；位于另一个根目录之下的根目录会作为外层根目录的一部分被搜索，不再单独搜索
+    """
+    roots = list(dict.fromkeys(roots))
+    real_paths = {root: os.path.normcase(os.path.realpath(root)) for root in roots}
+    kept = set()
+    kept_real_paths = []
+    # 先处理较短的路径，外层根目录总是先于内层根目录被保留
+    for root in sorted(roots, key=lambda r: len(real_paths[r])):
+        real_path = real_paths[root]
+        if any(real_path == other or real_path.startswith(os.path.join(other, '')) for other in kept_real_paths):
+            continue
+        kept.add(root)
+        kept_real_paths.append(real_path)
+    return [root for root in roots if root in kept]
+
+
+def scan_roots(roots: Iterable[str], include: Iterable[str] | None = None, exclude: Iterable[str] | None = None,
+               predicates: Iterable[Predicate] | None = None, cancel_event=None,
+               stats: ScanStats | None = None, index: FsIndex | None = None, estimate=False,
+               top_n: int | None = None, rank_key: Callable[[ScanRecord], float] | None = None,
+               empty_dirs=None) -> Iterator[ScanRecord]:
+    """
+    在同一个遍历引擎上同时搜索多个根目录，合并产出结果
+    每个根目录是一个受所在设备并发限制的 job，不同设备上的根目录交替执行，不会因为顺序搜索而让设备空闲
+    重复和嵌套的根目录只搜索一次(见 distinct_roots)，硬链接在所有根目录中只统计一次，
+    每条结果的 scan_root 为其所属的根目录，规则匹配的是相对所属根目录的路径
+    参数与 scan 相同，总是在当前进程中搜索
+    :param roots: 搜索目录列表
+    """
+    stats = stats if stats is not None else ScanStats()
+    cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+    top = TopN(top_n, rank_key) if top_n is not None else None
+    include_spec = build_spec(include)
+    exclude_spec = build_spec(exclude)
+    records = queue.SimpleQueue()
+    seen = InodeSet()
+    jobs = []
+    try:
+        for root in distinct_roots(roots):
+            scanner = Scanner(include_spec, exclude_spec, records.put if top is None else top.offer, predicates,
+                              stats=stats, index=index, estimate=estimate, top=top, scan_root=root, seen=seen,
+                              empty_dirs=empty_dirs)
+            jobs.append(scanner.start(root, cancel_event))
+        yield from _planned(_drain(jobs, records), empty_dirs)
+    finally:
+        if not all(job.done_event.is_set() for job in jobs):
+            cancel_event.set()
+            deadline = time.perf_counter() + CANCEL_LATENCY_BUDGET
+            for job in jobs:
+                job.wait(max(0.0, deadline - time.perf_counter()))
+        if index is not None:
+            index.flush()
+        stats.finish()
+    if cancel_event.is_set():
+        return
+    if top is not None:
+        stats.top_discarded = top.discarded
+        yield from _planned(top.results(), empty_dirs)
+    if empty_dirs is not None:
+        yield from empty_dirs.records()
+    errors = [error for job in jobs for error in job.errors]
+    if len(errors) > 0:
+        raise errors[0]
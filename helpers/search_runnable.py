@@ -1,86 +1,98 @@
-import concurrent.futures
-import os
-import stat
-from enum import Enum
+from PySide6.QtCore import QRunnable
 
-from PySide6.QtCore import QRunnable, QThreadPool
-
-from exceptions.search_exception import SearchException
-from utils import dir_size, file_size_to_byte
-
-
-class MatchType(Enum):
-    MATCHED = 0  # 匹配
-    NOT_MATCHED = 1  # 不匹配
-    EXCLUDED = 2  # 被排除
-    PERMISSION_DENIED = 3  # 权限不足
+from helpers.duplicate_finder import find_duplicates
+from helpers.empty_dirs import EMPTY_NOW
+from helpers.hash_cache import HashCache
+from helpers.result_store import ResultStore
+from helpers.scan_stats import ScanStats
+from helpers.scanner import scan, scan_roots, size_predicate
+from helpers.tree_hasher import find_duplicate_trees
+from logger import logger
 
 
 class SearchRunnable(QRunnable):
-    # data_queue: 存储输出数据的队列
+    """在 Qt 线程池中消费 scan 生成器，把结果追加到 store 中，并把结果的行号放入 data_queue"""
+
+    # data_queue: 存储输出结果行号的队列
+    # include_rules / exclude_rules: 包含和排除规则列表
+    # root: 搜索目录，为列表时在同一个线程池中同时搜索多个目录
     # compare: 比较方法，小于 或 大于等于，用于比较文件大小，过滤文件
     # compare_size: 比较文件大小时的尺寸 若为 `大小不限` 则不用过滤文件大小
-    def __init__(self, cancel_evnet, data_queue, include_spec, exclude_spec, root, compare, compare_size):
+    # done_event: 搜索结束(包括出现异常)时设置的事件
+    # index: 持久化索引，为 None 时不使用索引
+    # estimate: 是否对匹配的目录使用抽样估算大小
+    # top_n: 只保留最大的 top_n 项结果，None 代表保留所有结果
+    # store: 保存结果的列式存储，为 None 时新建
+    # checkpoint: 检查点，为 None 时不保存检查点
+    # filter_predicate: 编译后的过滤表达式，为 None 时不过滤
+    # duplicates: 是否查找重复文件，为 True 时搜索结束后只输出匹配文件中的重复文件，并标记所属的重复组
+    # duplicate_trees: 是否查找重复目录树，为 True 时搜索结束后只输出匹配目录中最外层的重复子树，并标记所属的重复组
+    # empty_dirs: 空目录收集器(helpers.empty_dirs.EmptyDirTracker)，为 None 时不查找空目录
+    def __init__(self, cancel_evnet, data_queue, include_rules, exclude_rules, root, compare, compare_size,
+                 done_event=None, index=None, estimate=False, top_n=None, store=None, checkpoint=None,
+                 filter_predicate=None, duplicates=False, duplicate_trees=False, empty_dirs=None):
         super().__init__()
         self.cancel_event = cancel_evnet
         self.data_queue = data_queue
-        self.include_spec = include_spec
-        self.exclude_spec = exclude_spec
+        self.include_rules = include_rules
+        self.exclude_rules = exclude_rules
         self.root = root
-        self.compare = compare
-        self.src_compare_size = compare_size
-        self.skip_size_filter = compare_size == '不限大小'
-        self.compare_size = file_size_to_byte(compare_size) if not self.skip_size_filter else 0
-
-    def match(self, pth):
-        abs_path = os.path.join(self.root, pth)
-        try:
-            st = os.lstat(abs_path)
-            if bool(st.st_file_attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT):
-                # 若为特殊重解析点的话，就返回没有权限
-                # 重解析点: 文件系统中添加元数据和特殊行为的路径点，例如快捷方式等
-                matched = MatchType.PERMISSION_DENIED
-            elif self.exclude_spec is not None and self.exclude_spec.match_file(pth):
-                matched = MatchType.EXCLUDED
-            elif self.include_spec is not None:
-                matched = MatchType.MATCHED if self.include_spec.match_file(pth) else MatchType.NOT_MATCHED
-            else:
-                matched = MatchType.MATCHED
-            is_dir = os.path.isdir(abs_path)
-            if matched == MatchType.MATCHED:
-                size = dir_size(abs_path) if is_dir else os.path.getsize(abs_path)
-            else:
-                size = 0
-            return matched, pth, abs_path, is_dir, size
-        except:
-            raise SearchException(f'路径: {abs_path} \n搜索该路径时出现异常，这种情况通常是因为该文件或目录被系统保护了\n建议添加名称到排除列表')
-
-    def size_filter(self, match_tuple):
-        operator = '<' if self.compare == '小于' else '>='
-        return eval(f'{match_tuple[-1]} {operator} {self.compare_size}')
+        self.predicates = [size_predicate(compare, compare_size), filter_predicate]
+        self.done_event = done_event
+        self.index = index
+        self.estimate = estimate
+        self.top_n = top_n
+        self.store = store if store is not None else ResultStore()
+        self.checkpoint = checkpoint
+        self.duplicates = duplicates
+        self.duplicate_trees = duplicate_trees
+        self.empty_dirs = empty_dirs
+        self.stats = ScanStats()
 
     def run(self, /) -> None:
-        if self.cancel_event.is_set():
-            return
-        list_dir_result = os.listdir(self.root)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            fs = [executor.submit(self.match, pth) for pth in list_dir_result]
-            match_result = [future.result() for future in concurrent.futures.as_completed(fs)]
-        # 需要递归的数据: 与 spec 不匹配的目录
-        need_recursive = list(
-            filter(lambda match_tuple: match_tuple[0] == MatchType.NOT_MATCHED and match_tuple[-2], match_result))
-        match_result = [result[1:] for result in match_result if result[0] == MatchType.MATCHED]
-        if not self.skip_size_filter:
-            match_result = list(filter(self.size_filter, match_result))
-        for pth, abs_path, is_dir, size in match_result:
-            ext_name = os.path.splitext(abs_path)[-1].lower()
+        try:
             if self.cancel_event.is_set():
                 return
-            self.data_queue.put((self.root, pth, abs_path, is_dir, ext_name, size))
-        if len(need_recursive) > 0:
-            runnables = [
-                SearchRunnable(self.cancel_event, self.data_queue, self.include_spec, self.exclude_spec, match_tuple[2],
-                               self.compare, self.src_compare_size) for match_tuple in need_recursive]
-            pool = QThreadPool.globalInstance()
-            with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-                executor.map(pool.start, runnables)
+            if isinstance(self.root, list):
+                records = scan_roots(self.root, self.include_rules, self.exclude_rules, self.predicates,
+                                     self.cancel_event, self.stats, self.index, estimate=self.estimate,
+                                     top_n=self.top_n, empty_dirs=self.empty_dirs)
+            else:
+                records = scan(self.root, self.include_rules, self.exclude_rules, self.predicates,
+                               self.cancel_event, self.stats, self.index, estimate=self.estimate,
+                               top_n=self.top_n, checkpoint=self.checkpoint, empty_dirs=self.empty_dirs)
+            if self.duplicates or self.duplicate_trees:
+                self._output_duplicates(list(records))
+                return
+            for record in records:
+                self.data_queue.put(self.store.append(record))
+        finally:
+            logger.info(f"搜索统计 - {self.stats.summary()}")
+            if self.done_event is not None:
+                self.done_event.set()
+
+    def _output_duplicates(self, records):
+        """
+        在搜索结果中查找重复文件和重复目录树，按可释放的字节数从大到小输出各重复组
+        此时删除计划不是全部搜索结果，删除后为空的目录不再成立，只输出当前的空目录
+        """
+        for record in records:
+            if record.empty == EMPTY_NOW:
+                self.data_queue.put(self.store.append(record))
+        records = [record for record in records if not record.empty]
+        by_path = {record.abs_path: record for record in records}
+        # (重复组, 由路径构造搜索结果的函数)
+        groups = []
+        if self.duplicates:
+            groups.extend((group, by_path.__getitem__)
+                          for group in find_duplicates(records, self.cancel_event, self.stats))
+        if self.duplicate_trees:
+            tree_groups, hasher = find_duplicate_trees(records, self.cancel_event, self.stats,
+                                                       HashCache.get_instance())
+            # 匹配的目录使用搜索结果，匹配目录之下的子树由 hasher 构造
+            groups.extend((group, lambda pth: by_path.get(pth) or hasher.record(pth)) for group in tree_groups)
+        groups.sort(key=lambda item: -item[0].reclaimable)
+        for group, record_of in groups:
+            group_id = self.store.add_group(group)
+            for pth in group.paths:
+                self.data_queue.put(self.store.append(record_of(pth), group_id))
@@ -0,0 +1,118 @@
+"""
+文件大小统计
+- 表观大小: st_size
+- 占用空间: st_blocks * 512，稀疏文件和压缩文件的占用空间小于表观大小；没有 st_blocks 的系统(Windows)上等于表观大小
+- 硬链接: 同一个 (st_dev, st_ino) 只统计一次，重复出现的链接大小记为 0(与 du 相同)；
+  Windows 上 DirEntry.stat() 取自目录枚举，没有 inode 和链接数，需要去重时由 link_stat 再 lstat 一次
+"""
+import os
+import threading
+from array import array
+
+# 开放寻址表的初始容量和最大装载率
+_INITIAL_CAPACITY = 1024
+_MAX_LOAD = 0.5
+# 64 位乘法哈希的乘数
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+# DirEntry.stat() 的结果中没有 inode 和链接数的系统(Windows)
+_ENTRY_STAT_LACKS_LINKS = os.name == 'nt'
+
+
+class InodeSet:
+    """
+    已统计过的 inode 集合
+    每个设备一张开放寻址(线性探测)的哈希表，槽位保存在 array('Q') 中，每个 inode 约占 16 字节，
+    相比 Python 的 set[tuple] (每项 100 字节以上)可以容纳数千万个条目
+    只需要记录链接数大于 1 的文件，因此集合通常远小于文件总数
+    """
+
+    def __init__(self, record_links=False):
+        """
+        :param record_links: 是否记录计入了大小的硬链接，多进程搜索的子进程使用，由父进程跨分片再去重一次
+        """
+        self._lock = threading.Lock()
+        # 计入了大小的硬链接 (所属结果的路径, 设备号, inode, 表观大小, 占用空间)，不记录时为 None
+        self.links: list[tuple[str, int, int, int, int]] | None = [] if record_links else None
+        # key: 设备号  value: [槽位数组, 已使用的槽位数]
+        self._tables: dict[int, list] = {}
+        # inode 号为 0 的条目无法存入槽位(0 代表空槽位)，单独记录
+        self._zero_devices = set()
+
+    def __len__(self):
+        return sum(used for _, used in self._tables.values()) + len(self._zero_devices)
+
+    def add(self, dev, ino):
+        """
+        添加一个 inode
+        :return: 是否为新添加的 inode，已经存在时返回 False
+        """
+        with self._lock:
+            if ino == 0:
+                if dev in self._zero_devices:
+                    return False
+                self._zero_devices.add(dev)
+                return True
+            table = self._tables.get(dev)
+            if table is None:
+                table = self._tables[dev] = [array('Q', bytes(8 * _INITIAL_CAPACITY)), 0]
+            slots = table[0]
+            if not _insert(slots, ino):
+                return False
+            table[1] += 1
+            if table[1] > len(slots) * _MAX_LOAD:
+                table[0] = _grow(slots)
+            return True
+
+
+def _insert(slots, ino):
+    """线性探测插入，已存在时返回 False"""
+    mask = len(slots) - 1
+    i = ((ino * _HASH_MULTIPLIER) & _MASK64) >> 32 & mask
+    while True:
+        current = slots[i]
+        if current == 0:
+            slots[i] = ino
+            return True
+        if current == ino:
+            return False
+        i = (i + 1) & mask
+
+
+def _grow(slots):
+    new_slots = array('Q', bytes(16 * len(slots)))
+    for ino in slots:
+        if ino != 0:
+            _insert(new_slots, ino)
+    return new_slots
+
+
+def link_stat(entry, need_links=True):
+    """
+    获取文件条目的 stat 结果，用于 file_usage
+    Windows 上 DirEntry.stat() 的 st_ino 和 st_nlink 为 0，硬链接去重永远不会生效，
+    需要链接信息时对 DirEntry 再 lstat 一次，这会产生一次额外的系统调用；缓存条目和其他系统上直接返回 entry.stat()
+    :param need_links: 是否需要 inode 和链接数，例如传入了 InodeSet 时
+    :return: (stat 结果, 是否产生了额外的 stat 调用)
+    """
+    st = entry.stat(follow_symlinks=False)
+    if need_links and _ENTRY_STAT_LACKS_LINKS and st.st_ino == 0 and isinstance(entry, os.DirEntry):
+        return os.lstat(entry.path), True
+    return st, False
+
+
+def file_usage(st, seen: InodeSet | None = None, owner: str | None = None):
+    """
+    根据 stat 结果统计文件的大小
+    :param st: stat 结果，Windows 上需要去重时应通过 link_stat 获取
+    :param seen: 已统计的 inode 集合，为 None 时不对硬链接去重
+    :param owner: 文件大小计入的结果的路径，seen 记录硬链接时使用
+    :return: (表观大小, 占用空间, 是否为已统计过的硬链接)
+    """
+    if seen is not None and st.st_nlink > 1 and not seen.add(st.st_dev, st.st_ino):
+        return 0, 0, True
+    blocks = getattr(st, 'st_blocks', None)
+    allocated = st.st_size if blocks is None else blocks * 512
+    if seen is not None and seen.links is not None and st.st_nlink > 1:
+        seen.links.append((owner, st.st_dev, st.st_ino, st.st_size, allocated))
+    return st.st_size, allocated, False
@@ -0,0 +1,165 @@
+"""
+目录大小的抽样估算
+先广度优先列出子树中的前若干个目录，若整个子树都在预算之内则直接得到精确值；
+否则使用 Knuth 随机探测: 每次从根目录随机走到叶子目录，路径上每个目录的文件大小乘以沿途分支数之积，
+所有探测结果的平均值是子树大小的无偏估计，并根据样本方差给出 95% 置信区间
+每个子树最多列出 exact_dirs + probes * MAX_PROBE_DEPTH 个目录
+"""
+import math
+import os
+import random
+from collections import deque
+from typing import NamedTuple
+
+from helpers.scan_stats import ScanStats
+from helpers.size_accounting import file_usage
+from helpers.staleness import file_times
+
+# 尝试精确统计时最多列出的目录数
+DEFAULT_EXACT_DIRS = 64
+# 随机探测的次数
+DEFAULT_PROBES = 24
+# 单次探测的最大深度
+MAX_PROBE_DEPTH = 64
+# 95% 置信区间对应的正态分位数
+_Z_95 = 1.96
+
+
+class SizeEstimate(NamedTuple):
+    """子树大小的估算结果"""
+    size: int
+    allocated: int
+    # 95% 置信区间，精确值时上下限都等于 size
+    low: int
+    high: int
+    exact: bool
+    # 已列出的目录中最新的 mtime 和 atime，非精确值时只是子树中最新时间的下限
+    mtime: float = 0.0
+    atime: float = 0.0
+
+
+class _Listing(NamedTuple):
+    size: int
+    allocated: int
+    subdirs: list[str]
+    mtime: float
+    atime: float
+
+
+class SizeEstimator:
+    """估算一个子树的大小，列出的目录会被缓存，供精确统计和多次探测共享"""
+
+    def __init__(self, root_path, exact_dirs=DEFAULT_EXACT_DIRS, probes=DEFAULT_PROBES, cancel_event=None,
+                 stats: ScanStats | None = None):
+        self.root_path = root_path
+        self.exact_dirs = exact_dirs
+        self.probes = probes
+        self.cancel_event = cancel_event
+        self.stats = stats
+        # 以路径为种子，同一个目录的估算结果是可复现的
+        self.random = random.Random(root_path)
+        self._listings: dict[str, _Listing] = {}
+
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _list(self, dir_path):
+        listing = self._listings.get(dir_path)
+        if listing is not None:
+            return listing
+        size = 0
+        allocated = 0
+        files = 0
+        subdirs = []
+        newest_mtime = 0.0
+        newest_atime = 0.0
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        file_size, file_allocated, _ = file_usage(st)
+                        size += file_size
+                        allocated += file_allocated
+                        files += 1
+                        mtime, atime = file_times(st)
+                        newest_mtime = max(newest_mtime, mtime)
+                        newest_atime = max(newest_atime, atime)
+        except OSError:
+            # 无法访问的目录按空目录处理，估算本身就是近似值
+            pass
+        if self.stats is not None:
+            self.stats.add(sized_dirs=1, sized_files=files, sized_bytes=size, list_calls=1, stat_calls=files)
+        listing = self._listings[dir_path] = _Listing(size, allocated, subdirs, newest_mtime, newest_atime)
+        return listing
+
+    def _newest_times(self):
+        """已列出的目录中最新的 (mtime, atime)"""
+        return (max((listing.mtime for listing in self._listings.values()), default=0.0),
+                max((listing.atime for listing in self._listings.values()), default=0.0))
+
+    def _try_exact(self):
+        """广度优先列出子树，目录数不超过 exact_dirs 时返回精确结果，否则返回 None"""
+        queue = deque([self.root_path])
+        while len(queue) > 0:
+            if len(self._listings) >= self.exact_dirs or self._cancelled():
+                return None
+            queue.extend(self._list(queue.popleft()).subdirs)
+        size = sum(listing.size for listing in self._listings.values())
+        allocated = sum(listing.allocated for listing in self._listings.values())
+        return SizeEstimate(size, allocated, size, size, True, *self._newest_times())
+
+    def _probe(self):
+        """一次随机探测，返回 (表观大小估计, 占用空间估计)"""
+        weight = 1
+        size = 0
+        allocated = 0
+        dir_path = self.root_path
+        for _ in range(MAX_PROBE_DEPTH):
+            listing = self._list(dir_path)
+            size += weight * listing.size
+            allocated += weight * listing.allocated
+            if len(listing.subdirs) == 0 or self._cancelled():
+                break
+            weight *= len(listing.subdirs)
+            dir_path = self.random.choice(listing.subdirs)
+        return size, allocated
+
+    def estimate(self) -> SizeEstimate:
+        exact = self._try_exact()
+        if exact is not None:
+            return exact
+        samples = []
+        for _ in range(self.probes):
+            if self._cancelled():
+                break
+            samples.append(self._probe())
+        # 已经列出的目录的大小之和是真实大小的下限
+        known = sum(listing.size for listing in self._listings.values())
+        known_allocated = sum(listing.allocated for listing in self._listings.values())
+        times = self._newest_times()
+        if len(samples) == 0:
+            return SizeEstimate(known, known_allocated, known, known, False, *times)
+        n = len(samples)
+        mean = sum(sample[0] for sample in samples) / n
+        mean_allocated = sum(sample[1] for sample in samples) / n
+        variance = sum((sample[0] - mean) ** 2 for sample in samples) / (n - 1) if n > 1 else mean ** 2
+        error = _Z_95 * math.sqrt(variance / n)
+        size = max(known, round(mean))
+        return SizeEstimate(size, max(known_allocated, round(mean_allocated)), max(known, round(mean - error)),
+                            max(size, round(mean + error)), False, *times)
+
+
+def estimate_subtree(root_path, exact_dirs=DEFAULT_EXACT_DIRS, probes=DEFAULT_PROBES, cancel_event=None,
+                     stats: ScanStats | None = None) -> SizeEstimate:
+    """
+    估算目录大小
+    :param root_path: 目录路径
+    :param exact_dirs: 目录数不超过该值的子树直接精确统计
+    :param probes: 随机探测次数
+    :param cancel_event: 取消事件
+    :param stats: 统计信息
+    """
+    return SizeEstimator(root_path, exact_dirs, probes, cancel_event, stats).estimate()
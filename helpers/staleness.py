@@ -0,0 +1,50 @@
+"""
+闲置程度
+最适合清理的是很久没有人修改或读取过的大目录
+搜索在统计大小的同一次 stat 中汇总子树中所有文件最新的 mtime 和 atime，不产生额外的系统调用;
+结果最后一次被使用的时间为两者中较新的一个，闲置时间为现在与该时间之差
+时间为 0 代表未知(例如旧的 listdir 搜索方式或空目录)
+注意: 以 relatime/noatime 挂载的文件系统上 atime 可能滞后或不更新，此时闲置时间只反映修改时间
+"""
+import time
+from typing import Callable
+
+# 闲置分数的时间单位(秒)，分数为 表观大小 × 闲置天数
+SECONDS_PER_DAY = 24 * 3600
+
+
+def file_times(st) -> tuple[float, float]:
+    """stat 结果中的 (mtime, atime)，缺少字段时为 0"""
+    return getattr(st, 'st_mtime', 0.0), getattr(st, 'st_atime', 0.0)
+
+
+def last_used(mtime, atime) -> float:
+    """最后一次被修改或读取的时间，未知时为 0"""
+    return max(mtime, atime)
+
+
+def age_seconds(mtime, atime, now=None) -> float | None:
+    """
+    闲置时间(秒)
+    :param now: 当前时间，默认为 time.time()
+    :return: 闲置时间，时间未知时返回 None
+    """
+    last = last_used(mtime, atime)
+    if last <= 0:
+        return None
+    return max(0.0, (now if now is not None else time.time()) - last)
+
+
+def staleness_score(size, mtime, atime, now=None) -> float:
+    """闲置分数: 表观大小 × 闲置天数，越大越值得清理；时间未知时为 0"""
+    age = age_seconds(mtime, atime, now)
+    return 0.0 if age is None else size * age / SECONDS_PER_DAY
+
+
+def staleness_key(now=None) -> Callable:
+    """
+    按闲置分数排序结果的排序键，可以作为 scan 的 rank_key
+    :param now: 计算闲置时间的基准时间，默认为调用时的时间，同一次排序中保持不变
+    """
+    now = now if now is not None else time.time()
+    return lambda record: staleness_score(record.size, record.mtime, record.atime, now)
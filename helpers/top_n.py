@@ -0,0 +1,73 @@
+"""
+只保留最大的 N 条搜索结果
+大多数清理只关心最大的几十到几百个匹配项，使用有界的最小堆保存候选结果，
+内存和界面开销与目录树的规模无关
+"""
+import heapq
+import itertools
+import threading
+from typing import Callable
+
+
+class TopN:
+    """
+    线程安全的有界最小堆，默认按表观大小保留最大的 n 条结果
+    堆满后 floor 为堆中最小的大小，不大于 floor 的候选结果不可能进入堆，可以在构造结果之前丢弃
+    """
+
+    def __init__(self, n: int, key: Callable | None = None):
+        """
+        :param n: 保留的结果数，必须大于 0
+        :param key: 结果的排序键，例如 helpers.staleness.staleness_key 的返回值，None 代表按表观大小;
+                    指定排序键时无法在构造结果之前判断，can_enter 总是返回 True
+        """
+        if n <= 0:
+            raise ValueError(f'n 必须大于 0: {n}')
+        self.n = n
+        self.key = key
+        self._lock = threading.Lock()
+        # 堆中的元素: (大小, 序号, 结果)，序号保证大小相同时按先到先得比较，不比较结果本身
+        self._heap = []
+        self._counter = itertools.count()
+        # 堆满前为 -1，堆满后为堆中最小的排序键
+        self.floor = -1
+        # 被丢弃或被挤出堆的结果数
+        self.discarded = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def can_enter(self, size) -> bool:
+        """大小为 size 的候选结果是否可能进入堆，不加锁，只用于提前丢弃"""
+        return self.key is not None or size > self.floor
+
+    def offer(self, record) -> bool:
+        """
+        提交一条结果
+        :return: 结果是否进入了堆
+        """
+        value = record.size if self.key is None else self.key(record)
+        with self._lock:
+            item = (value, next(self._counter), record)
+            if len(self._heap) < self.n:
+                heapq.heappush(self._heap, item)
+                if len(self._heap) == self.n:
+                    self.floor = self._heap[0][0]
+                return True
+            if value <= self.floor:
+                self.discarded += 1
+                return False
+            heapq.heapreplace(self._heap, item)
+            self.floor = self._heap[0][0]
+            self.discarded += 1
+            return True
+
+    def discard(self):
+        """记录一条在构造之前就被丢弃的候选结果"""
+        with self._lock:
+            self.discarded += 1
+
+    def results(self):
+        """按排序键从大到小返回堆中的结果"""
+        with self._lock:
+            return [item[2] for item in sorted(self._heap, key=lambda item: (-item[0], item[1]))]
@@ -0,0 +1,283 @@
+import os
+import random
+import threading
+from collections import deque
+
+from helpers.cancellation import CancelEvent
+from helpers.io_scheduler import IoScheduler
+
+_SLOT_FREE = 0
+_SLOT_ACQUIRED = 1
+_SLOT_DEFERRED = 2
+
+
+class TraversalJob:
+    """
+    一次遍历任务
+    同一个 TraversalEngine 上可以同时运行多个 job，每个 job 拥有自己的计数、取消事件和异常列表
+    """
+
+    def __init__(self, cancel_event: threading.Event | None = None, device: int | None = None):
+        self.cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+        # job 所在的设备号(st_dev)，引擎按设备限制并发，None 代表不限制
+        self.device = device
+        self.done_event = threading.Event()
+        # 已提交但尚未执行完成的任务数
+        self._pending = 0
+        self._lock = threading.Lock()
+        # 任务中抛出的异常，按发生顺序保存
+        self.errors: list[Exception] = []
+        # 已执行完成的任务数
+        self.finished_count = 0
+        # job 完成时的回调
+        self._done_callbacks = []
+        # 暂停中的 job 的任务不会执行，工作线程取出后暂存在 _parked 中，恢复后再放回注入队列
+        self._paused = False
+        self._parked = deque()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        等待 job 中所有任务执行完成
+        :param timeout: 超时时间(秒)，None 代表一直等待
+        :return: 是否已完成
+        """
+        return self.done_event.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """
+        添加 job 完成时的回调，回调的参数为 job，在完成最后一个任务的线程中调用
+        job 已经完成时立即在当前线程中调用
+        """
+        with self._lock:
+            if not self.done_event.is_set():
+                self._done_callbacks.append(fn)
+                return
+        fn(self)
+
+    def _add_pending(self):
+        with self._lock:
+            self._pending += 1
+
+    def _task_done(self):
+        with self._lock:
+            self._pending -= 1
+            self.finished_count += 1
+            done = self._pending == 0
+            if done:
+                self.done_event.set()
+                callbacks, self._done_callbacks = self._done_callbacks, []
+        if done:
+            for fn in callbacks:
+                fn(self)
+
+
+class TraversalEngine:
+    """
+    工作窃取式的遍历引擎
+    引擎持有固定数量的工作线程，每个线程拥有自己的双端队列:
+    - 线程自己产生的子任务压入自己队列的右端，并从右端取出(深度优先，局部性好)
+    - 自己的队列为空时，从其他线程队列的左端窃取任务(窃取的通常是更靠近根的大任务)
+    - 非工作线程提交的任务放入公共注入队列
+    任务的单位通常是一个目录
+    设置了设备号的 job 受 IoScheduler 的并发限制: 设备上运行中的任务达到限制时，新取出的任务进入该设备的等待队列，
+    该设备上的任务完成后再放回注入队列，因此多个设备上的 job 可以并行执行而不会使某个设备过载
+    """
+
+    instance = None
+
+    def __init__(self, worker_count: int | None = None):
+        self.worker_count = max(1, worker_count or os.cpu_count() or 1)
+        self._deques = [deque() for _ in range(self.worker_count)]
+        # 外部线程提交任务的注入队列
+        self._inject = deque()
+        self._cond = threading.Condition()
+        # 正在等待任务的线程数量
+        self._sleepers = 0
+        self._local = threading.local()
+        self.io_scheduler = IoScheduler.get_instance()
+        self._device_lock = threading.Lock()
+        # key: 设备号  value: 运行中的任务数
+        self._device_running: dict[int, int] = {}
+        # key: 设备号  value: 因达到并发限制而等待的任务
+        self._device_deferred: dict[int, deque] = {}
+        self._threads = []
+        for i in range(self.worker_count):
+            t = threading.Thread(target=self._worker, args=(i,), name=f'TraversalWorker-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @staticmethod
+    def get_instance():
+        if TraversalEngine.instance is None:
+            TraversalEngine.instance = TraversalEngine()
+        return TraversalEngine.instance
+
+    def submit(self, job: TraversalJob, fn, *args):
+        """
+        向 job 中提交一个任务
+        在工作线程中调用时任务进入当前线程的队列，否则进入注入队列
+        :param job: 任务所属的 job
+        :param fn: 任务函数，调用方式为 fn(job, *args)
+        :param args: 任务函数的参数
+        """
+        job._add_pending()
+        task = (job, fn, args)
+        idx = getattr(self._local, 'idx', None)
+        if idx is None:
+            self._inject.append(task)
+        else:
+            self._deques[idx].append(task)
+        if self._sleepers > 0:
+            with self._cond:
+                self._cond.notify()
+
+    def start(self, fn, args_list, cancel_event: threading.Event | None = None,
+              device: int | None = None) -> TraversalJob:
+        """
+        创建一个 job 并提交初始任务
+        :param fn: 任务函数，调用方式为 fn(job, *args)
+        :param args_list: 每个初始任务的参数元组列表
+        :param cancel_event: 取消事件
+        :param device: job 所在的设备号，用于按设备限制并发，可通过 IoScheduler.device_of 获取
+        :return: 创建的 job
+        """
+        job = TraversalJob(cancel_event, device)
+        # 占位计数，防止初始任务提交过程中 job 被提前判定为完成
+        job._add_pending()
+        for args in args_list:
+            self.submit(job, fn, *args)
+        job._task_done()
+        return job
+
+    def pause(self, job: TraversalJob):
+        """
+        暂停 job，用于消费者跟不上时的背压
+        暂停不会阻塞工作线程: 正在执行的任务照常完成，之后取出的该 job 的任务被暂存，工作线程继续执行其他 job 的任务
+        已取消的 job 的任务不再被暂存，取消前已暂存的任务需要调用 resume 放回，放回后被直接丢弃
+        """
+        with job._lock:
+            job._paused = True
+
+    def resume(self, job: TraversalJob):
+        """恢复暂停的 job，把暂存的任务放回注入队列"""
+        with job._lock:
+            job._paused = False
+            tasks = list(job._parked)
+            job._parked.clear()
+        if len(tasks) > 0:
+            self._inject.extend(tasks)
+            if self._sleepers > 0:
+                with self._cond:
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _park(task):
+        """
+        暂存暂停中的 job 的任务
+        :return: 任务是否已被暂存
+        """
+        job = task[0]
+        if not job._paused or job.cancel_event.is_set():
+            return False
+        with job._lock:
+            if not job._paused:
+                return False
+            job._parked.append(task)
+        return True
+
+    def _steal(self, idx):
+        n = self.worker_count
+        offset = random.randrange(n)
+        for i in range(n):
+            victim = (offset + i) % n
+            if victim == idx:
+                continue
+            try:
+                return self._deques[victim].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _next_task(self, idx):
+        try:
+            return self._deques[idx].pop()
+        except IndexError:
+            pass
+        try:
+            return self._inject.popleft()
+        except IndexError:
+            pass
+        return self._steal(idx)
+
+    def _acquire_device(self, task):
+        """
+        为任务占用设备的并发槽位
+        :return: _SLOT_FREE 不需要槽位；_SLOT_ACQUIRED 已占用槽位，执行后需要释放；_SLOT_DEFERRED 任务已进入设备的等待队列
+        """
+        dev = task[0].device
+        limit = self.io_scheduler.limit(dev)
+        # 已取消的 job 的任务不会执行，不占用槽位，避免在等待队列中逐个排队
+        if limit is None or task[0].cancel_event.is_set():
+            return _SLOT_FREE
+        with self._device_lock:
+            running = self._device_running.get(dev, 0)
+            if running >= limit:
+                self._device_deferred.setdefault(dev, deque()).append(task)
+                return _SLOT_DEFERRED
+            self._device_running[dev] = running + 1
+        return _SLOT_ACQUIRED
+
+    def _release_device(self, task):
+        """
+        释放任务占用的设备槽位，并把该设备上的一个等待任务放回注入队列
+        已取消的 job 的等待任务全部放回，它们不占用槽位，之后不会再触发释放
+        """
+        dev = task[0].device
+        next_tasks = []
+        with self._device_lock:
+            self._device_running[dev] -= 1
+            deferred = self._device_deferred.get(dev)
+            while deferred:
+                next_task = deferred.popleft()
+                next_tasks.append(next_task)
+                if not next_task[0].cancel_event.is_set():
+                    break
+        if len(next_tasks) > 0:
+            self._inject.extend(next_tasks)
+            if self._sleepers > 0:
+                with self._cond:
+                    self._cond.notify_all()
+
+    def _has_task(self):
+        return len(self._inject) > 0 or any(len(d) > 0 for d in self._deques)
+
+    def _worker(self, idx):
+        self._local.idx = idx
+        while True:
+            task = self._next_task(idx)
+            if task is None:
+                with self._cond:
+                    self._sleepers += 1
+                    if not self._has_task():
+                        self._cond.wait(0.1)
+                    self._sleepers -= 1
+                continue
+            if self._park(task):
+                continue
+            slot = self._acquire_device(task)
+            if slot == _SLOT_DEFERRED:
+                continue
+            job, fn, args = task
+            try:
+                # 已取消的 job 直接丢弃剩余任务
+                if not job.cancel_event.is_set():
+                    fn(job, *args)
+            except Exception as e:
+                job.errors.append(e)
+            finally:
+                if slot == _SLOT_ACQUIRED:
+                    self._release_device(task)
+                job._task_done()
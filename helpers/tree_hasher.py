@@ -0,0 +1,247 @@
+"""
+重复目录树查找
+文件级的重复文件粒度太细，整份相同的 node_modules 或 SDK 目录应该作为一个整体清理
+每个目录的哈希(Merkle 哈希)由其所有子条目的名称、类型和哈希自底向上计算，子树完全相同的目录哈希相同，分两个阶段计算:
+1. 结构哈希: 文件的哈希只使用文件大小，只需要列目录和 stat，不读取文件内容
+2. 内容哈希: 只对结构哈希与其他目录相同的目录计算，文件的哈希为完整内容的哈希，
+   以 (设备号, inode, mtime, 大小) 缓存在 HashCache 中，未变化的文件再次比较时不需要重新读取
+结果只报告最外层的相同子树: 所在目录也整体重复的目录不再单独报告
+注意: 可释放的字节数按表观大小计算，子树中的文件与其他位置共享硬链接时实际释放的空间更少
+"""
+import hashlib
+import os
+import threading
+from typing import Callable, Iterable
+
+from helpers.cancellation import CancelEvent
+from helpers.duplicate_finder import DuplicateGroup, full_digest, run_per_device
+from helpers.hash_cache import HashCache
+from helpers.scan_stats import ScanStats
+from helpers.scanner import ScanRecord
+from helpers.size_accounting import file_usage
+from helpers.staleness import file_times
+
+# 目录的哈希和用量 (哈希, 表观大小, 占用空间, 最新的 mtime, 最新的 atime)
+# 计算失败(例如没有权限)的子树为 None，不与任何子树相同
+_Usage = tuple
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+class TreeHasher:
+    """在一批目录中查找内容完全相同的子树，见模块说明"""
+
+    def __init__(self, cancel_event=None, stats: ScanStats | None = None, cache: HashCache | None = None,
+                 min_size=1):
+        """
+        :param cancel_event: 取消事件
+        :param stats: 统计信息
+        :param cache: 文件内容哈希缓存，为 None 时不使用缓存
+        :param min_size: 参与比较的最小子树表观大小，默认跳过空目录树
+        """
+        self.cancel_event = cancel_event if cancel_event is not None else CancelEvent()
+        self.stats = stats if stats is not None else ScanStats()
+        self._lock = threading.Lock()
+        self.cache = cache
+        self.min_size = min_size
+        # 已计算的目录  key: 目录路径  value: _Usage，计算失败时为 None
+        self.usage: dict[str, _Usage | None] = {}
+        # 目录所属的搜索根目录，用于构造结果
+        self._scan_roots: dict[str, str] = {}
+
+    def _walk(self, root, file_digest: Callable[[str, os.stat_result], bytes | None]) -> dict[str, _Usage | None]:
+        """
+        自底向上计算 root 子树中每个目录的哈希，使用显式栈，不受递归深度限制
+        :param file_digest: 计算文件哈希的函数，参数为路径和 lstat 结果，返回 None 代表无法计算
+        :return: 子树中每个目录的哈希和大小
+        """
+        results: dict[str, _Usage | None] = {}
+        # 栈中的每一项为 (目录路径, 子条目列表)，子条目列表为 None 代表还没有列出该目录
+        stack: list[tuple[str, list | None]] = [(root, None)]
+        dirs = 0
+        while len(stack) > 0:
+            if self.cancel_event.is_set():
+                return results
+            dir_path, children = stack[-1]
+            if children is None:
+                children = []
+                subdirs = []
+                try:
+                    with os.scandir(dir_path) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                children.append((entry.name, b'd', entry.path))
+                                subdirs.append(entry.path)
+                            elif entry.is_symlink():
+                                children.append((entry.name, b'l', (os.readlink(entry.path),
+                                                                    entry.stat(follow_symlinks=False))))
+                            else:
+                                children.append((entry.name, b'f', (entry.path, entry.stat(follow_symlinks=False))))
+                except OSError:
+                    stack.pop()
+                    results[dir_path] = None
+                    continue
+                stack[-1] = (dir_path, children)
+                # 子目录在栈中位于所在目录之上，所在目录再次位于栈顶时子目录已经全部计算完成
+                stack.extend((subdir, None) for subdir in subdirs)
+                continue
+            stack.pop()
+            dirs += 1
+            results[dir_path] = self._combine(children, results, file_digest)
+        self.stats.add(tree_dirs=dirs)
+        return results
+
+    @staticmethod
+    def _combine(children, results, file_digest) -> _Usage | None:
+        """由子条目计算目录的哈希，任何一个子条目无法计算时返回 None"""
+        h = _new_hash()
+        size = allocated = 0
+        mtime = atime = 0.0
+        # 名称在同一目录中唯一，按名称排序使哈希与列目录的顺序无关
+        for name, kind, value in sorted(children, key=lambda child: child[0]):
+            h.update(os.fsencode(name) + b'\0' + kind)
+            if kind == b'd':
+                usage = results.get(value)
+                if usage is None:
+                    return None
+                digest, sub_size, sub_allocated, sub_mtime, sub_atime = usage
+                size += sub_size
+                allocated += sub_allocated
+                mtime = max(mtime, sub_mtime)
+                atime = max(atime, sub_atime)
+            else:
+                if kind == b'l':
+                    # 符号链接比较链接目标
+                    target, st = value
+                    digest = os.fsencode(target)
+                else:
+                    pth, st = value
+                    digest = file_digest(pth, st)
+                    if digest is None:
+                        return None
+                file_size, file_allocated, _ = file_usage(st)
+                size += file_size
+                allocated += file_allocated
+                file_mtime, file_atime = file_times(st)
+                mtime = max(mtime, file_mtime)
+                atime = max(atime, file_atime)
+            h.update(len(digest).to_bytes(2, 'little') + digest)
+        return h.digest(), size, allocated, mtime, atime
+
+    @staticmethod
+    def _shape_digest(pth, st) -> bytes:
+        return st.st_size.to_bytes(8, 'little')
+
+    def _content_digest(self, pth, st) -> bytes | None:
+        if st.st_ino == 0:
+            # Windows 上 DirEntry 的 stat 结果没有 inode，缓存需要完整的 stat
+            try:
+                st = os.lstat(pth)
+            except OSError:
+                return None
+        if self.cache is not None:
+            digest = self.cache.get(st)
+            if digest is not None:
+                self.stats.add(tree_cache_hits=1)
+                return bytes.fromhex(digest)
+        try:
+            digest = full_digest(pth, self.cancel_event)
+        except (OSError, ValueError):
+            return None
+        if digest is None:
+            return None
+        self.stats.add(tree_hashed_files=1, tree_read_bytes=st.st_size)
+        if self.cache is not None:
+            self.cache.put(st, digest)
+        return bytes.fromhex(digest)
+
+    def _hash_tree(self, job, root, file_digest, results):
+        if job.is_cancelled():
+            return
+        usage = self._walk(root, file_digest)
+        with self._lock:
+            results.update(usage)
+
+    def _duplicated(self, usage: dict[str, _Usage | None]) -> dict[tuple[bytes, int], list[str]]:
+        """按 (哈希, 表观大小) 分组，只返回至少包含两个目录的组"""
+        groups: dict[tuple[bytes, int], list[str]] = {}
+        for pth, value in usage.items():
+            if value is not None and value[1] >= self.min_size:
+                groups.setdefault((value[0], value[1]), []).append(pth)
+        return {key: paths for key, paths in groups.items() if len(paths) >= 2}
+
+    def find(self, roots: Iterable[tuple[str, str]]) -> list[DuplicateGroup]:
+        """
+        查找重复的目录树
+        :param roots: (目录路径, 所在搜索根目录) 列表，目录之间不应互相包含
+        :return: 最外层的重复目录组，按可释放的字节数从大到小排序；取消时返回空列表
+        """
+        items = []
+        for root, scan_root in roots:
+            self._scan_roots[root] = scan_root
+            items.append((scan_root or root, root))
+
+        # 第 1 阶段: 结构哈希
+        shapes = {}
+        run_per_device(lambda job, root: self._hash_tree(job, root, self._shape_digest, shapes), items,
+                       self.cancel_event)
+        if self.cancel_event.is_set():
+            return []
+        candidates = set(pth for paths in self._duplicated(shapes).values() for pth in paths)
+        self.stats.add(tree_candidates=len(candidates))
+
+        # 第 2 阶段: 只对最外层的候选目录计算内容哈希，其下的目录在同一次遍历中得到哈希
+        tops = [pth for pth in candidates if os.path.dirname(pth) not in candidates]
+        run_per_device(lambda job, root: self._hash_tree(job, root, self._content_digest, self.usage),
+                       [(self._scan_root(pth) or pth, pth) for pth in tops], self.cancel_event)
+        if self.cancel_event.is_set():
+            return []
+
+        duplicated = self._duplicated(self.usage)
+        duplicated_paths = set(pth for paths in duplicated.values() for pth in paths)
+        groups = []
+        for (digest, size), paths in duplicated.items():
+            # 所在目录也整体重复的目录随所在目录一起报告
+            paths = sorted(pth for pth in paths if os.path.dirname(pth) not in duplicated_paths)
+            if len(paths) >= 2:
+                groups.append(DuplicateGroup(size, digest.hex(), paths))
+        groups.sort(key=lambda group: (-group.reclaimable, group.paths[0]))
+        self.stats.add(tree_groups=len(groups), tree_reclaimable_bytes=sum(group.reclaimable for group in groups))
+        if self.cache is not None:
+            self.cache.flush()
+        return groups
+
+    def _scan_root(self, pth):
+        """目录所属的搜索根目录，用于按设备限制并发和构造结果"""
+        parent = pth
+        while parent not in self._scan_roots:
+            next_parent = os.path.dirname(parent)
+            if next_parent == parent:
+                return ''
+            parent = next_parent
+        return self._scan_roots[parent]
+
+    def record(self, pth) -> ScanRecord:
+        """构造已计算目录的搜索结果"""
+        _, size, allocated, mtime, atime = self.usage[pth]
+        return ScanRecord(os.path.dirname(pth), os.path.basename(pth), pth, True,
+                          os.path.splitext(pth)[-1].lower(), size, allocated,
+                          scan_root=self._scan_root(pth), mtime=mtime, atime=atime)
+
+
+def find_duplicate_trees(records: Iterable[ScanRecord], cancel_event=None, stats: ScanStats | None = None,
+                         cache: HashCache | None = None, min_size=1) -> tuple[list[DuplicateGroup], TreeHasher]:
+    """
+    在搜索结果的目录中查找重复的目录树，文件不参与比较
+    :param records: 搜索结果，例如 scan 的返回值
+    :param cancel_event: 取消事件
+    :param stats: 统计信息
+    :param cache: 文件内容哈希缓存，例如 HashCache.get_instance()
+    :param min_size: 参与比较的最小子树表观大小
+    :return: (重复目录组, TreeHasher)，组中的目录可以通过 TreeHasher.record 构造搜索结果
+    """
+    hasher = TreeHasher(cancel_event, stats, cache, min_size)
+    roots = [(record.abs_path, record.scan_root) for record in records if record.is_dir]
+    return hasher.find(roots), hasher
@@ -1,20 +1,30 @@
+import multiprocessing
 import os
 import sys
 import threading
 import traceback
-from queue import Queue
+from queue import Empty, Queue
 from typing import TypedDict
 
-import pathspec
 from PySide6.QtCore import Slot, Qt, QThreadPool, Signal, QTimer
-from PySide6.QtGui import QIcon
-from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QInputDialog, QMessageBox
+from PySide6.QtGui import QIcon, QAction
+from PySide6.QtWidgets import QApplication, QMainWindow, QFileDialog, QInputDialog, QMessageBox, QCheckBox, QSpinBox, \
+    QToolButton, QLineEdit, QComboBox
 
 from exceptions.delete_exception import DeleteException
+from exceptions.filter_exception import FilterException
 from exceptions.message_exception import MessageException, MessageType
 from exceptions.search_exception import SearchException
+from helpers.cancellation import CancelEvent, cancel_latency
 from helpers.delete_runnable import DeleteRunnable
+from helpers.empty_dirs import EmptyDirTracker
+from helpers.filter_expr import compile_filter
+from helpers.fs_index import FsIndex
+from helpers.inotify_watcher import InotifyWatcher
+from helpers.io_scheduler import IoScheduler
+from helpers.result_store import ResultStore
 from helpers.rule_manager import RuleManager, SavedData, RuleData
+from helpers.scan_checkpoint import ScanCheckpoint
 from helpers.search_runnable import SearchRunnable
 from helpers.unit_exception_handler import UnitExceptionHandler
 from uic.main_table_widget import Ui_MainWindow
@@ -31,12 +41,8 @@ class SearchMeta(TypedDict):
     # 是否在搜索业务中
     # 搜索业务: 包括搜索和建立表格的过程
     searching: bool
-    # 搜索文件是否结束，并不带表表格建立的过程结束
-    search_done: bool
-    # 等待搜索结果的线程
-    thread: threading.Thread | None
-    # 等待搜索结束的 QTimer，搜索结束后会进行表格加载
-    wait_for_search_done_timer: QTimer | None
+    # 搜索文件结束事件，并不代表表格建立的过程结束
+    done_event: threading.Event | None
     # 取消事件
     cancel_event: threading.Event | None
 
@@ -54,6 +60,8 @@ class DeleteMeta(TypedDict):
     wait_for_delete_done_timer: QTimer | None
     # 是否删除完成
     delete_done: bool
+    # 本次删除中失败的条目数
+    failed: int
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
@@ -77,9 +85,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 搜索相关属性
         self.search_meta: SearchMeta = {
             'searching': False,
-            'search_done': False,
-            'thread': None,
-            'wait_for_search_done_timer': None,
+            'done_event': None,
             'cancel_event': None
         }
 
@@ -91,7 +97,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             'progress_timer': None,
             'wait_for_delete_done_thread': None,
             'wait_for_delete_done_timer': None,
-            'delete_done': False
+            'delete_done': False,
+            'failed': 0
         }
 
         # 状态栏
@@ -107,6 +114,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionSave.setShortcut('Ctrl + S')
         self.actionSaveAs.setShortcut('Ctrl + Shift + S')
 
+        # 索引管理
+        self.actionInvalidateIndex = QAction('清空索引', self)
+        self.actionInvalidateIndex.setToolTip('清空持久化索引，下次搜索会重新读取所有目录')
+        self.actionInvalidateIndex.triggered.connect(self.on_invalidate_index)
+        self.actionCompactIndex = QAction('压缩索引', self)
+        self.actionCompactIndex.setToolTip('删除索引中已经不存在的目录并回收空间')
+        self.actionCompactIndex.triggered.connect(self.on_compact_index)
+        self.toolBar.insertAction(self.actionQuit, self.actionInvalidateIndex)
+        self.toolBar.insertAction(self.actionQuit, self.actionCompactIndex)
+        self.toolBar.insertSeparator(self.actionQuit)
+
         # 规则选择
         RuleManager.get_instance().currentIdChanged.connect(self.update_rule_name_box_and_rule_list)
         self.ruleSpliter.setStretchFactor(0, 2)
@@ -117,6 +135,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # 目录选择
         self.selectDirButton.clicked.connect(self.on_select_dir)
+        self.addDirButton = QToolButton()
+        self.addDirButton.setText('+')
+        self.addDirButton.setToolTip('添加搜索目录，多个目录之间用 ; 分隔，在同一个线程池中同时搜索')
+        self.addDirButton.clicked.connect(self.on_add_dir)
+        self.horizontalLayout_4.addWidget(self.addDirButton)
 
         # 文件大小选择
         self.moreSizeButton.clicked.connect(self.on_more_size)
@@ -127,6 +150,58 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.searchCancelButton.clicked.connect(self.on_cancel_search)
         self.searchCancelButton.setVisible(False)
         self.searching_change.connect(self.on_searching_change)
+        self.useIndexCheckBox = QCheckBox('使用索引')
+        self.useIndexCheckBox.setToolTip('使用持久化索引，只重新读取修改时间变化的目录，重复搜索同一目录时更快')
+        self.horizontalLayout_3.insertWidget(0, self.useIndexCheckBox)
+        self.trustIndexCheckBox = QCheckBox('信任子树大小')
+        self.trustIndexCheckBox.setToolTip('匹配目录本身的修改时间未变化时直接使用索引中的子树大小，不再逐层校验子目录，速度最快\n'
+                                           '子目录中的变化不会被发现，需要先清空索引')
+        self.trustIndexCheckBox.setEnabled(False)
+        self.useIndexCheckBox.toggled.connect(self.trustIndexCheckBox.setEnabled)
+        self.horizontalLayout_3.insertWidget(1, self.trustIndexCheckBox)
+        self.watchCheckBox = QCheckBox('实时监视')
+        self.watchCheckBox.setToolTip('通过 inotify 实时维护搜索目录的索引，再次搜索该目录时几乎立即得到结果')
+        self.watchCheckBox.setVisible(InotifyWatcher.is_supported())
+        self.horizontalLayout_3.insertWidget(2, self.watchCheckBox)
+        self.estimateCheckBox = QCheckBox('估算大小')
+        self.estimateCheckBox.setToolTip('匹配的目录只抽样读取少量子目录来估算大小并给出 95% 置信区间，大目录树上快得多\n'
+                                         '可在结果中右键选择“精确统计大小”在后台统计精确值')
+        self.horizontalLayout_3.insertWidget(3, self.estimateCheckBox)
+        self.topNSpinBox = QSpinBox()
+        self.topNSpinBox.setRange(0, 100000)
+        self.topNSpinBox.setSingleStep(100)
+        self.topNSpinBox.setPrefix('最大 ')
+        self.topNSpinBox.setSuffix(' 项')
+        self.topNSpinBox.setSpecialValueText('全部结果')
+        self.topNSpinBox.setToolTip('只保留最大的 N 项结果，搜索期间内存和表格开销不随目录规模增长，搜索结束后一次性显示')
+        self.horizontalLayout_3.insertWidget(4, self.topNSpinBox)
+        self.checkpointCheckBox = QCheckBox('断点续搜')
+        self.checkpointCheckBox.setToolTip('搜索期间定期保存检查点，搜索被取消、关闭或崩溃后，'
+                                           '使用相同的目录和规则再次搜索时从检查点继续')
+        self.horizontalLayout_3.insertWidget(5, self.checkpointCheckBox)
+        self.duplicateCheckBox = QCheckBox('查找重复文件')
+        self.duplicateCheckBox.setToolTip('在匹配的文件中查找内容相同的文件，搜索结束后按重复组显示\n'
+                                          '先按大小分组，再比较头尾样本哈希，最后只对仍然相同的文件计算完整哈希\n'
+                                          '可在结果中右键选择“每组保留一项，勾选其余重复项”')
+        self.horizontalLayout_3.insertWidget(6, self.duplicateCheckBox)
+        self.duplicateTreeCheckBox = QCheckBox('查找重复目录')
+        self.duplicateTreeCheckBox.setToolTip('在匹配的目录中查找内容完全相同的子树，例如多份相同的 node_modules，'
+                                              '搜索结束后按重复组显示最外层的相同目录\n'
+                                              '先比较目录结构和文件大小，只对结构相同的目录读取文件内容；'
+                                              '文件哈希按 inode 和修改时间缓存，重复搜索时更快')
+        self.horizontalLayout_3.insertWidget(7, self.duplicateTreeCheckBox)
+        self.emptyDirBox = QComboBox()
+        self.emptyDirBox.addItems(['不查找空目录', '列出空目录', '合并空目录'])
+        self.emptyDirBox.setToolTip('在同一次遍历中找出空目录，以及删除所有搜索结果后会变为空的目录\n'
+                                    '合并空目录: 只列出最外层的空目录，删除一次即可移除整个空目录骨架')
+        self.horizontalLayout_3.insertWidget(8, self.emptyDirBox)
+        self.filterEdit = QLineEdit()
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.setPlaceholderText('例如: size >= 100MB and ext in (.log, .tmp)')
+        self.filterEdit.setToolTip('在大小条件之外按表达式过滤结果，为空时不过滤\n'
+                                   '字段: size、allocated、depth、age(闲置时间，例如 90d)、type(file/dir)、ext\n'
+                                   '支持 and、or、not 和括号，例如 type == dir and age >= 180d and not size < 1GB')
+        self.formLayout_3.insertRow(4, '过滤条件', self.filterEdit)
 
         # 文件列表
         self.selectAllButton.clicked.connect(self.fileTable.select_all)
@@ -202,9 +277,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 记录删除异常到日志
         logger.error(f"删除异常 - 类型: {exctype.__name__}, 消息: {str(value)}")
 
-        if self.delete_meta['cancel_event'] is not None and not self.delete_meta['cancel_event'].is_set():
-            self.delete_meta['cancel_event'].set()
-        QMessageBox.critical(self, '删除异常', str(value))
+        # 一项删除失败不影响其余条目，同一次删除中只提示第一个失败的条目，其余的只记录日志
+        self.delete_meta['failed'] += 1
+        if self.delete_meta['failed'] == 1:
+            QMessageBox.critical(self, '删除异常', f'{value}\n\n其余条目将继续删除，删除失败的条目会保留在列表中。')
 
     # ==========================
 
@@ -307,6 +383,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.load_rule_dialog = LoadRuleDialog(self)
         self.load_rule_dialog.open()
 
+    @Slot()
+    def on_invalidate_index(self):
+        if self.search_meta['searching']:
+            QMessageBox.warning(self, '警告', '搜索中无法清空索引')
+            return
+        count = FsIndex.get_instance().invalidate()
+        logger.info(f"清空索引 - 删除目录数: {count}")
+        self.status.set_message(f'✅已清空索引，删除 {count} 个目录', 3000)
+
+    @Slot()
+    def on_compact_index(self):
+        if self.search_meta['searching']:
+            QMessageBox.warning(self, '警告', '搜索中无法压缩索引')
+            return
+        count = FsIndex.get_instance().compact()
+        logger.info(f"压缩索引 - 删除目录数: {count}")
+        self.status.set_message(f'✅已压缩索引，删除 {count} 个不存在的目录', 3000)
+
     # =================== 规则设置和管理
     @Slot()
     def update_rule_name_box_and_rule_list(self):
@@ -322,11 +416,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     @Slot()
     def on_select_dir(self):
-        dir_path = QFileDialog.getExistingDirectory(self, '选择目录',
-                                                    base_dir if self.dir_edit.text() == '' else self.dir_edit.text())
+        roots = self.get_search_roots()
+        dir_path = QFileDialog.getExistingDirectory(self, '选择目录', base_dir if len(roots) == 0 else roots[0])
         if dir_path != '':
             self.dir_edit.setText(dir_path)
 
+    @Slot()
+    def on_add_dir(self):
+        roots = self.get_search_roots()
+        dir_path = QFileDialog.getExistingDirectory(self, '添加目录', base_dir if len(roots) == 0 else roots[-1])
+        if dir_path != '' and dir_path not in roots:
+            self.dir_edit.setText(';'.join(roots + [dir_path]))
+
+    def get_search_roots(self):
+        """搜索目录列表，多个目录之间用 ; 分隔"""
+        return [pth.strip() for pth in self.dir_edit.text().split(';') if pth.strip() != '']
+
     @Slot()
     def on_more_size(self):
         self.custom_file_size_dialog = CustomFileSizeDialog(self)
@@ -360,59 +465,70 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     @Slot()
     def on_search(self):
-        dir_path = self.dir_edit.text()
-        if dir_path == '':
+        roots = self.get_search_roots()
+        if len(roots) == 0:
             logger.warning("用户尝试搜索但未选择目录")
             QMessageBox.warning(self, '警告', '请选择一个搜索目录')
             return
-        if not os.path.exists(dir_path):
-            logger.error(f"用户选择的搜索目录不存在: {dir_path}")
-            QMessageBox.critical(self, '错误', '目录不存在')
+        for root in roots:
+            if not os.path.exists(root):
+                logger.error(f"用户选择的搜索目录不存在: {root}")
+                QMessageBox.critical(self, '错误', f'目录不存在: {root}')
+                return
+        filter_text = self.filterEdit.text().strip()
+        try:
+            filter_predicate = compile_filter(filter_text) if filter_text != '' else None
+        except FilterException as e:
+            logger.warning(f"过滤条件有误: {e}")
+            QMessageBox.warning(self, '过滤条件有误', str(e))
             return
+        # 只有一个目录时保持原有的单目录搜索，支持实时监视和断点续搜
+        dir_path = roots[0] if len(roots) == 1 else roots
 
-        logger.info(f"开始搜索操作 - 目录: {dir_path}")
+        logger.info(f"开始搜索操作 - 目录: {'; '.join(roots)}")
         self.set_searching(True)
-        cancel_event = threading.Event()
+        cancel_event = CancelEvent()
         self.search_meta['cancel_event'] = cancel_event
+        self.fileTable.cancel_refine()
 
         include_rules, exclude_rules = self.get_current_rules()
-        include_spec = pathspec.PathSpec.from_lines('gitwildmatch', include_rules) if len(include_rules) > 0 else None
-        exclude_spec = pathspec.PathSpec.from_lines('gitwildmatch', exclude_rules) if len(exclude_rules) > 0 else None
-        
+
         logger.info(f"搜索参数 - 包含规则数: {len(include_rules)}, 排除规则数: {len(exclude_rules)}, "
-                   f"大小条件: {self.compareBox.currentText()} {self.sizeBox.currentText()}")
+                   f"大小条件: {self.compareBox.currentText()} {self.sizeBox.currentText()}, "
+                   f"过滤条件: {filter_text or '无'}")
 
         data_queue = Queue()
-        rab = SearchRunnable(cancel_event, data_queue, include_spec, exclude_spec, dir_path,
+        store = ResultStore()
+        done_event = threading.Event()
+        if self.watchCheckBox.isChecked() and InotifyWatcher.is_supported() and len(roots) == 1:
+            index = InotifyWatcher.get_instance(dir_path)
+        elif self.useIndexCheckBox.isChecked():
+            index = FsIndex.get_instance()
+            index.trust_subtree_sizes = self.trustIndexCheckBox.isChecked()
+        else:
+            index = None
+        empty_dir_mode = self.emptyDirBox.currentIndex()
+        empty_dirs = EmptyDirTracker(collapse=empty_dir_mode == 2) if empty_dir_mode > 0 else None
+        if self.checkpointCheckBox.isChecked() and len(roots) == 1:
+            checkpoint = ScanCheckpoint(dir_path, include_rules, exclude_rules,
+                                        [self.compareBox.currentText(), self.sizeBox.currentText(),
+                                         self.estimateCheckBox.isChecked(), self.topNSpinBox.value(), filter_text,
+                                         self.duplicateCheckBox.isChecked(), self.duplicateTreeCheckBox.isChecked(),
+                                         empty_dir_mode])
+        else:
+            checkpoint = None
+        rab = SearchRunnable(cancel_event, data_queue, include_rules, exclude_rules, dir_path,
                              self.compareBox.currentText(),
-                             self.sizeBox.currentText())
+                             self.sizeBox.currentText(),
+                             done_event, index, self.estimateCheckBox.isChecked(),
+                             self.topNSpinBox.value() or None, store, checkpoint, filter_predicate,
+                             self.duplicateCheckBox.isChecked(), self.duplicateTreeCheckBox.isChecked(), empty_dirs)
+        self.search_meta['done_event'] = done_event
         self.thread_pool.start(rab)
-
-        self.search_meta['search_done'] = False
         self.status.show_emoji_tip('搜索中')
 
-        def wait_for_done():
-            self.thread_pool.waitForDone(-1)
-            self.search_meta['search_done'] = True
-            self.status.show_emoji_tip('渲染搜索结果中')
-
-        self.search_meta['thread'] = threading.Thread(target=wait_for_done, daemon=True)
-        self.search_meta['thread'].start()
-
-        @Slot()
-        def wait_for_build_table():
-            if self.search_meta['search_done']:
-                # 构建表格
-                table_datas = []
-                while not data_queue.empty():
-                    table_datas.append(data_queue.get())
-                table_datas = sorted(table_datas, key=lambda x: x[2])
-                self.fileTable.load_table(cancel_event, table_datas)
-                self.search_meta['wait_for_search_done_timer'].stop()
-
-        self.search_meta['wait_for_search_done_timer'] = QTimer(interval=100)
-        self.search_meta['wait_for_search_done_timer'].timeout.connect(wait_for_build_table)
-        self.search_meta['wait_for_search_done_timer'].start()
+        # 边搜索边渲染结果
+        self.fileTable.stream_table(cancel_event, data_queue, done_event, store)
 
     @Slot(bool)
     def on_file_table_loaded(self, success):
@@ -442,7 +558,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         dir_count = sum(1 for _, is_dir in delete_datas if is_dir)
         logger.info(f"用户准备删除 - 文件数: {file_count}, 目录数: {dir_count}")
 
-        result = QMessageBox.question(self, '删除', '确定删除吗？',
+        message = '确定删除吗？'
+        fully_checked = self.fileTable.fully_checked_groups()
+        if len(fully_checked) > 0:
+            groups = ', '.join(f'#{group}' for group in fully_checked[:10]) + (' 等' if len(fully_checked) > 10 else '')
+            message = f'重复组 {groups} 的所有项都被勾选，删除后这些内容将不再保留任何一份。\n\n确定删除吗？'
+        unchecked = self.fileTable.unchecked_under_empty()
+        if unchecked > 0:
+            message = f'勾选的“删除后为空”目录中还有 {unchecked} 项搜索结果没有勾选，它们也会被一起删除。\n\n' + message
+        result = QMessageBox.question(self, '删除', message,
                                       QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                       QMessageBox.StandardButton.No)
         if result == QMessageBox.StandardButton.No:
@@ -457,29 +581,36 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if show_progress:
             self.status.start_progress('删除中', 0, total_step)
 
-        queue = Queue() if show_progress else None
-        self.delete_meta['cancel_event'] = threading.Event() if show_progress else None
-        for abs_path, is_dir in delete_datas:
-            rab = DeleteRunnable(abs_path, is_dir, queue, self.delete_meta['cancel_event'])
-            self.thread_pool.start(rab)
+        # 删除成功的路径通过 queue 返回，只移除表格中实际删除成功的行
+        queue = Queue()
+        deleted = []
+        self.delete_meta['failed'] = 0
+        self.delete_meta['cancel_event'] = CancelEvent() if show_progress else None
+        # 按设备分组，每个设备上的 runnable 数量不超过该设备的并发限制
+        for limit, items in IoScheduler.get_instance().group_by_device(delete_datas):
+            for _ in range(len(items) if limit is None else min(limit, len(items))):
+                rab = DeleteRunnable(items, queue, self.delete_meta['cancel_event'])
+                self.thread_pool.start(rab)
 
         current_step = 0
-        if show_progress:
-            def update_current_step():
-                nonlocal current_step
-                while current_step < total_step - 1:
-                    if self.delete_meta['cancel_event'].is_set():
+
+        def collect_deleted():
+            nonlocal current_step
+            while True:
+                try:
+                    deleted.append(queue.get(timeout=0.1))
+                except Empty:
+                    # 所有 runnable 结束后不会再有新的路径
+                    if self.delete_meta['delete_done']:
                         break
-                    try:
-                        queue.get(timeout=0.1)
-                    except:
-                        continue
-                    current_step += 1
+                    continue
+                current_step += 1
 
-            thread = threading.Thread(target=update_current_step, daemon=True)
-            thread.start()
-            self.delete_meta['progress_thread'] = thread
+        thread = threading.Thread(target=collect_deleted, daemon=True)
+        thread.start()
+        self.delete_meta['progress_thread'] = thread
 
+        if show_progress:
             @Slot()
             def update_progress():
                 if self.delete_meta['cancel_event'].is_set():
@@ -496,6 +627,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         def wait_for_done():
             self.thread_pool.waitForDone(-1)
+            latency = cancel_latency(self.delete_meta['cancel_event'])
+            if latency is not None:
+                logger.info(f"取消删除耗时 - {latency:.3f}s")
             self.delete_meta['delete_done'] = True
 
         thread = threading.Thread(target=wait_for_done, daemon=True)
@@ -505,15 +639,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         @Slot()
         def after_wait_for_done():
             nonlocal current_step
-            if self.delete_meta['delete_done']:
+            if self.delete_meta['delete_done'] and not self.delete_meta['progress_thread'].is_alive():
                 self.delete_meta['wait_for_delete_done_timer'].stop()
+                # 取消前已经删除的条目同样从表格中移除
+                self.fileTable.delete_checked(deleted)
+                failed = total_step - 1 - len(deleted)
                 if show_progress and self.delete_meta['cancel_event'].is_set():
                     self.status.progress.setValue(total_step)
                     QTimer.singleShot(0, lambda: self.status.set_message('❌取消删除', 3000))
+                elif failed > 0:
+                    if show_progress:
+                        self.status.progress.setValue(total_step)
+                    logger.warning(f"删除完成 - 成功: {len(deleted)}, 失败: {failed}")
+                    QTimer.singleShot(0, lambda: self.status.set_message(f'⚠️删除完成，{failed} 项删除失败', 3000))
                 else:
                     if show_progress:
                         current_step += 1
-                    self.fileTable.delete_checked()
                     QTimer.singleShot(0, lambda: self.status.set_message('✅删除完成', 3000))
                 self.set_deleting(False)
 
@@ -529,28 +670,32 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             cancel_event.set()
 
 
-# 初始化日志系统
-logger.set_output(LogOutput.BOTH)  # 同时输出到文件和终端
-logger.set_level(LogLevel.INFO)   # 设置日志级别为INFO
-logger.info("="*50)
-logger.info("TooMuchLeft 应用程序启动")
-logger.info("="*50)
+if __name__ == '__main__':
+    # 多进程搜索模式使用 spawn 启动子进程，子进程会重新导入主模块，启动代码必须放在这里
+    multiprocessing.freeze_support()
+
+    # 初始化日志系统
+    logger.set_output(LogOutput.BOTH)  # 同时输出到文件和终端
+    logger.set_level(LogLevel.INFO)   # 设置日志级别为INFO
+    logger.info("="*50)
+    logger.info("TooMuchLeft 应用程序启动")
+    logger.info("="*50)
 
-# 打包时应使用此代码，让用户授权管理员权限
-if not run_as_admin():
-    logger.error("用户取消授权或发生错误")
-    print("用户取消授权或发生错误")
-    sys.exit(1)
+    # 打包时应使用此代码，让用户授权管理员权限
+    if not run_as_admin():
+        logger.error("用户取消授权或发生错误")
+        print("用户取消授权或发生错误")
+        sys.exit(1)
 
-logger.info("管理员权限获取成功")
-app = QApplication(sys.argv)
-app.setWindowIcon(QIcon(os.path.join(base_dir, 'icon.ico')))
-logger.info("应用程序实例创建完成")
+    logger.info("管理员权限获取成功")
+    app = QApplication(sys.argv)
+    app.setWindowIcon(QIcon(os.path.join(base_dir, 'icon.ico')))
+    logger.info("应用程序实例创建完成")
 
-window = MainWindow()
-logger.info("主窗口创建完成")
-window.show()
-logger.info("主窗口显示")
+    window = MainWindow()
+    logger.info("主窗口创建完成")
+    window.show()
+    logger.info("主窗口显示")
 
-app.exec()
-logger.info("应用程序退出")
+    app.exec()
+    logger.info("应用程序退出")
@@ -0,0 +1,434 @@
+"""
+不依赖 Qt 的命令行入口，可以在没有显示器的服务器上执行清理
+
+    python -m toomuchleft scan ROOT [ROOT ...] [选项] > plan.jsonl   搜索并以 JSONL 或 CSV 流式输出结果
+    python -m toomuchleft scan ROOT --empty-dirs collapse > plan.jsonl 同时输出删除计划执行后最外层的空目录
+    python -m toomuchleft delete plan.jsonl                          预览删除计划(默认，等同于 --plan)
+    python -m toomuchleft delete plan.jsonl --apply                  执行删除计划
+    python -m toomuchleft duplicates ROOT [ROOT ...] [选项]          查找重复文件，以 JSONL 输出重复组
+    python -m toomuchleft duplicates ROOT --plan > plan.jsonl        每组保留一项，其余输出为删除计划
+    python -m toomuchleft duplicates ROOT --trees                    在匹配的目录中查找重复的目录树
+
+规则默认使用 rules.json 中当前使用的规则，与界面共享
+结果逐条写出，内存占用与结果数量无关(--top 除外，只保留 N 条)
+退出码: 0 成功  1 部分路径搜索或删除失败  2 参数、规则或计划错误  130 被中断
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+
+from exceptions.delete_exception import DeleteException
+from exceptions.filter_exception import FilterException
+from exceptions.search_exception import SearchException
+from helpers import async_api
+from helpers.cancellation import CancelEvent
+from helpers.duplicate_finder import find_duplicates
+from helpers.empty_dirs import EmptyDirTracker
+from helpers.filter_expr import compile_filter
+from helpers.hash_cache import HashCache
+from helpers.fs_index import FsIndex
+from helpers.rule_data import find_rule, load_rules
+from helpers.scan_stats import ScanStats
+from helpers.scanner import ScanRecord, scan, scan_roots, size_predicate
+from helpers.staleness import staleness_key
+from helpers.tree_hasher import find_duplicate_trees
+from logger import logger
+from utils import byte_size_to_str
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# 输出的字段，JSONL 的键和 CSV 的表头
+OUTPUT_FIELDS = ('abs_path', 'is_dir', 'size', 'allocated', 'ext_name', 'scan_root', 'estimated', 'size_low',
+                 'size_high', 'mtime', 'atime', 'empty')
+
+
+class UsageError(Exception):
+    """参数、规则或计划错误，退出码为 EXIT_USAGE"""
+
+
+def _resolve_rules(args):
+    """合并保存的规则和命令行中的规则"""
+    include = list(args.include or [])
+    exclude = list(args.exclude or [])
+    if args.rule is not None or (len(include) == 0 and len(exclude) == 0):
+        try:
+            data = load_rules(args.rules_file)
+        except (OSError, ValueError) as e:
+            raise UsageError(f'无法读取规则文件: {e}')
+        rule = find_rule(data, args.rule)
+        if rule is None:
+            raise UsageError(f'规则不存在: {args.rule}' if args.rule is not None
+                             else '没有当前使用的规则，请通过 --rule 指定规则或通过 --include 指定包含规则')
+        include = rule['include'] + include
+        exclude = rule['exclude'] + exclude
+    return include, exclude
+
+
+def _size_predicates(args):
+    predicates = []
+    try:
+        if args.min_size is not None:
+            predicates.append(size_predicate('大于等于', args.min_size.upper()))
+        if args.max_size is not None:
+            predicates.append(size_predicate('小于', args.max_size.upper()))
+        if args.filter is not None:
+            predicates.append(compile_filter(args.filter))
+    except FilterException as e:
+        raise UsageError(f'过滤条件有误: {e}')
+    except Exception as e:
+        raise UsageError(str(e))
+    return predicates
+
+
+def _open_index(args):
+    """根据 --index 和 --trust-index 获取持久化索引，都未指定时返回 None"""
+    if not args.index and not args.trust_index:
+        return None
+    index = FsIndex.get_instance()
+    index.trust_subtree_sizes = args.trust_index
+    return index
+
+
+class _RecordWriter:
+    """把结果逐条写到输出流中"""
+
+    def __init__(self, out, fmt):
+        self.out = out
+        self.fmt = fmt
+        if fmt == 'csv':
+            self._csv = csv.writer(out)
+            self._csv.writerow(OUTPUT_FIELDS)
+
+    def write(self, record: ScanRecord):
+        row = [getattr(record, field) for field in OUTPUT_FIELDS]
+        if self.fmt == 'csv':
+            self._csv.writerow(row)
+        else:
+            self.out.write(json.dumps(dict(zip(OUTPUT_FIELDS, row)), ensure_ascii=False) + '\n')
+
+
+def _check_roots(args):
+    for root in args.roots:
+        if not os.path.isdir(root):
+            raise UsageError(f'目录不存在: {root}')
+
+
+def cmd_scan(args):
+    _check_roots(args)
+    include, exclude = _resolve_rules(args)
+    predicates = _size_predicates(args)
+    if args.rank == 'stale' and args.top is None:
+        raise UsageError('--rank stale 需要与 --top 一起使用')
+    rank_key = staleness_key() if args.rank == 'stale' else None
+    empty_dirs = EmptyDirTracker(collapse=args.empty_dirs == 'collapse') if args.empty_dirs is not None else None
+    stats = ScanStats()
+    cancel_event = CancelEvent()
+    index = _open_index(args)
+    if len(args.roots) > 1:
+        records = scan_roots(args.roots, include, exclude, predicates, cancel_event, stats, index,
+                             estimate=args.estimate, top_n=args.top, rank_key=rank_key, empty_dirs=empty_dirs)
+    else:
+        records = scan(args.roots[0], include, exclude, predicates, cancel_event, stats, index,
+                       processes=args.processes, estimate=args.estimate, top_n=args.top, rank_key=rank_key,
+                       empty_dirs=empty_dirs)
+    writer = _RecordWriter(sys.stdout, args.format)
+    try:
+        for record in records:
+            writer.write(record)
+    except SearchException as e:
+        logger.error(str(e))
+        return EXIT_FAILED
+    except (KeyboardInterrupt, BrokenPipeError):
+        cancel_event.set()
+        records.close()
+        raise
+    finally:
+        logger.info(f'搜索统计 - {stats.summary()}')
+    return EXIT_OK
+
+
+def cmd_duplicates(args):
+    _check_roots(args)
+    include, exclude = _resolve_rules(args)
+    predicates = _size_predicates(args)
+    stats = ScanStats()
+    cancel_event = CancelEvent()
+    index = _open_index(args)
+    if len(args.roots) > 1:
+        records = scan_roots(args.roots, include, exclude, predicates, cancel_event, stats, index)
+    else:
+        records = scan(args.roots[0], include, exclude, predicates, cancel_event, stats, index,
+                       processes=args.processes)
+    try:
+        if args.trees:
+            groups, _ = find_duplicate_trees(records, cancel_event, stats,
+                                             None if args.no_cache else HashCache.get_instance())
+        else:
+            groups = find_duplicates(records, cancel_event, stats)
+        for group in groups:
+            if args.plan:
+                # 每组保留第一项，其余各项为 delete 可以读取的删除计划
+                for pth in group.paths[1:]:
+                    sys.stdout.write(json.dumps({'abs_path': pth, 'is_dir': args.trees, 'size': group.size},
+                                                ensure_ascii=False) + '\n')
+            else:
+                sys.stdout.write(json.dumps({'size': group.size, 'digest': group.digest, 'is_dir': args.trees,
+                                             'reclaimable': group.reclaimable, 'paths': group.paths},
+                                            ensure_ascii=False) + '\n')
+    except SearchException as e:
+        logger.error(str(e))
+        return EXIT_FAILED
+    except (KeyboardInterrupt, BrokenPipeError):
+        cancel_event.set()
+        records.close()
+        raise
+    finally:
+        logger.info(f'搜索统计 - {stats.summary()}')
+    return EXIT_OK
+
+
+def _read_plan(f):
+    """
+    逐行读取删除计划，每行为 scan 输出的一条 JSON(使用 abs_path、is_dir、size 和 empty)
+    :return: (路径, 是否目录, 大小, 空目录状态) 生成器
+    """
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if line == '':
+            continue
+        try:
+            item = json.loads(line)
+            pth = item['abs_path']
+            is_dir = bool(item['is_dir'])
+            size = int(item.get('size', 0))
+            empty = int(item.get('empty', 0))
+        except (ValueError, KeyError, TypeError):
+            raise UsageError(f'删除计划第 {line_no} 行格式错误: {line[:200]}')
+        if not isinstance(pth, str) or not os.path.isabs(pth):
+            raise UsageError(f'删除计划第 {line_no} 行不是绝对路径: {pth}')
+        yield pth, is_dir, size, empty
+
+
+def _emit(status, pth, **extra):
+    sys.stdout.write(json.dumps({'status': status, 'path': pth, **extra}, ensure_ascii=False) + '\n')
+
+
+class _Plan:
+    """
+    删除计划中已读取的条目
+    空目录和删除后为空的目录会整个删除，删除前检查其中是否只剩计划中的条目，
+    计划生成后新增了条目的目录不会被删除，其中计划中的条目改为逐个删除
+    """
+
+    def __init__(self):
+        self.paths = set()
+        self.dirs = set()
+        self.empty_dirs = set()
+        # key: 空目录, value: 是否只包含计划中的条目，第一次用到时检查
+        self._verdicts: dict[str, bool] = {}
+
+    def add(self, pth, is_dir, empty):
+        pth = os.path.normpath(pth)
+        self.paths.add(pth)
+        if is_dir:
+            self.dirs.add(pth)
+            if empty:
+                self.empty_dirs.add(pth)
+
+    def deletable(self, dir_path):
+        """计划中的目录是否可以整个删除"""
+        dir_path = os.path.normpath(dir_path)
+        if dir_path not in self.empty_dirs:
+            return True
+        if dir_path not in self._verdicts:
+            self._verdicts[dir_path] = self._only_planned(dir_path)
+        return self._verdicts[dir_path]
+
+    def _only_planned(self, dir_path):
+        """目录中是否只有计划中的条目(不在计划中的子目录中也只有计划中的条目)，无法读取时返回 False"""
+        stack = [dir_path]
+        try:
+            while len(stack) > 0:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if os.path.normpath(entry.path) in self.paths:
+                            continue
+                        if not entry.is_dir(follow_symlinks=False):
+                            return False
+                        stack.append(entry.path)
+        except OSError:
+            return False
+        return True
+
+    def covered(self, pth):
+        """pth 是否位于会被整个删除的计划目录之下，例如合并后的空目录中的结果，随该目录一次删除"""
+        pth = os.path.normpath(pth)
+        parent = os.path.dirname(pth)
+        while parent != pth:
+            if parent in self.dirs and self.deletable(parent):
+                return True
+            pth, parent = parent, os.path.dirname(parent)
+        return False
+
+
+def cmd_delete(args):
+    if args.plan_file == '-':
+        plan_file = sys.stdin
+    else:
+        try:
+            plan_file = open(args.plan_file, 'r', encoding='utf-8')
+        except OSError as e:
+            raise UsageError(f'无法读取删除计划: {e}')
+    try:
+        plan = _Plan()
+        if plan_file is not sys.stdin:
+            # 执行前先完整校验计划文件，避免删除到一半才发现格式错误
+            for pth, is_dir, _, empty in _read_plan(plan_file):
+                plan.add(pth, is_dir, empty)
+            plan_file.seek(0)
+        if not args.apply:
+            return _preview_plan(plan_file, plan)
+        return _apply_plan(plan_file, args.jobs, plan)
+    finally:
+        if plan_file is not sys.stdin:
+            plan_file.close()
+
+
+_SKIPPED_ERROR = '目录中出现了计划之外的条目，不再整个删除'
+
+
+def _preview_plan(plan_file, plan: _Plan):
+    count = 0
+    total = 0
+    skipped = 0
+    for pth, is_dir, size, empty in _read_plan(plan_file):
+        plan.add(pth, is_dir, empty)
+        if plan.covered(pth):
+            # 随上级目录一起删除，大小计入总量
+            _emit('covered', pth, is_dir=is_dir, size=size)
+            total += size
+        elif not os.path.lexists(pth):
+            _emit('missing', pth, is_dir=is_dir)
+        elif not plan.deletable(pth):
+            _emit('skipped', pth, is_dir=is_dir, error=_SKIPPED_ERROR)
+            skipped += 1
+        else:
+            _emit('planned', pth, is_dir=is_dir, size=size)
+            count += 1
+            total += size
+    logger.info(f'删除计划: {count} 项, 共 {byte_size_to_str(total)}, 跳过 {skipped} 项，使用 --apply 执行删除')
+    return EXIT_OK
+
+
+def _apply_plan(plan_file, jobs, plan: _Plan):
+    failed = []
+    skipped = []
+    deleted = [0]
+
+    def _existing():
+        for pth, is_dir, _, empty in _read_plan(plan_file):
+            # 标准输入中的计划边读边删，空目录在所有结果之后输出，检查时其中的结果都已经读取
+            plan.add(pth, is_dir, empty)
+            if plan.covered(pth):
+                # 随计划中的上级目录一次删除，不再单独删除
+                _emit('covered', pth, is_dir=is_dir)
+            elif not os.path.lexists(pth):
+                # 已经不存在的条目(例如随上级目录一起被删除)直接跳过
+                _emit('missing', pth, is_dir=is_dir)
+            elif not plan.deletable(pth):
+                # 计划生成后目录中出现了新的条目，跳过该目录，其中计划中的条目已经逐个删除
+                skipped.append(pth)
+                _emit('skipped', pth, is_dir=is_dir, error=_SKIPPED_ERROR)
+            else:
+                yield pth, is_dir
+
+    def _on_deleted(pth):
+        deleted[0] += 1
+        _emit('deleted', pth)
+
+    def _on_error(e: DeleteException):
+        failed.append(e.pth)
+        _emit('failed', e.pth, error=str(e))
+
+    asyncio.run(async_api.delete(_existing(), jobs, _on_deleted, _on_error))
+    logger.info(f'删除完成: 成功 {deleted[0]} 项, 失败 {len(failed)} 项, 跳过 {len(skipped)} 项')
+    return EXIT_FAILED if len(failed) > 0 or len(skipped) > 0 else EXIT_OK
+
+
+def _add_scan_arguments(parser):
+    """scan 和 duplicates 共用的搜索参数"""
+    parser.add_argument('roots', nargs='+', help='搜索目录，多个目录在同一个线程池中同时搜索')
+    parser.add_argument('--rule', help='使用的规则名称或 id，默认为当前使用的规则')
+    parser.add_argument('--rules-file', help='规则文件，默认为程序目录下的 rules.json')
+    parser.add_argument('--include', action='append', help='追加的包含规则(gitwildmatch)，可以多次指定')
+    parser.add_argument('--exclude', action='append', help='追加的排除规则(gitwildmatch)，可以多次指定')
+    parser.add_argument('--min-size', help='只输出不小于该大小的结果，例如 100MB')
+    parser.add_argument('--max-size', help='只输出小于该大小的结果，例如 1GB')
+    parser.add_argument('--filter', help='过滤表达式，例如 "type == dir and age >= 180d and size >= 1GB"')
+    parser.add_argument('--index', action='store_true', help='使用持久化索引')
+    parser.add_argument('--trust-index', action='store_true',
+                        help='使用持久化索引，并且匹配目录的修改时间未变化时直接使用缓存的子树大小(不校验子目录，'
+                             '子目录中的变化需要先清空索引)')
+    parser.add_argument('--processes', action=argparse.BooleanOptionalAction, default=None,
+                        help='是否使用多进程搜索，默认自动选择')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m toomuchleft', description='TooMuchLeft 命令行清理工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scan_parser = subparsers.add_parser('scan', help='搜索并流式输出结果')
+    _add_scan_arguments(scan_parser)
+    scan_parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl', help='输出格式，默认为 jsonl')
+    scan_parser.add_argument('--top', type=int, help='只输出最大的 N 项')
+    scan_parser.add_argument('--rank', choices=('size', 'stale'), default='size',
+                             help='--top 的排序方式: size 按表观大小(默认)，stale 按闲置分数(表观大小 × 闲置天数)')
+    scan_parser.add_argument('--estimate', action='store_true', help='抽样估算匹配目录的大小')
+    scan_parser.add_argument('--empty-dirs', choices=('list', 'collapse'),
+                             help='在结果之后输出空目录和删除结果后为空的目录(empty 字段为 1 或 2): '
+                                  'list 输出每一个，collapse 只输出最外层的目录，delete 时其中的结果随之一次删除')
+    scan_parser.set_defaults(func=cmd_scan)
+
+    duplicates_parser = subparsers.add_parser('duplicates', help='在匹配的文件中查找重复文件或重复的目录树')
+    _add_scan_arguments(duplicates_parser)
+    duplicates_parser.add_argument('--trees', action='store_true',
+                                   help='在匹配的目录中查找内容完全相同的目录树(最外层)，而不是重复文件')
+    duplicates_parser.add_argument('--no-cache', action='store_true', help='--trees 时不使用文件内容哈希缓存')
+    duplicates_parser.add_argument('--plan', action='store_true',
+                                   help='每组保留路径排在最前的一项，其余各项输出为 delete 可以读取的删除计划')
+    duplicates_parser.set_defaults(func=cmd_duplicates)
+
+    delete_parser = subparsers.add_parser('delete', help='预览或执行删除计划')
+    delete_parser.add_argument('plan_file', help='scan 输出的 JSONL 文件，- 代表标准输入')
+    mode = delete_parser.add_mutually_exclusive_group()
+    mode.add_argument('--plan', dest='apply', action='store_false', help='只输出将被删除的条目(默认)')
+    mode.add_argument('--apply', dest='apply', action='store_true', help='执行删除')
+    delete_parser.add_argument('--jobs', type=int, default=async_api.DEFAULT_DELETE_CONCURRENCY,
+                               help='同时执行的最大删除数')
+    delete_parser.set_defaults(func=cmd_delete, apply=False)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except UsageError as e:
+        logger.error(str(e))
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # 下游(例如 head)提前关闭了管道，之后的输出全部丢弃
+        sys.stdout = open(os.devnull, 'w')
+        return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,8 @@ import os.path
 import re
 import sys
 
+from helpers.size_accounting import InodeSet, file_usage, link_stat
+
 units = ['B', 'KB', 'MB', 'GB', 'TB']
 
 regex = re.compile(r'(\d+)(B|KB|MB|GB|TB)')
@@ -25,14 +27,44 @@ def byte_size_to_str(byte_size):
     return f'{byte_size:.2f}{units[current_unit_idx]}'
 
 
+def age_to_str(seconds):
+    """闲置时间转换为字符串，None 代表未知"""
+    if seconds is None:
+        return '未知'
+    hours = seconds / 3600
+    if hours < 24:
+        return f'{int(hours)}小时'
+    days = hours / 24
+    if days < 60:
+        return f'{int(days)}天'
+    if days < 730:
+        return f'{int(days / 30)}个月'
+    return f'{days / 365:.1f}年'
+
+
 # 获取目录大小
-def dir_size(dir_path):
+def dir_size(dir_path, cancel_event=None):
+    """
+    迭代统计目录大小，不会受递归深度的限制，硬链接只统计一次
+    需要在遍历引擎之外并行统计时请使用 helpers.dir_sizer.SubtreeSizer
+    :param dir_path: 目录路径
+    :param cancel_event: 取消事件，取消后返回已统计到的大小
+    :return: 目录的表观大小
+    """
+    seen = InodeSet()
     current_size = 0
-    for entry in os.scandir(dir_path):
-        if entry.is_file():
-            current_size += os.path.getsize(entry.path)
-        else:
-            current_size += dir_size(entry.path)
+    stack = [dir_path]
+    while len(stack) > 0:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    current_size += file_usage(link_stat(entry)[0], seen)[0]
     return current_size
 
 
@@ -1,16 +1,32 @@
+import bisect
 import os
+import queue
 import subprocess
+import time
+from array import array
+from datetime import datetime
+from typing import Iterable
 
 from PySide6.QtCore import Slot, QTimer, Signal, Qt
 from PySide6.QtGui import QAction
 from PySide6.QtWidgets import QTableWidget, QHeaderView, QCheckBox, QTableWidgetItem, QMenu, QApplication, QStyle
 
-from utils import byte_size_to_str, file_size_to_byte
+from helpers.dir_sizer import start_subtree_size
+from helpers.empty_dirs import EMPTY_AFTER_DELETE, EMPTY_NOW
+from helpers.result_store import ResultStore
+from utils import age_to_str, byte_size_to_str, file_size_to_byte
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M') if timestamp > 0 else '未知'
 
 
 class FileTable(QTableWidget):
     # 表格加载完成，True 代表加载完成 False 代表取消
     loaded = Signal(bool)
+    # 估算目录的精确大小统计完成 (结果行号, 表观大小, 占用空间, 最新的 mtime, 最新的 atime)，从工作线程发送到主线程
+    # 大小可能超过 32 位整数的范围，使用 object 传递
+    size_refined = Signal(int, object, object, float, float)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -19,9 +35,25 @@ class FileTable(QTableWidget):
         self.first_batch_size = 1000
         self.batch_size = 3
         self.cellClicked.connect(self.on_cell_clicked)
+        self.size_refined.connect(self._on_size_refined)
+        # 正在后台精确统计大小的 job
+        self._refine_jobs = []
+
+        # 流式加载: 每帧从队列中取出结果并插入表格，单帧最多占用 frame_budget 秒
+        self.frame_budget = 0.012
+        self._stream_queue = None
+        self._stream_done_event = None
+        # 已取出但本帧未来得及插入的结果
+        self._stream_pending = []
+        # 每次插入表格的结果数，每插入一块检查一次单帧耗时
+        self.stream_chunk_size = 256
+        self.stream_timer = QTimer(interval=16)
+        self.stream_timer.timeout.connect(self._on_stream_timer)
         
-        # 存储原始数据用于排序
-        self.original_data = []
+        # 搜索结果，表格中的每一行对应其中的一个行号
+        self.store = ResultStore()
+        # 表格行对应的结果行号，始终与表格行的顺序一致
+        self.rows = array('I')
         # 当前列排序状态 (列索引, 排序顺序)
         self.sort_column = -1
         self.sort_order = Qt.AscendingOrder
@@ -69,11 +101,13 @@ class FileTable(QTableWidget):
             open_dir_action = QAction('打开文件夹', self)
             copy_action = QAction('复制路径', self)
             remove_action = QAction('移除选择项', self)
+            refine_action = QAction('精确统计大小', self)
+            keep_one_action = QAction('每组保留一项，勾选其余重复项', self)
 
             @Slot()
             def _open_file_dir():
                 pth = self.item(row_idx, 2).text()
-                if self.item(row_idx, 3).text() == '否':
+                if not self.store.is_dir(self.rows[row_idx]):
                     # 选中文件
                     subprocess.run(f'explorer /select,"{pth}"', shell=True)
                 else:
@@ -88,33 +122,88 @@ class FileTable(QTableWidget):
             def _remove_rows():
                 indices = [i.row() for i in self.selectedIndexes()]
                 if len(indices) > 0:
-                    indices = sorted(indices, reverse=True)
+                    indices = sorted(set(indices), reverse=True)
                     for i in indices:
                         self.removeRow(i)
+                        del self.rows[i]
+
+            @Slot()
+            def _refine_sizes():
+                rows = set(i.row() for i in self.selectedIndexes())
+                rows.add(row_idx)
+                for i in rows:
+                    if self.store.is_estimated(self.rows[i]):
+                        self._refine_size(self.rows[i])
 
             open_dir_action.triggered.connect(_open_file_dir)
             copy_action.triggered.connect(_copy_path)
             remove_action.triggered.connect(_remove_rows)
+            refine_action.triggered.connect(_refine_sizes)
+            keep_one_action.triggered.connect(self.check_duplicates)
             context.addAction(open_dir_action)
             context.addAction(copy_action)
             context.addAction(remove_action)
+            if any(self.store.is_estimated(row) for row in self.rows):
+                context.addAction(refine_action)
+            if self.store.has_groups():
+                context.addAction(keep_one_action)
             context.exec(e.globalPos())
 
-    def _build_table(self, table_datas):
-        for root, pth, abs_path, is_dir, ext_name, size in table_datas:
+    def _set_row(self, i, row):
+        record = self.store.row(row)
+        abs_path = os.path.normpath(record.abs_path)
+        checkbox = QCheckBox()
+        checkbox.setChecked(False)
+        self.setCellWidget(i, 0, checkbox)
+        self.setItem(i, 1, QTableWidgetItem(record.pth))
+        item = QTableWidgetItem(abs_path)
+        item.setToolTip(f'{abs_path}\n搜索目录: {record.scan_root}' if record.scan_root else abs_path)
+        self.setItem(i, 2, item)
+        if record.empty == EMPTY_NOW:
+            dir_item = QTableWidgetItem('空目录')
+            dir_item.setToolTip('子树中没有任何文件')
+        elif record.empty == EMPTY_AFTER_DELETE:
+            dir_item = QTableWidgetItem('删除后为空')
+            dir_item.setToolTip('子树中的文件全部属于搜索结果，删除该目录会同时删除其中的搜索结果')
+        else:
+            dir_item = QTableWidgetItem('是' if record.is_dir else '否')
+        self.setItem(i, 3, dir_item)
+        self.setItem(i, 4, QTableWidgetItem(record.ext_name))
+        if record.estimated:
+            # 估算值显示为 ≈大小 (95% 置信区间)
+            size_item = QTableWidgetItem(f'≈{byte_size_to_str(record.size)}')
+            size_item.setToolTip(f'估算值，95% 置信区间: '
+                                 f'{byte_size_to_str(record.size_low)} – {byte_size_to_str(record.size_high)}\n'
+                                 f'右键选择“精确统计大小”可在后台统计精确值')
+            self.setItem(i, 5, size_item)
+            self.setItem(i, 6, QTableWidgetItem(f'≈{byte_size_to_str(record.allocated)}'))
+        else:
+            self.setItem(i, 5, QTableWidgetItem(byte_size_to_str(record.size)))
+            self.setItem(i, 6, QTableWidgetItem(byte_size_to_str(record.allocated)))
+        age_item = QTableWidgetItem(age_to_str(self.store.age(row)))
+        if record.mtime > 0 or record.atime > 0:
+            age_item.setToolTip(f'最新修改: {_format_time(record.mtime)}\n最新访问: {_format_time(record.atime)}'
+                                + ('\n估算值，只包含抽样读取的目录' if record.estimated else ''))
+        self.setItem(i, 7, age_item)
+        score_item = QTableWidgetItem(f'{byte_size_to_str(self.store.staleness(row))}·天')
+        score_item.setToolTip('闲置分数: 表观大小 × 闲置天数，越大越值得清理')
+        self.setItem(i, 8, score_item)
+        group = self.store.group(row)
+        if group > 0:
+            info = self.store.group_info(group)
+            kind = '目录' if record.is_dir else '文件'
+            group_item = QTableWidgetItem(f'#{group}')
+            group_item.setToolTip(f'重复组 #{group}: {len(info.paths)} 个内容相同的{kind}，'
+                                  f'每个 {byte_size_to_str(info.size)}\n'
+                                  f'只保留一个可释放 {byte_size_to_str(info.reclaimable)}')
+            self.setItem(i, 9, group_item)
+            self.setColumnHidden(9, False)
+
+    def _build_table(self, rows):
+        for row in rows:
             i = self.rowCount()
             self.insertRow(i)
-            abs_path = os.path.normpath(abs_path)
-            checkbox = QCheckBox()
-            checkbox.setChecked(False)
-            self.setCellWidget(i, 0, checkbox)
-            self.setItem(i, 1, QTableWidgetItem(pth))
-            item = QTableWidgetItem(abs_path)
-            item.setToolTip(abs_path)
-            self.setItem(i, 2, item)
-            self.setItem(i, 3, QTableWidgetItem('是' if is_dir else '否'))
-            self.setItem(i, 4, QTableWidgetItem(ext_name))
-            self.setItem(i, 5, QTableWidgetItem(byte_size_to_str(size)))
+            self._set_row(i, row)
 
     def _build_next_batch(self, batch_idx, table_datas):
         if self.cancel_event.is_set():
@@ -142,15 +231,7 @@ class FileTable(QTableWidget):
 
         self._build_table(_first_batch_datas)
         
-        # 设置表头标签
-        self.setHorizontalHeaderLabels(['', '相对路径', '绝对路径', '是否目录', '扩展名', '大小'])
-        
-        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
-        self.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.ResizeToContents)
+        self._setup_header()
 
         if self.cancel_event.is_set():
             self.loaded.emit(False)
@@ -167,7 +248,194 @@ class FileTable(QTableWidget):
             self.sort_enabled = True
             self.loaded.emit(True)
 
-    def load_table(self, cancel_event, table_datas):
+    def _setup_header(self):
+        """设置表头标签和列宽"""
+        labels = ['', '相对路径', '绝对路径', '是否目录', '扩展名', '大小', '占用空间', '闲置时间', '大小×闲置', '重复组']
+        self.setColumnCount(len(labels))
+        self.setHorizontalHeaderLabels(labels)
+        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+        self.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(7, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(8, QHeaderView.ResizeMode.ResizeToContents)
+        self.horizontalHeader().setSectionResizeMode(9, QHeaderView.ResizeMode.ResizeToContents)
+        # 只有查找重复文件时显示重复组列
+        self.setColumnHidden(9, not self.store.has_groups())
+
+    def stream_table(self, cancel_event, data_queue, done_event, store: ResultStore):
+        """
+        边搜索边加载表格
+        每一帧从 data_queue 中取出结果行号插入表格，搜索过程中即可勾选和排序:
+        未指定排序列时按到达顺序追加，加载完成后按默认顺序排序一次；指定了排序列时按块合并到当前排序中
+        done_event 被设置且队列中的结果全部插入后视为加载完成
+        :param cancel_event: 取消事件
+        :param data_queue: 搜索结果在 store 中的行号队列
+        :param done_event: 搜索结束事件
+        :param store: 搜索结果
+        """
+        self.stream_timer.stop()
+        self.cancel_event = cancel_event
+        self.clearContents()
+        self.setRowCount(0)
+        self.store = store
+        self.rows = array('I')
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self._update_sort_indicator()
+        self._setup_header()
+        self.sort_enabled = True
+        self._stream_queue = data_queue
+        self._stream_done_event = done_event
+        self._stream_pending = []
+        self.stream_timer.start()
+
+    def _refine_size(self, row):
+        """在后台精确统计一个估算目录的大小，完成后通过 size_refined 信号更新表格"""
+        job = start_subtree_size(self.store.abs_path(row),
+                                 lambda *usage: self.size_refined.emit(row, *usage))
+        self._refine_jobs = [j for j in self._refine_jobs if not j.done_event.is_set()]
+        self._refine_jobs.append(job)
+
+    def cancel_refine(self):
+        """取消所有后台精确统计"""
+        for job in self._refine_jobs:
+            job.cancel_event.set()
+        self._refine_jobs = []
+
+    @Slot(int, object, object, float, float)
+    def _on_size_refined(self, row, size, allocated, mtime, atime):
+        if not self.store.is_estimated(row):
+            return
+        self.store.set_size(row, size, allocated, mtime, atime)
+        try:
+            i = self.rows.index(row)
+        except ValueError:
+            # 该行已经被移除
+            return
+        checked = self.cellWidget(i, 0).isChecked()
+        self.removeRow(i)
+        del self.rows[i]
+        j = self._insert_sorted(row)
+        self.cellWidget(j, 0).setChecked(checked)
+
+    def _sort_key(self):
+        """当前排序列的行号排序键，未指定排序列时按绝对路径排序，查找重复文件时按重复组排序"""
+        if self.sort_column > 0:
+            return self.store.sort_key(self.sort_column)
+        return self.store.sort_key(9 if self.store.has_groups() else 2)
+
+    def _insert_position(self, key, sort_key):
+        """按当前排序，排序键为 key 的行在 rows 中的插入位置，相同的键插入在已有的行之后"""
+        if self.sort_order == Qt.DescendingOrder:
+            # 降序列表中找到第一个小于 key 的位置
+            lo, hi = 0, len(self.rows)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if sort_key(self.rows[mid]) < key:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return lo
+        return bisect.bisect_right(self.rows, key, key=sort_key)
+
+    def _insert_sorted(self, row):
+        """按当前排序把一个结果行号插入 rows 和表格，返回插入的表格行号"""
+        sort_key = self._sort_key()
+        i = self._insert_position(sort_key(row), sort_key)
+        self.rows.insert(i, row)
+        self.insertRow(i)
+        self._set_row(i, row)
+        return i
+
+    def _append_rows(self, batch):
+        """把一批结果行号追加到 rows 和表格末尾"""
+        start = len(self.rows)
+        self.rows.extend(batch)
+        self.model().insertRows(start, len(batch))
+        for j, row in enumerate(batch):
+            self._set_row(start + j, row)
+
+    def _merge_sorted(self, batch):
+        """
+        按当前排序把一批结果行号合并到 rows 和表格中
+        批次先排序，rows 整体重建一次，插入到同一个位置的行只调用一次 insertRows，避免逐行在中间插入
+        """
+        sort_key = self._sort_key()
+        batch = sorted(batch, key=sort_key, reverse=self.sort_order == Qt.DescendingOrder)
+        positions = [self._insert_position(sort_key(row), sort_key) for row in batch]
+        merged = array('I')
+        last = 0
+        for pos, row in zip(positions, batch):
+            merged.extend(self.rows[last:pos])
+            merged.append(row)
+            last = pos
+        merged.extend(self.rows[last:])
+        # 从后向前插入，前面的插入位置不受影响
+        j = len(batch)
+        while j > 0:
+            pos = positions[j - 1]
+            count = 0
+            while j > 0 and positions[j - 1] == pos:
+                j -= 1
+                count += 1
+            self.model().insertRows(pos, count)
+        self.rows = merged
+        for j, (pos, row) in enumerate(zip(positions, batch)):
+            self._set_row(pos + j, row)
+
+    def _finish_stream(self):
+        """流式加载完成，未指定排序列时按默认顺序排序一次"""
+        if self.sort_column <= 0:
+            sort_key = self._sort_key()
+            keys = [sort_key(row) for row in self.rows]
+            if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+                checked_rows = set(self._checked_rows())
+                self.rows = array('I', sorted(self.rows, key=sort_key))
+                self._reload_table(checked_rows)
+        self.loaded.emit(True)
+
+    @Slot()
+    def _on_stream_timer(self):
+        if self.cancel_event.is_set():
+            self.stream_timer.stop()
+            self._stream_pending = []
+            self.loaded.emit(False)
+            return
+        # 先取出队列中已有的全部结果，合并为本帧的一批
+        search_done = self._stream_done_event.is_set()
+        while True:
+            try:
+                self._stream_pending.append(self._stream_queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(self._stream_pending) > 0:
+            deadline = time.perf_counter() + self.frame_budget
+            inserted = 0
+            self.setUpdatesEnabled(False)
+            # 未指定排序列时按到达顺序追加，加载完成后再排序一次；否则按块合并到当前排序中
+            while inserted < len(self._stream_pending) and time.perf_counter() < deadline:
+                batch = self._stream_pending[inserted:inserted + self.stream_chunk_size]
+                if self.sort_column > 0:
+                    self._merge_sorted(batch)
+                else:
+                    self._append_rows(batch)
+                inserted += len(batch)
+            self.setUpdatesEnabled(True)
+            self._stream_pending = self._stream_pending[inserted:]
+        if search_done and len(self._stream_pending) == 0 and self._stream_queue.empty():
+            self.stream_timer.stop()
+            self._finish_stream()
+
+    def load_table(self, cancel_event, store: ResultStore, rows=None):
+        """
+        分批加载已有的搜索结果
+        :param store: 搜索结果
+        :param rows: 需要显示的结果行号，None 代表所有结果
+        """
         self.cancel_event = cancel_event
         self.clearContents()
         self.setRowCount(0)
@@ -175,8 +443,9 @@ class FileTable(QTableWidget):
         # 关闭排序功能
         self.sort_enabled = False
         
-        # 保存原始数据用于排序
-        self.original_data = table_datas.copy()
+        self.store = store
+        table_datas = array('I', range(len(store)) if rows is None else rows)
+        self.rows = array('I', table_datas)
         # 重置排序状态
         self.sort_column = -1
         self.sort_order = Qt.AscendingOrder
@@ -193,24 +462,72 @@ class FileTable(QTableWidget):
 
         QTimer.singleShot(0, lambda: self._build_first_batch(table_datas))
 
+    def _checked_rows(self):
+        """勾选的结果行号"""
+        return [self.rows[i] for i in range(self.rowCount()) if self.cellWidget(i, 0).isChecked()]
+
     def get_checked_path(self):
+        """勾选的路径，祖先目录也被勾选的路径会随祖先目录一起删除，不再单独返回"""
+        checked = set(self._checked_rows())
         delete_datas = []
-        for i in range(self.rowCount()):
-            checkbox: QCheckBox = self.cellWidget(i, 0)
-            if checkbox.isChecked():
-                abs_path = self.item(i, 2).text()
-                is_dir = self.item(i, 3).text() == '是'
-                delete_datas.append((abs_path, is_dir))
+        for row in checked:
+            abs_path = os.path.normpath(self.store.abs_path(row))
+            if any(ancestor in checked for ancestor in self.store.ancestors(abs_path)):
+                continue
+            delete_datas.append((abs_path, self.store.is_dir(row)))
         return delete_datas
 
-    def delete_checked(self):
-        need_delete_row = []
+    @Slot()
+    def check_duplicates(self):
+        """每个重复组保留表格中排在最前的一项，勾选其余各项"""
+        kept = set()
         for i in range(self.rowCount()):
+            group = self.store.group(self.rows[i])
+            if group == 0:
+                continue
             checkbox: QCheckBox = self.cellWidget(i, 0)
-            if checkbox.isChecked():
-                need_delete_row.append(i)
-        for i in reversed(need_delete_row):
-            self.removeRow(i)
+            checkbox.setChecked(group in kept)
+            kept.add(group)
+
+    def fully_checked_groups(self):
+        """所有剩余文件都被勾选的重复组编号，删除后该内容将不再保留任何一份"""
+        checked = {}
+        for i in range(self.rowCount()):
+            group = self.store.group(self.rows[i])
+            if group > 0:
+                checked[group] = checked.get(group, True) and self.cellWidget(i, 0).isChecked()
+        return sorted(group for group, all_checked in checked.items() if all_checked)
+
+    def unchecked_under_empty(self):
+        """
+        勾选的“删除后为空”目录之下没有勾选(或已从表格中移除)的搜索结果数
+        删除这些目录会连同其中所有的搜索结果一起删除
+        """
+        checked = set(self._checked_rows())
+        count = 0
+        for row in checked:
+            if self.store.empty_state(row) == EMPTY_AFTER_DELETE:
+                count += sum(1 for i in self.store.descendants(self.store.abs_path(row))
+                             if i not in checked and self.store.empty_state(i) == 0)
+        return count
+
+    def delete_checked(self, deleted: Iterable[str]):
+        """
+        移除已删除的勾选行，以及位于已删除目录之下的行
+        :param deleted: 删除成功的路径，为 get_checked_path 返回的路径的子集，删除失败的行保留在表格中
+        """
+        deleted = set(deleted)
+        removed = set()
+        for row in self._checked_rows():
+            if os.path.normpath(self.store.abs_path(row)) not in deleted:
+                continue
+            removed.add(row)
+            if self.store.is_dir(row):
+                removed.update(self.store.descendants(self.store.abs_path(row)))
+        for i in reversed(range(self.rowCount())):
+            if self.rows[i] in removed:
+                self.removeRow(i)
+                del self.rows[i]
 
     @Slot()
     def on_cell_clicked(self, row, column):
@@ -248,64 +565,41 @@ class FileTable(QTableWidget):
             self.sort_column = column
             self.sort_order = Qt.AscendingOrder
         
-        # 对原始数据进行排序
-        sorted_data = self._sort_data(self.original_data, column, self.sort_order)
-        
+        # 保存当前选中状态，rows 始终与表格行的顺序一致
+        checked_rows = set(self._checked_rows())
+        self.rows = self._sort_data(self.rows, column, self.sort_order)
+
         # 重新加载表格
-        self._reload_table(sorted_data)
+        self._reload_table(checked_rows)
     
-    def _sort_data(self, data, column, order):
-        """根据列和排序顺序对数据进行排序"""
+    def _sort_data(self, rows, column, order):
+        """根据列和排序顺序对结果行号进行排序，排序键直接从列存储中读取"""
+        if column <= 0:
+            return rows
         reverse = (order == Qt.DescendingOrder)
-        
-        if column == 1:  # 相对路径列
-            return sorted(data, key=lambda x: x[1], reverse=reverse)
-        elif column == 2:  # 绝对路径列
-            return sorted(data, key=lambda x: x[2], reverse=reverse)
-        elif column == 3:  # 是否目录列
-            return sorted(data, key=lambda x: x[3], reverse=reverse)
-        elif column == 4:  # 扩展名列
-            return sorted(data, key=lambda x: x[4], reverse=reverse)
-        elif column == 5:  # 大小列
-            return sorted(data, key=lambda x: x[5], reverse=reverse)
-        else:
-            return data
+        return array('I', sorted(rows, key=self.store.sort_key(column), reverse=reverse))
     
-    def _reload_table(self, sorted_data):
-        """重新加载表格数据"""
-        # 保存当前选中状态
-        checked_items = set()
-        for i in range(self.rowCount()):
-            checkbox: QCheckBox = self.cellWidget(i, 0)
-            if checkbox.isChecked():
-                abs_path = self.item(i, 2).text()
-                checked_items.add(abs_path)
-        
+    def _reload_table(self, checked_rows):
+        """
+        按 rows 重新加载表格数据
+        :param checked_rows: 需要恢复勾选状态的结果行号
+        """
         # 清空表格
         self.clearContents()
         self.setRowCount(0)
         
         # 重新构建表格
-        self._build_table(sorted_data)
-        
-        # 设置表头标签
-        self.setHorizontalHeaderLabels(['', '相对路径', '绝对路径', '是否目录', '扩展名', '大小'])
+        self._build_table(self.rows)
         
         # 恢复选中状态
         for i in range(self.rowCount()):
-            abs_path = self.item(i, 2).text()
-            if abs_path in checked_items:
+            if self.rows[i] in checked_rows:
                 checkbox: QCheckBox = self.cellWidget(i, 0)
                 checkbox.setChecked(True)
-        
-        # 更新列宽
-        self.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
-        self.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)
-        self.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.ResizeToContents)
-        
+
+        # 设置表头标签并更新列宽
+        self._setup_header()
+
         # 更新排序指示器
         self._update_sort_indicator()
     